@@ -1,17 +1,142 @@
-from flask import Flask, request, redirect, render_template, jsonify, session, flash, url_for
-from database import UserDB
+from flask import Flask, Response, request, redirect, render_template, jsonify, session, flash, url_for, stream_with_context, abort, g
+from database import UserDB, decode_page_cursor
 from oauth_handler import GoogleOAuth
 from n8n_manager import N8NManager
+from provisioning import ProvisioningWorkerPool
+from gmail_push import GmailPushService, LocalPushSource, PushBusy
+from concurrency import fan_out
+from cache import MISSING
+from shard_pool import ShardedWorkflowPool
+from token_refresh import TokenRefreshScheduler, token_schedule
+from status_sync import WorkflowStatusSync
+from execution_ingest import ExecutionIngester
+from sessions import PostgresSessionInterface
+from migrate_db import deploy_functions
 import config
-from functools import wraps
+import metrics
+import hmac
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import Callable
 
 app = Flask(__name__)
 app.secret_key = "your_secret_key_here"
 
-# Initialize components
-db = UserDB()
-oauth = GoogleOAuth()
-n8n = N8NManager()
+# Components, built per process by init_components() (see create_app)
+db: UserDB = None
+oauth: GoogleOAuth = None
+n8n: N8NManager = None
+push: GmailPushService = None
+provisioning: ProvisioningWorkerPool = None
+shards: ShardedWorkflowPool = None
+token_refresh: TokenRefreshScheduler = None
+status_sync: WorkflowStatusSync = None
+execution_ingest: ExecutionIngester = None
+
+
+def init_components(deploy: bool = None, singletons: bool = True, leader: Callable[[], bool] = None) -> None:
+    """Create the database pool, API clients and background jobs of this process.
+
+    Token refresh, status sync and execution ingest need one runner only:
+    ``singletons=False`` leaves them stopped, and ``leader`` lets them run
+    only while it returns True. The provisioning pool works off a shared
+    queue and always starts.
+    """
+    global db, oauth, n8n, push, provisioning, shards, token_refresh, status_sync, execution_ingest
+    db = UserDB()
+    if config.DEPLOY_STORED_FUNCTIONS if deploy is None else deploy:
+        try:
+            deploy_functions(db)
+        except Exception as e:
+            print(f"⚠️ Could not deploy stored functions: {str(e)}")
+    if config.SESSION_BACKEND == "server":
+        app.session_interface = PostgresSessionInterface(db)
+    oauth = GoogleOAuth()
+    n8n = N8NManager()
+    push = GmailPushService(db, n8n, oauth)
+    provisioning = ProvisioningWorkerPool(db, n8n, push=push)
+    shards = ShardedWorkflowPool(db, n8n)
+    if config.PROVISIONING_WORKERS > 0:
+        provisioning.start()
+    token_refresh = TokenRefreshScheduler(db, n8n, oauth)
+    if singletons and config.TOKEN_REFRESH_INTERVAL > 0:
+        token_refresh.start(leader)
+    status_sync = WorkflowStatusSync(db, n8n)
+    if singletons and config.STATUS_SYNC_INTERVAL > 0:
+        status_sync.start(leader)
+    execution_ingest = ExecutionIngester(db, n8n)
+    if singletons and config.EXECUTION_INGEST_INTERVAL > 0:
+        execution_ingest.start(leader)
+
+
+def close_components() -> None:
+    """Stop the background jobs and close the pools of this process"""
+    for job in (provisioning, token_refresh, status_sync, execution_ingest):
+        job.stop(timeout=5)
+    n8n.close()
+    db.close()
+
+
+def preload_templates() -> int:
+    """Compile every template now instead of on its first request"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def create_app(init: bool = True) -> Flask:
+    """WSGI app factory.
+
+    Importing this module opens nothing. With init=False the caller runs
+    init_components() later, e.g. in each worker after a pre-forking
+    server has loaded the app in its master (see gunicorn.conf.py).
+    """
+    if config.PRELOAD_TEMPLATES:
+        preload_templates()
+    if init and db is None:
+        init_components()
+    return app
+
+
+metrics.REGISTRY.gauge(
+    "db_pool_connections", "Database pool connections by state", ("state",),
+    lambda: {(state,): db.pool_stats()[state] for state in ("idle", "in_use", "size")},
+)
+metrics.REGISTRY.gauge(
+    "cache_operations", "Lookup cache counters", ("result",),
+    lambda: {(name,): value for name, value in db.cache_stats().items() if name in ("hits", "misses", "invalidations")},
+)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started, route=route, method=request.method, status=str(response.status_code)
+        )
+    return response
+
+
+@app.teardown_request
+def record_failed_request_latency(exc):
+    # after_request is skipped when a view raises; record those as 500s
+    started = g.pop("request_started", None)
+    if started is not None and exc is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started, route=route, method=request.method, status="500"
+        )
 
 
 def login_required(f):
@@ -24,6 +149,18 @@ def login_required(f):
     return decorated_function
 
 
+def page_args():
+    """Parse ?limit= and ?cursor= for keyset-paginated listings"""
+    limit = request.args.get("limit", config.ADMIN_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, config.ADMIN_MAX_PAGE_SIZE))
+    cursor = request.args.get("cursor")
+    try:
+        after = decode_page_cursor(cursor) if cursor else None
+    except ValueError:
+        abort(400, description="Invalid cursor")
+    return limit, after
+
+
 @app.route("/")
 def home():
     if 'user_id' in session:
@@ -90,13 +227,18 @@ def logout():
 @login_required
 def dashboard():
     user_id = session['user_id']
-    user = db.get_user_by_id(user_id)
     dashboard_data = db.get_user_dashboard_data(user_id)
+    usage = None
+    if dashboard_data['workflow']:
+        since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=config.USAGE_DASHBOARD_DAYS - 1)
+        usage = db.get_user_usage(user_id, since)
     
     return render_template("dashboard.html", 
-                         user=user, 
+                         user=dashboard_data['user'], 
                          gmail_connection=dashboard_data['credential'],
-                         workflow=dashboard_data['workflow'])
+                         workflow=dashboard_data['workflow'],
+                         usage=usage,
+                         usage_days=config.USAGE_DASHBOARD_DAYS)
 
 
 @app.route("/auth")
@@ -105,10 +247,65 @@ def auth():
     return redirect(oauth.get_auth_url())
 
 
+@app.template_global()
+def workflow_needs_setup(workflow) -> bool:
+    """Failed, or gone or stopped in n8n as last seen by the status sync, so the user may set it up again"""
+    if not workflow or workflow['workflow_status'] == "pending":
+        return False
+    return (workflow['workflow_status'] == "failed" or workflow.get('n8n_fingerprint') == "missing"
+            or workflow.get('n8n_active') is False)
+
+
+def queue_workflow_provisioning(user_id: int, credential_id: int, existing_workflow=MISSING) -> int:
+    """Mark the user's workflow for this credential pending and queue provisioning"""
+    if existing_workflow is MISSING:
+        existing_workflow = db.get_user_workflow(user_id)
+    if existing_workflow and existing_workflow['gmail_credential_id'] == credential_id:
+        workflow_id = existing_workflow['id']
+        db.update_workflow_status(workflow_id, "pending")
+    else:
+        workflow_id = db.create_workflow(user_id, credential_id, None, workflow_status="pending")
+    provisioning.enqueue(user_id, credential_id, workflow_id)
+    return workflow_id
+
+
+def teardown_tenant(credential: dict, workflow: dict, rebuild_shard: bool = True) -> None:
+    """Delete a tenant's n8n objects, Gmail watch and database rows.
+
+    Independent n8n and Gmail calls run concurrently under one deadline.
+    In shared mode the shard is rebuilt without the mailbox before its n8n
+    credential is deleted; bulk callers pass ``rebuild_shard=False`` and
+    rebuild each affected shard once themselves.
+    """
+    calls = []
+    if credential['watch_expires_at']:
+        calls.append(partial(push.stop_watch, credential))
+
+    if workflow and workflow['shard_id'] is not None:
+        db.delete_user_credential(credential['user_id'])
+        print(f"✅ Deleted user data from database")
+        if not rebuild_shard:
+            fan_out(*calls)
+            return
+        shards.rebuild_shard(workflow['shard_id'])
+    elif workflow and workflow['n8n_workflow_id']:
+        calls.append(partial(n8n.delete_workflow, workflow['n8n_workflow_id']))
+
+    if credential['n8n_gmail_credential']:
+        calls.append(partial(n8n.delete_credential, credential['n8n_gmail_credential']))
+    fan_out(*calls)
+    print(f"✅ Deleted n8n objects for {credential['gmail_email']}")
+
+    if workflow is None or workflow['shard_id'] is None:
+        # Workflow rows go with the credential (ON DELETE CASCADE)
+        db.delete_user_credential(credential['user_id'])
+        print(f"✅ Deleted user data from database")
+
+
 @app.route("/login/callback")
 @login_required
 def callback():
-    """Handle OAuth callback and create workflow"""
+    """Handle OAuth callback and queue workflow provisioning"""
     code = request.args.get("code")
     error = request.args.get("error")
     user_id = session['user_id']
@@ -128,6 +325,7 @@ def callback():
         tokens = oauth.exchange_code(code)
         access_token = tokens["access_token"]
         refresh_token = tokens["refresh_token"]
+        token_expires_at, token_refresh_after = token_schedule(tokens.get("expires_in", 3600))
         print("✅ Got OAuth tokens")
 
         # Get user email
@@ -140,31 +338,21 @@ def callback():
             flash(f"Gmail account {email} is already connected by another user", "error")
             return redirect(url_for('dashboard'))
 
-        # Save credential to database
-        credential_id = db.save_credential(user_id, email, access_token, refresh_token)
-        print("✅ Saved credential to database")
-
-        # Create n8n credential
-        print("🔄 Creating n8n credential...")
-        n8n_credential = n8n.create_credential(email, access_token, refresh_token)
-        n8n_credential_id = n8n_credential["id"]
-        print(f"✅ Created n8n credential: {n8n_credential_id}")
-
-        # Update credential with n8n credential ID
-        db.update_credential_n8n_id(credential_id, n8n_credential_id)
-
-        # Create n8n workflow
-        print("🔄 Creating n8n workflow...")
-        workflow = n8n.create_or_update_workflow(email, n8n_credential_id)
-        n8n_workflow_id = workflow["id"]
-        print(f"✅ Created n8n workflow: {n8n_workflow_id}")
+        # Credential (new tokens need a fresh n8n credential), pending workflow
+        # and provisioning job are written in one transaction
+        connection = db.connect_gmail(
+            user_id, email, access_token, refresh_token, token_expires_at, token_refresh_after,
+            max_attempts=config.PROVISIONING_MAX_ATTEMPTS,
+        )
+        if connection is None:
+            flash(f"Gmail account {email} is already connected by another user", "error")
+            return redirect(url_for('dashboard'))
+        print("✅ Saved credential and queued workflow provisioning")
 
-        # Save workflow to database
-        workflow_id = db.create_workflow(user_id, credential_id, n8n_workflow_id)
-        db.update_workflow_status(workflow_id, "active")
-        print("✅ Saved workflow to database")
+        # n8n credential, workflow and activation happen in the background
+        provisioning.wake()
 
-        flash(f"Successfully connected Gmail account {email} and created workflow!", "success")
+        flash(f"Successfully connected Gmail account {email}! Your workflow is being set up.", "success")
         return redirect(url_for('dashboard'))
 
     except Exception as e:
@@ -186,24 +374,16 @@ def create_workflow():
             flash("No Gmail account connected. Please connect Gmail first.", "error")
             return redirect(url_for('dashboard'))
 
-        # Check if workflow already exists
+        # Check if workflow already exists; failed or broken ones can be set up again
         existing_workflow = db.get_user_workflow(user_id)
-        if existing_workflow:
+        if existing_workflow and not workflow_needs_setup(existing_workflow):
             flash("Workflow already exists for this account.", "error")
             return redirect(url_for('dashboard'))
 
-        # Create n8n workflow
-        print("🔄 Creating n8n workflow...")
-        workflow = n8n.create_or_update_workflow(credential['email'], credential['n8n_credential_id'])
-        n8n_workflow_id = workflow["id"]
-        print(f"✅ Created n8n workflow: {n8n_workflow_id}")
-
-        # Save workflow to database
-        workflow_id = db.create_workflow(user_id, credential['id'], n8n_workflow_id)
-        db.update_workflow_status(workflow_id, "active")
-        print("✅ Saved workflow to database")
+        queue_workflow_provisioning(user_id, credential['id'], existing_workflow)
+        print("✅ Queued workflow provisioning")
 
-        flash("Workflow created successfully!", "success")
+        flash("Workflow is being created!", "success")
         return redirect(url_for('dashboard'))
 
     except Exception as e:
@@ -212,6 +392,38 @@ def create_workflow():
         return redirect(url_for('dashboard'))
 
 
+@app.route("/settings/quiet-hours", methods=["POST"])
+@login_required
+def update_quiet_hours():
+    """Set or clear the hours during which the user's mailbox is not polled"""
+    user_id = session['user_id']
+    start = request.form.get("quiet_hours_start", "").strip()
+    end = request.form.get("quiet_hours_end", "").strip()
+    timezone = request.form.get("timezone", "").strip() or "UTC"
+
+    try:
+        ZoneInfo(timezone)
+        if start and end:
+            start, end = int(start), int(end)
+            if not (0 <= start <= 23 and 0 <= end <= 23):
+                raise ValueError("hours must be between 0 and 23")
+        else:
+            start = end = None
+    except (ValueError, ZoneInfoNotFoundError) as e:
+        flash(f"Invalid quiet hours: {str(e)}", "error")
+        return redirect(url_for('dashboard'))
+
+    db.update_quiet_hours(user_id, start, end, timezone)
+
+    # Rewrite the polling schedule in the background
+    workflow = db.get_user_workflow(user_id)
+    if workflow and workflow['shard_id'] is None and config.INGESTION_MODE != "push":
+        queue_workflow_provisioning(user_id, workflow['gmail_credential_id'], workflow)
+
+    flash("Quiet hours updated." if start is not None else "Quiet hours cleared.", "success")
+    return redirect(url_for('dashboard'))
+
+
 @app.route("/disconnect-gmail-delete-workflow", methods=["POST"])
 @login_required
 def disconnect_gmail_delete_workflow():
@@ -220,27 +432,17 @@ def disconnect_gmail_delete_workflow():
     
     try:
         # Get user's data
-        credential = db.get_user_credential(user_id)
-        workflow = db.get_user_workflow(user_id)
+        credential, workflow = fan_out(
+            partial(db.get_user_credential, user_id), partial(db.get_user_workflow, user_id)
+        )
         
         if not credential:
             flash("No Gmail account connected.", "error")
             return redirect(url_for('dashboard'))
 
-        # Delete n8n workflow if exists
-        if workflow and workflow['n8n_workflow_id']:
-            n8n.delete_workflow(workflow['n8n_workflow_id'])
-            print(f"✅ Deleted n8n workflow: {workflow['n8n_workflow_id']}")
-
-        # Delete n8n credential if exists
-        if credential['n8n_credential_id']:
-            n8n.delete_credential(credential['n8n_credential_id'])
-            print(f"✅ Deleted n8n credential: {credential['n8n_credential_id']}")
-
-        # Delete from database
-        db.delete_user_workflow(user_id)
-        db.delete_user_credential(user_id)
-        print(f"✅ Deleted user data from database")
+        teardown_tenant(credential, workflow)
+        # Sign out the user's other devices; this one stays signed in
+        db.revoke_user_sessions([user_id], keep=getattr(session, 'session_id', None))
 
         flash("Gmail account disconnected successfully!", "success")
         return redirect(url_for('dashboard'))
@@ -258,8 +460,7 @@ def view_workflow(workflow_id):
     user_id = session['user_id']
     
     # Verify user owns this workflow
-    workflow = db.get_workflow_by_n8n_id(workflow_id)
-    if not workflow or workflow['user_id'] != user_id:
+    if db.get_workflow_owner(workflow_id) != user_id:
         flash("Workflow not found or access denied.", "error")
         return redirect(url_for('dashboard'))
     
@@ -271,8 +472,9 @@ def view_workflow(workflow_id):
 @app.route("/users")
 @login_required
 def show_users():
-    users = db.get_all_workflows()
-    return render_template("users.html", users=users)
+    limit, after = page_args()
+    users, next_cursor = db.get_workflows_page(limit, after)
+    return render_template("users.html", users=users, next_cursor=next_cursor, limit=limit, is_first_page=after is None)
 
 
 @app.route("/users/<email>/delete", methods=["POST"])
@@ -287,16 +489,9 @@ def delete_user(email):
         # Get workflow for this credential
         workflow = db.get_user_workflow(credential['user_id'])
 
-        if workflow and workflow['n8n_workflow_id']:
-            n8n.delete_workflow(workflow['n8n_workflow_id'])
-            print(f"✅ Deleted workflow: {workflow['n8n_workflow_id']}")
-
-        if credential['n8n_credential_id']:
-            n8n.delete_credential(credential['n8n_credential_id'])
-            print(f"✅ Deleted credential: {credential['n8n_credential_id']}")
-
-        db.delete_user_credential(credential['user_id'])
-        print(f"✅ Deleted user: {email}")
+        teardown_tenant(credential, workflow)
+        revoked = db.revoke_user_sessions([credential['user_id']])
+        print(f"✅ Deleted user: {email}, revoked {revoked} sessions")
 
         flash(f"User {email} deleted successfully", "success")
         return redirect(url_for('show_users'))
@@ -307,10 +502,124 @@ def delete_user(email):
         return redirect(url_for('show_users'))
 
 
+def delete_tenants(emails: list) -> dict:
+    """Delete many tenants in parallel; returns per-email outcomes"""
+    report = {"deleted": [], "not_found": [], "failed": []}
+    shard_members = {}
+    user_ids = []
+
+    def delete_one(email):
+        credential = db.get_credential_by_email(email)
+        if not credential:
+            return "not_found", None
+        workflow = db.get_user_workflow(credential['user_id'])
+        teardown_tenant(credential, workflow, rebuild_shard=False)
+        return "deleted", (workflow, credential)
+
+    def finish_shard(shard_id):
+        # Rebuild once without the removed mailboxes, then drop their n8n credentials
+        shards.rebuild_shard(shard_id)
+        fan_out(*[
+            partial(n8n.delete_credential, credential['n8n_gmail_credential'])
+            for credential in shard_members[shard_id] if credential['n8n_gmail_credential']
+        ])
+
+    # Its own executor: teardown_tenant fans out on the shared pool
+    with ThreadPoolExecutor(max_workers=config.BULK_DELETE_CONCURRENCY) as executor:
+        futures = {email: executor.submit(delete_one, email) for email in emails}
+        for email, future in futures.items():
+            try:
+                outcome, deleted = future.result()
+            except Exception as e:
+                report["failed"].append({"email": email, "error": str(e)})
+                continue
+            report[outcome].append(email)
+            if deleted:
+                user_ids.append(deleted[1]['user_id'])
+            if deleted and deleted[0] and deleted[0]['shard_id'] is not None:
+                shard_members.setdefault(deleted[0]['shard_id'], []).append(deleted[1])
+
+        futures = {shard_id: executor.submit(finish_shard, shard_id) for shard_id in shard_members}
+        for shard_id, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                report["failed"].append({"shard_id": shard_id, "error": str(e)})
+
+    # One statement for every deleted tenant's sessions
+    report["revoked_sessions"] = db.revoke_user_sessions(user_ids)
+    return report
+
+
+@app.route("/api/users/bulk-delete", methods=["POST"])
+@login_required
+def bulk_delete_users():
+    """Delete the tenants listed in {"emails": [...]} in parallel"""
+    data = request.get_json(silent=True) or {}
+    emails = data.get("emails")
+    if not isinstance(emails, list) or not all(isinstance(e, str) for e in emails):
+        abort(400, description='Expected {"emails": [...]}')
+    if len(emails) > config.BULK_DELETE_MAX:
+        abort(400, description=f"At most {config.BULK_DELETE_MAX} emails per request")
+
+    report = delete_tenants(list(dict.fromkeys(emails)))
+    print(f"✅ Bulk delete: {len(report['deleted'])} deleted, {len(report['failed'])} failed")
+    return jsonify(report), 207 if report["failed"] else 200
+
+
 @app.route("/api/users")
 def api_users():
-    users = db.get_all_workflows()
-    return jsonify(users)
+    if request.args.get("format") == "ndjson":
+        def generate():
+            for user in db.iter_all_workflows(config.STREAM_BATCH_SIZE):
+                yield app.json.dumps(user) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    limit, after = page_args()
+    users, next_cursor = db.get_workflows_page(limit, after)
+    response = jsonify(users)
+    if next_cursor:
+        next_url = url_for('api_users', cursor=next_cursor, limit=limit)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+@app.route("/gmail/push", methods=["POST"])
+def gmail_push():
+    """Pub/Sub push endpoint for Gmail watch notifications"""
+    if not config.GMAIL_PUSH_TOKEN or not hmac.compare_digest(request.args.get("token", ""), config.GMAIL_PUSH_TOKEN):
+        abort(403)
+    try:
+        sent = push.handle_notification(request.get_json(silent=True))
+    except ValueError:
+        abort(400)
+    except PushBusy:
+        # Redelivered after the current holder has moved the position on
+        return "", 503
+    except Exception as e:
+        # Non-2xx makes Pub/Sub redeliver the notification with backoff
+        print(f"❌ Gmail push handling failed: {str(e)}")
+        return "", 500
+    if sent:
+        print(f"✅ Forwarded {sent} pushed emails")
+    return "", 204
+
+
+@app.route("/gmail/push/simulate", methods=["POST"])
+@login_required
+def simulate_gmail_push():
+    """Deliver a message to the offline push stand-in (GMAIL_PUSH_SOURCE=local only)"""
+    if not isinstance(push.source, LocalPushSource):
+        abort(404)
+    data = request.get_json(silent=True) or request.form
+    if not isinstance(data, dict) or not isinstance(data.get("email"), str) or not data["email"]:
+        abort(400, description='Expected {"email": ...}')
+    envelope = push.source.deliver(data["email"], data.get("subject", "Test message"), data.get("from", "sender@example.com"))
+    if envelope is None:
+        return jsonify({"watched": False, "forwarded": 0})
+    return jsonify({"watched": True, "forwarded": push.handle_notification(envelope)})
 
 
 @app.route("/api/health")
@@ -318,7 +627,31 @@ def health():
     return jsonify({"status": "healthy", "service": "gmail-telegram-automation"})
 
 
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/stats")
+def stats():
+    stats = {"db_pool": db.pool_stats(), "cache": db.cache_stats()}
+    if config.SESSION_BACKEND == "server":
+        stats["sessions"] = db.count_sessions(datetime.utcnow())
+    return jsonify(stats)
+
+
+@app.route("/api/usage")
+@login_required
+def api_usage():
+    """Per-tenant execution totals from the daily rollups, busiest first"""
+    days = max(1, request.args.get("days", 7, type=int))
+    limit = min(max(1, request.args.get("limit", config.ADMIN_PAGE_SIZE, type=int)), config.ADMIN_MAX_PAGE_SIZE)
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    return jsonify({"since": since.isoformat(), "tenants": db.get_usage_report(since, limit)})
+
+
 if __name__ == "__main__":
+    create_app()
     print("🚀 Starting Gmail to Telegram automation server...")
     print(f"📡 n8n URL: {n8n.base_url}")
     print(f"🔑 Using API key: {config.N8N_API_KEY[:20]}...")
@@ -0,0 +1,422 @@
+"""ASGI entry point: the I/O-bound routes on an event loop, everything else on Flask.
+
+These routes are served natively async:
+- the OAuth callback
+- workflow creation
+- the delete flows
+- the JSON APIs
+
+They mostly wait on Google, n8n and Postgres, so one event loop can hold
+far more of them in flight than a thread per request allows. Every other
+route is the unchanged Flask app, mounted below them and run on
+``ASYNC_WSGI_THREADS`` threads. ``app.py`` keeps working on its own as the
+sync path.
+
+Postgres access goes through asyncpg (async_database.py) and Google and
+n8n through httpx (async_clients.py). Both share the lookup cache,
+sessions, provisioning workers and background jobs of the Flask app in
+the same process. Calls with no async port (Gmail watch stops, shard
+rebuilds) run in threads. Requires ``SESSION_BACKEND=server``.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Optional
+from urllib.parse import urlencode
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import RedirectResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as web
+import config
+import metrics
+from async_clients import AsyncGoogleOAuth, AsyncN8NManager
+from async_database import AsyncUserDB
+from concurrency import fan_out_async
+from database import decode_page_cursor
+from sessions import AsyncSessionStore
+from token_refresh import token_schedule
+
+if config.SESSION_BACKEND != "server":
+    raise RuntimeError("asgi.py shares sessions with the Flask routes and needs SESSION_BACKEND=server")
+
+# Built by the lifespan, so importing this module opens nothing
+db: Optional[AsyncUserDB] = None
+sessions: Optional[AsyncSessionStore] = None
+oauth: Optional[AsyncGoogleOAuth] = None
+n8n: Optional[AsyncN8NManager] = None
+routes = []
+
+
+def endpoint(rule: str, methods=("GET",), login: bool = False):
+    """Register an async route; handlers take (request, session) and return a response.
+
+    Opens and saves the shared server-side session, redirects to the login
+    page when ``login`` is set and nobody is signed in, and records the
+    request latency like the Flask routes do.
+    """
+    def decorate(handler):
+        async def run(request):
+            started = time.perf_counter()
+            status = "500"
+            try:
+                session = await sessions.open(request.cookies)
+                if login and 'user_id' not in session:
+                    response = redirect("/login")
+                else:
+                    response = await handler(request, session)
+                await sessions.save(session, response)
+                status = str(response.status_code)
+                return response
+            except HTTPException as e:
+                status = str(e.status_code)
+                raise
+            finally:
+                metrics.HTTP_REQUEST_DURATION.observe(
+                    time.perf_counter() - started, route=rule, method=request.method, status=status
+                )
+
+        routes.append(Route(rule.replace("<", "{").replace(">", "}"), run, methods=list(methods)))
+        return handler
+    return decorate
+
+
+def redirect(location: str) -> Response:
+    return RedirectResponse(location, status_code=302)
+
+
+def flash(session, message: str, category: str = "message") -> None:
+    """Queue a message for Flask's get_flashed_messages on the next page"""
+    session['_flashes'] = session.get('_flashes', []) + [(category, message)]
+
+
+def json_response(data, status: int = 200, headers: dict = None) -> Response:
+    """JSON encoded by the Flask app's provider, so both paths serialize alike"""
+    return Response(web.app.json.dumps(data), status_code=status, headers=headers, media_type="application/json")
+
+
+def page_args(request):
+    """Parse ?limit= and ?cursor= for keyset-paginated listings"""
+    try:
+        limit = int(request.query_params.get("limit", config.ADMIN_PAGE_SIZE))
+    except ValueError:
+        limit = config.ADMIN_PAGE_SIZE
+    limit = max(1, min(limit, config.ADMIN_MAX_PAGE_SIZE))
+    cursor = request.query_params.get("cursor")
+    try:
+        after = decode_page_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, detail="Invalid cursor")
+    return limit, after
+
+
+async def queue_workflow_provisioning(user_id: int, credential_id: int, existing_workflow) -> int:
+    """Mark the user's workflow for this credential pending and queue provisioning"""
+    if existing_workflow and existing_workflow['gmail_credential_id'] == credential_id:
+        workflow_id = existing_workflow['id']
+        await db.update_workflow_status(workflow_id, "pending")
+    else:
+        workflow_id = await db.create_workflow(user_id, credential_id, workflow_status="pending")
+    await db.enqueue_provisioning_job(user_id, credential_id, workflow_id, config.PROVISIONING_MAX_ATTEMPTS)
+    web.provisioning.wake()
+    return workflow_id
+
+
+async def teardown_tenant(credential: dict, workflow: dict, rebuild_shard: bool = True) -> None:
+    """app.teardown_tenant on the event loop"""
+    calls = []
+    if credential['watch_expires_at']:
+        calls.append(partial(asyncio.to_thread, web.push.stop_watch, credential))
+
+    if workflow and workflow['shard_id'] is not None:
+        await db.delete_user_credential(credential['user_id'])
+        print(f"✅ Deleted user data from database")
+        if not rebuild_shard:
+            await fan_out_async(*calls)
+            return
+        await asyncio.to_thread(web.shards.rebuild_shard, workflow['shard_id'])
+    elif workflow and workflow['n8n_workflow_id']:
+        calls.append(partial(n8n.delete_workflow, workflow['n8n_workflow_id']))
+
+    if credential['n8n_gmail_credential']:
+        calls.append(partial(n8n.delete_credential, credential['n8n_gmail_credential']))
+    await fan_out_async(*calls)
+    print(f"✅ Deleted n8n objects for {credential['gmail_email']}")
+
+    if workflow is None or workflow['shard_id'] is None:
+        # Workflow rows go with the credential (ON DELETE CASCADE)
+        await db.delete_user_credential(credential['user_id'])
+        print(f"✅ Deleted user data from database")
+
+
+@endpoint("/login/callback", login=True)
+async def callback(request, session):
+    """Handle OAuth callback and queue workflow provisioning"""
+    code = request.query_params.get("code")
+    error = request.query_params.get("error")
+    user_id = session['user_id']
+
+    if error:
+        flash(session, f"Authorization error: {error}", "error")
+        return redirect("/dashboard")
+
+    if not code:
+        flash(session, "No authorization code received", "error")
+        return redirect("/dashboard")
+
+    try:
+        print("🔄 Processing OAuth callback...")
+
+        tokens = await oauth.exchange_code(code)
+        access_token = tokens["access_token"]
+        refresh_token = tokens["refresh_token"]
+        token_expires_at, token_refresh_after = token_schedule(tokens.get("expires_in", 3600))
+        print("✅ Got OAuth tokens")
+
+        email = await oauth.get_user_email(access_token)
+        print(f"✅ User email: {email}")
+
+        existing_credential = await db.get_credential_by_email(email)
+        if existing_credential and existing_credential['user_id'] != user_id:
+            flash(session, f"Gmail account {email} is already connected by another user", "error")
+            return redirect("/dashboard")
+
+        connection = await db.connect_gmail(
+            user_id, email, access_token, refresh_token, token_expires_at, token_refresh_after,
+            max_attempts=config.PROVISIONING_MAX_ATTEMPTS,
+        )
+        if connection is None:
+            flash(session, f"Gmail account {email} is already connected by another user", "error")
+            return redirect("/dashboard")
+        print("✅ Saved credential and queued workflow provisioning")
+
+        web.provisioning.wake()
+        flash(session, f"Successfully connected Gmail account {email}! Your workflow is being set up.", "success")
+        return redirect("/dashboard")
+
+    except Exception as e:
+        print(f"❌ Setup failed: {str(e)}")
+        flash(session, f"Setup failed: {str(e)}", "error")
+        return redirect("/dashboard")
+
+
+@endpoint("/create-workflow", login=True)
+async def create_workflow(request, session):
+    """Create workflow for existing Gmail connection"""
+    user_id = session['user_id']
+
+    try:
+        credential, existing_workflow = await fan_out_async(
+            partial(db.get_user_credential, user_id), partial(db.get_user_workflow, user_id)
+        )
+        if not credential:
+            flash(session, "No Gmail account connected. Please connect Gmail first.", "error")
+            return redirect("/dashboard")
+
+        if existing_workflow and not web.workflow_needs_setup(existing_workflow):
+            flash(session, "Workflow already exists for this account.", "error")
+            return redirect("/dashboard")
+
+        await queue_workflow_provisioning(user_id, credential['id'], existing_workflow)
+        print("✅ Queued workflow provisioning")
+
+        flash(session, "Workflow is being created!", "success")
+        return redirect("/dashboard")
+
+    except Exception as e:
+        print(f"❌ Workflow creation failed: {str(e)}")
+        flash(session, f"Workflow creation failed: {str(e)}", "error")
+        return redirect("/dashboard")
+
+
+@endpoint("/disconnect-gmail-delete-workflow", methods=("POST",), login=True)
+async def disconnect_gmail_delete_workflow(request, session):
+    """Disconnect Gmail account and delete workflow"""
+    user_id = session['user_id']
+
+    try:
+        credential, workflow = await fan_out_async(
+            partial(db.get_user_credential, user_id), partial(db.get_user_workflow, user_id)
+        )
+        if not credential:
+            flash(session, "No Gmail account connected.", "error")
+            return redirect("/dashboard")
+
+        await teardown_tenant(credential, workflow)
+        # Sign out the user's other devices; this one stays signed in
+        await db.revoke_user_sessions([user_id], keep=session.session_id)
+
+        flash(session, "Gmail account disconnected successfully!", "success")
+        return redirect("/dashboard")
+
+    except Exception as e:
+        print(f"❌ Disconnect failed: {str(e)}")
+        flash(session, f"Disconnect failed: {str(e)}", "error")
+        return redirect("/dashboard")
+
+
+@endpoint("/users/<email>/delete", methods=("POST",), login=True)
+async def delete_user(request, session):
+    email = request.path_params["email"]
+    try:
+        credential = await db.get_credential_by_email(email)
+        if not credential:
+            flash(session, "User not found", "error")
+            return redirect("/users")
+
+        workflow = await db.get_user_workflow(credential['user_id'])
+        await teardown_tenant(credential, workflow)
+        revoked = await db.revoke_user_sessions([credential['user_id']])
+        print(f"✅ Deleted user: {email}, revoked {revoked} sessions")
+
+        flash(session, f"User {email} deleted successfully", "success")
+        return redirect("/users")
+
+    except Exception as e:
+        print(f"❌ Delete failed: {str(e)}")
+        flash(session, f"Delete failed: {str(e)}", "error")
+        return redirect("/users")
+
+
+async def delete_tenants(emails: list) -> dict:
+    """app.delete_tenants with at most BULK_DELETE_CONCURRENCY tenants in flight"""
+    report = {"deleted": [], "not_found": [], "failed": []}
+    shard_members = {}
+    user_ids = []
+    limit = asyncio.Semaphore(config.BULK_DELETE_CONCURRENCY)
+
+    async def delete_one(email):
+        async with limit:
+            credential = await db.get_credential_by_email(email)
+            if not credential:
+                return "not_found", None
+            workflow = await db.get_user_workflow(credential['user_id'])
+            await teardown_tenant(credential, workflow, rebuild_shard=False)
+            return "deleted", (workflow, credential)
+
+    async def finish_shard(shard_id):
+        # Rebuild once without the removed mailboxes, then drop their n8n credentials
+        async with limit:
+            await asyncio.to_thread(web.shards.rebuild_shard, shard_id)
+            await fan_out_async(*[
+                partial(n8n.delete_credential, credential['n8n_gmail_credential'])
+                for credential in shard_members[shard_id] if credential['n8n_gmail_credential']
+            ])
+
+    results = await asyncio.gather(*[delete_one(email) for email in emails], return_exceptions=True)
+    for email, result in zip(emails, results):
+        if isinstance(result, Exception):
+            report["failed"].append({"email": email, "error": str(result)})
+            continue
+        outcome, deleted = result
+        report[outcome].append(email)
+        if deleted:
+            user_ids.append(deleted[1]['user_id'])
+        if deleted and deleted[0] and deleted[0]['shard_id'] is not None:
+            shard_members.setdefault(deleted[0]['shard_id'], []).append(deleted[1])
+
+    shard_ids = list(shard_members)
+    results = await asyncio.gather(*[finish_shard(shard_id) for shard_id in shard_ids], return_exceptions=True)
+    for shard_id, result in zip(shard_ids, results):
+        if isinstance(result, Exception):
+            report["failed"].append({"shard_id": shard_id, "error": str(result)})
+
+    # One statement for every deleted tenant's sessions
+    report["revoked_sessions"] = await db.revoke_user_sessions(user_ids)
+    return report
+
+
+@endpoint("/api/users/bulk-delete", methods=("POST",), login=True)
+async def bulk_delete_users(request, session):
+    """Delete the tenants listed in {"emails": [...]} concurrently"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    emails = data.get("emails") if isinstance(data, dict) else None
+    if not isinstance(emails, list) or not all(isinstance(e, str) for e in emails):
+        raise HTTPException(400, detail='Expected {"emails": [...]}')
+    if len(emails) > config.BULK_DELETE_MAX:
+        raise HTTPException(400, detail=f"At most {config.BULK_DELETE_MAX} emails per request")
+
+    report = await delete_tenants(list(dict.fromkeys(emails)))
+    print(f"✅ Bulk delete: {len(report['deleted'])} deleted, {len(report['failed'])} failed")
+    return json_response(report, 207 if report["failed"] else 200)
+
+
+@endpoint("/api/users")
+async def api_users(request, session):
+    if request.query_params.get("format") == "ndjson":
+        async def generate():
+            async for user in db.iter_all_workflows(config.STREAM_BATCH_SIZE):
+                yield web.app.json.dumps(user) + "\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    limit, after = page_args(request)
+    users, next_cursor = await db.get_workflows_page(limit, after)
+    headers = {}
+    if next_cursor:
+        next_url = f"/api/users?{urlencode({'cursor': next_cursor, 'limit': limit})}"
+        headers = {"Link": f'<{next_url}>; rel="next"', "X-Next-Cursor": next_cursor}
+    return json_response(users, headers=headers)
+
+
+@endpoint("/api/health")
+async def health(request, session):
+    return json_response({"status": "healthy", "service": "gmail-telegram-automation"})
+
+
+@endpoint("/api/stats")
+async def stats(request, session):
+    return json_response({
+        "db_pool": web.db.pool_stats(),
+        "async_db_pool": db.pool_stats(),
+        "cache": web.db.cache_stats(),
+        "sessions": await db.count_sessions(datetime.utcnow()),
+    })
+
+
+@endpoint("/api/usage", login=True)
+async def api_usage(request, session):
+    """Per-tenant execution totals from the daily rollups, busiest first"""
+    def int_arg(name, default):
+        try:
+            return int(request.query_params.get(name, default))
+        except ValueError:
+            return default
+
+    days = max(1, int_arg("days", 7))
+    limit = min(max(1, int_arg("limit", config.ADMIN_PAGE_SIZE)), config.ADMIN_MAX_PAGE_SIZE)
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    return json_response({"since": since.isoformat(), "tenants": await db.get_usage_report(since, limit)})
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global db, sessions, oauth, n8n
+    web.create_app()
+    db = AsyncUserDB(web.db)
+    sessions = AsyncSessionStore(db, web.app)
+    await db.open()
+    oauth = AsyncGoogleOAuth()
+    n8n = AsyncN8NManager(web.n8n.workflow_index)
+    print(f"🚀 Async routes ready: {', '.join(route.path for route in routes)}")
+    try:
+        yield
+    finally:
+        await fan_out_async(oauth.aclose, n8n.aclose, db.close, return_exceptions=True)
+
+
+app = Starlette(
+    routes=routes + [Mount("/", app=WSGIMiddleware(web.app, workers=config.ASYNC_WSGI_THREADS))],
+    lifespan=lifespan,
+)
@@ -0,0 +1,127 @@
+"""httpx clients for Google OAuth and the n8n API, for the async routes.
+
+They cover the calls made by the routes in asgi.py and keep the
+behaviour of their blocking counterparts:
+- the same configuration and latency metrics
+- n8n retries: a 429 for any method (honouring Retry-After), a 5xx
+  for idempotent methods only
+- the same return values
+
+Each client keeps one keep-alive connection pool for the event loop that
+opened it.
+"""
+import asyncio
+import time
+
+import httpx
+
+import config
+from metrics import GOOGLE_REQUEST_DURATION, N8N_REQUEST_DURATION
+from n8n_manager import ENDPOINT_ID_RE, WorkflowNameIndex
+from oauth_handler import GoogleOAuth
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class AsyncGoogleOAuth(GoogleOAuth):
+    def __init__(self):
+        super().__init__()
+        self.client = httpx.AsyncClient(timeout=30.0)
+
+    async def aclose(self) -> None:
+        """Close pooled HTTP connections"""
+        await self.client.aclose()
+
+    async def _timed_async(self, call: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request to Google and record its latency"""
+        status = "error"
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            GOOGLE_REQUEST_DURATION.observe(time.perf_counter() - start, call=call, status=status)
+
+    async def exchange_code(self, code: str) -> dict:
+        """Exchange authorization code for tokens"""
+        data = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "code": code,
+            "grant_type": "authorization_code",
+            "redirect_uri": self.redirect_uri,
+        }
+        response = await self._timed_async("exchange_code", "POST", config.GOOGLE_TOKEN_URL, data=data)
+        if response.status_code != 200:
+            raise Exception(f"Token exchange failed: {response.text}")
+        return response.json()
+
+    async def get_user_email(self, access_token: str) -> str:
+        """Get user email from access token"""
+        response = await self._timed_async(
+            "userinfo", "GET", config.GOOGLE_USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"}
+        )
+        if response.status_code != 200:
+            raise Exception(f"Failed to get user info: {response.text}")
+        return response.json().get("email")
+
+
+class AsyncN8NManager:
+    def __init__(self, workflow_index: WorkflowNameIndex = None, pool_size: int = None):
+        self.base_url = config.N8N_URL
+        # Share the blocking manager's index so deletes from either side keep it current
+        self.workflow_index = workflow_index or WorkflowNameIndex(config.N8N_WORKFLOW_INDEX_TTL)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url or "",
+            headers={"Content-Type": "application/json", "X-N8N-API-KEY": config.N8N_API_KEY},
+            timeout=httpx.Timeout(config.N8N_READ_TIMEOUT, connect=config.N8N_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max(pool_size or 0, config.N8N_POOL_SIZE)),
+            transport=httpx.AsyncHTTPTransport(retries=config.N8N_MAX_RETRIES),
+        )
+
+    async def aclose(self) -> None:
+        """Close pooled HTTP connections"""
+        await self.client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request to the n8n API, retrying with backoff like N8NRetry"""
+        endpoint = ENDPOINT_ID_RE.sub(r"/\1/{id}", path)
+        for attempt in range(config.N8N_MAX_RETRIES + 1):
+            status = "error"
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, **kwargs)
+                status = str(response.status_code)
+            finally:
+                N8N_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, endpoint=endpoint, status=status)
+
+            retryable = response.status_code == 429 or (
+                response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+            )
+            if not retryable or attempt == config.N8N_MAX_RETRIES:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else config.N8N_RETRY_BACKOFF * (2 ** attempt)
+            await asyncio.sleep(delay)
+        return response
+
+    async def delete_workflow(self, workflow_id: str) -> bool:
+        """Delete workflow from n8n"""
+        try:
+            response = await self._request("DELETE", f"/api/v1/workflows/{workflow_id}")
+            deleted = response.status_code in [200, 204]
+            if deleted:
+                self.workflow_index.discard_id(workflow_id)
+            return deleted
+        except httpx.HTTPError:
+            return False
+
+    async def delete_credential(self, credential_id: str) -> bool:
+        """Delete credential from n8n"""
+        try:
+            response = await self._request("DELETE", f"/api/v1/credentials/{credential_id}")
+            return response.status_code in [200, 204]
+        except httpx.HTTPError:
+            return False
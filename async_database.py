@@ -0,0 +1,249 @@
+"""asyncpg access for the async routes served by asgi.py.
+
+Covers only what those routes need. It shares the lookup cache and its
+invalidation with the ``UserDB`` of the same process, so a write from
+either side is seen by both. asyncpg prepares every statement and caches
+it per connection, so the stored-function calls are planned once per
+connection here too. SQL shared with ``UserDB`` is reused, with psycopg2's
+``%s`` placeholders renumbered to ``$n``.
+"""
+import itertools
+import re
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import asyncpg
+
+import config
+from database import (
+    ALL_WORKFLOWS_SQL,
+    CONNECT_GMAIL_SQL,
+    CREDENTIAL_BY_EMAIL_SQL,
+    ENQUEUE_PROVISIONING_JOB_SQL,
+    USER_CREDENTIAL_SQL,
+    USER_WORKFLOW_SQL,
+    WORKFLOWS_FIRST_PAGE_SQL,
+    WORKFLOWS_NEXT_PAGE_SQL,
+    UserDB,
+    encode_page_cursor,
+)
+
+
+def numbered(sql: str) -> str:
+    """Rewrite psycopg2 %s placeholders as asyncpg $1, $2, ..."""
+    counter = itertools.count(1)
+    return re.sub(r"%s", lambda _: f"${next(counter)}", sql)
+
+
+class AsyncUserDB:
+    def __init__(self, db: UserDB):
+        self.db = db
+        self.cache = db.cache
+        self.pool = None
+
+    async def open(self) -> None:
+        """Create the connection pool; call once the event loop is running"""
+        self.pool = await asyncpg.create_pool(
+            host=config.DB_HOST,
+            port=int(config.DB_PORT) if config.DB_PORT else None,
+            database=config.DB_NAME,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            min_size=config.ASYNC_DB_POOL_MIN_SIZE,
+            max_size=config.ASYNC_DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=config.DB_POOL_MAX_AGE,
+            timeout=config.DB_POOL_TIMEOUT,
+        )
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+
+    def pool_stats(self) -> Dict:
+        """Get connection pool statistics"""
+        if not self.pool:
+            return {"size": 0, "idle": 0, "in_use": 0}
+        size, idle = self.pool.get_size(), self.pool.get_idle_size()
+        return {"size": size, "idle": idle, "in_use": size - idle, "max_size": self.pool.get_max_size()}
+
+    async def _fetch_one(self, sql: str, *args) -> Optional[Dict]:
+        row = await self.pool.fetchrow(sql, *args)
+        return dict(row) if row else None
+
+    async def get_user_credential(self, user_id: int) -> Optional[Dict]:
+        """Get user's Gmail credential"""
+        return await self.cache.get_or_load_async(
+            f"credential:{user_id}", lambda: self._fetch_one(numbered(USER_CREDENTIAL_SQL), user_id)
+        )
+
+    async def get_user_workflow(self, user_id: int) -> Optional[Dict]:
+        """Get user's workflow"""
+        return await self.cache.get_or_load_async(
+            f"workflow:{user_id}", lambda: self._fetch_one(numbered(USER_WORKFLOW_SQL), user_id)
+        )
+
+    async def get_credential_by_email(self, email: str) -> Optional[Dict]:
+        """Get credential by email"""
+        return await self._fetch_one(numbered(CREDENTIAL_BY_EMAIL_SQL), email)
+
+    async def connect_gmail(self, user_id: int, email: str, access_token: str, refresh_token: str,
+                            token_expires_at: datetime = None, token_refresh_after: datetime = None,
+                            max_attempts: int = 5) -> Optional[Dict]:
+        """UserDB.connect_gmail: credential, pending workflow and provisioning job in one transaction"""
+        row = await self._fetch_one(
+            CONNECT_GMAIL_SQL, [user_id], [email], [access_token], [refresh_token],
+            [token_expires_at], [token_refresh_after], max_attempts,
+        )
+        if row:
+            self.db._invalidate_users(row["user_id"])
+            self.db._invalidate_n8n_workflows(row["n8n_workflow_id"])
+        return row
+
+    async def create_workflow(self, user_id: int, gmail_credential_id: int, workflow_status: str = "inactive") -> int:
+        """Create a workflow record that has no n8n workflow yet"""
+        workflow_id = await self.pool.fetchval(
+            """
+            INSERT INTO workflows (user_id, gmail_credential_id, workflow_status)
+            VALUES ($1, $2, $3)
+            RETURNING id
+        """,
+            user_id, gmail_credential_id, workflow_status,
+        )
+        self.db._invalidate_users(user_id)
+        return workflow_id
+
+    async def update_workflow_status(self, workflow_id: int, status: str) -> None:
+        """Update workflow status"""
+        row = await self.pool.fetchrow(
+            """
+            UPDATE workflows
+            SET workflow_status = $1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = $2
+            RETURNING user_id, n8n_workflow_id
+        """,
+            status, workflow_id,
+        )
+        if row:
+            self.db._invalidate_users(row["user_id"])
+            self.db._invalidate_n8n_workflows(row["n8n_workflow_id"])
+
+    async def enqueue_provisioning_job(self, user_id: int, gmail_credential_id: int, workflow_id: int,
+                                       max_attempts: int = 5) -> int:
+        """Queue a job that provisions the n8n credential and workflow, reusing the workflow's open job"""
+        return await self.pool.fetchval(
+            numbered(ENQUEUE_PROVISIONING_JOB_SQL), user_id, gmail_credential_id, workflow_id, max_attempts
+        )
+
+    async def delete_user_credential(self, user_id: int) -> bool:
+        """Delete user's credential and, by ON DELETE CASCADE, its workflows"""
+        row = await self.pool.fetchrow(
+            """
+            WITH cascaded AS (
+                SELECT w.user_id, w.n8n_workflow_id
+                FROM workflows w
+                JOIN gmail_credentials c ON w.gmail_credential_id = c.id
+                WHERE c.user_id = $1
+            ), deleted AS (
+                DELETE FROM gmail_credentials WHERE user_id = $1 RETURNING user_id
+            )
+            SELECT
+                ARRAY(SELECT user_id FROM deleted) AS credential_users,
+                ARRAY(SELECT user_id FROM cascaded) AS workflow_users,
+                ARRAY(SELECT n8n_workflow_id FROM cascaded) AS n8n_workflow_ids
+        """,
+            user_id,
+        )
+        self.db._invalidate_users(*row["credential_users"], *row["workflow_users"])
+        self.db._invalidate_n8n_workflows(*row["n8n_workflow_ids"])
+        return len(row["credential_users"]) > 0
+
+    async def get_workflows_page(self, limit: int, after: Tuple[datetime, int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get one keyset page of workflows, newest first, and the cursor of the next page"""
+        if after:
+            records = await self.pool.fetch(numbered(WORKFLOWS_NEXT_PAGE_SQL), after[0], after[1], limit + 1)
+        else:
+            records = await self.pool.fetch(numbered(WORKFLOWS_FIRST_PAGE_SQL), limit + 1)
+        rows = [dict(record) for record in records]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_page_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        return rows, next_cursor
+
+    async def iter_all_workflows(self, batch_size: int = 1000) -> AsyncIterator[Dict]:
+        """Stream all workflows through a server-side cursor, batch_size rows at a time"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for record in conn.cursor(ALL_WORKFLOWS_SQL, prefetch=batch_size):
+                    yield dict(record)
+
+    async def get_usage_report(self, since: datetime, limit: int = 100) -> List[Dict]:
+        """Per-tenant totals from the daily rollups since a day, busiest first"""
+        records = await self.pool.fetch(
+            """
+            SELECT r.workflow_id, r.user_id, c.gmail_email,
+                   SUM(r.executions)::bigint AS executions, SUM(r.failed)::bigint AS failed,
+                   SUM(r.messages)::bigint AS messages,
+                   (SUM(r.total_duration_ms) / NULLIF(SUM(r.executions), 0))::int AS avg_duration_ms,
+                   MAX(r.max_duration_ms) AS max_duration_ms
+            FROM execution_rollups_daily r
+            LEFT JOIN workflows w ON w.id = r.workflow_id
+            LEFT JOIN gmail_credentials c ON c.id = w.gmail_credential_id
+            WHERE r.bucket >= $1
+            GROUP BY r.workflow_id, r.user_id, c.gmail_email
+            ORDER BY executions DESC
+            LIMIT $2
+        """,
+            since, limit,
+        )
+        return [dict(record) for record in records]
+
+    async def get_session(self, session_id: str) -> Optional[Dict]:
+        """Get a server-side session record, cached like UserDB.get_session"""
+        def load():
+            return self._fetch_one(
+                "SELECT id, user_id, data, refreshed_at, expires_at FROM user_sessions WHERE id = $1", session_id
+            )
+        if not self.cache.shared_across_processes:
+            return await load()
+        return await self.cache.get_or_load_async(f"session:{session_id}", load)
+
+    async def save_session(self, session_id: str, user_id: Optional[int], data: str, refreshed_at: datetime,
+                           expires_at: datetime) -> None:
+        """Create or replace a server-side session and extend its expiry"""
+        await self.pool.execute(
+            """
+            INSERT INTO user_sessions (id, user_id, data, refreshed_at, expires_at) VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (id) DO UPDATE SET user_id = EXCLUDED.user_id, data = EXCLUDED.data,
+                refreshed_at = EXCLUDED.refreshed_at, expires_at = EXCLUDED.expires_at
+        """,
+            session_id, user_id, data, refreshed_at, expires_at,
+        )
+        self.cache.delete(f"session:{session_id}")
+
+    async def delete_sessions(self, *session_ids: str) -> None:
+        """Delete server-side sessions"""
+        if not session_ids:
+            return
+        await self.pool.execute("DELETE FROM user_sessions WHERE id = ANY($1)", list(session_ids))
+        self.cache.delete(*[f"session:{session_id}" for session_id in session_ids])
+
+    async def revoke_user_sessions(self, user_ids: List[int], keep: str = None) -> int:
+        """Delete every session of the given users except keep; returns how many were revoked"""
+        if not user_ids:
+            return 0
+        records = await self.pool.fetch(
+            "DELETE FROM user_sessions WHERE user_id = ANY($1) AND id <> $2 RETURNING id", list(user_ids), keep or ""
+        )
+        self.cache.delete(*[f"session:{record['id']}" for record in records])
+        return len(records)
+
+    async def count_sessions(self, now: datetime) -> Dict:
+        """Count unexpired sessions and the users they belong to"""
+        return await self._fetch_one(
+            "SELECT COUNT(*) AS sessions, COUNT(DISTINCT user_id) AS users FROM user_sessions WHERE expires_at >= $1",
+            now,
+        )
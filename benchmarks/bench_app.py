@@ -0,0 +1,230 @@
+"""Load test the web app against local n8n and Google stand-ins.
+
+Boots the Flask app on a threaded local server. n8n and Google OAuth are
+replaced by in-process fakes (see fake_services.py) with configurable
+latency and error injection. Postgres is real: point the DB_* variables at
+a local database and apply the schema first:
+
+    python migrate_db.py up
+    python benchmarks/bench_app.py --clients 16 --seconds 30
+    python benchmarks/bench_app.py --mix dashboard=1 --n8n-latency-ms 50 --n8n-error-rate 0.02
+
+``--server asgi`` serves asgi.py with uvicorn instead (needs
+requirements-async.txt). To compare concurrent OAuth callback capacity on
+the same core, cap the WSGI server at a realistic thread count and use
+slow Google responses:
+
+    python benchmarks/bench_app.py --server wsgi --threads 16 --clients 200 --mix callback=1 --google-latency-ms 300
+    python benchmarks/bench_app.py --server asgi --clients 200 --mix callback=1 --google-latency-ms 300
+
+Each of ``--clients`` virtual users logs in once, then picks requests at
+random from ``--mix``:
+- login
+- dashboard
+- callback (a Gmail reconnect through the fake consent flow)
+- admin (the HTML and JSON user listings)
+
+The report gives throughput and p50/p90/p99 latency per route. Requests
+during ``--warmup`` are not counted.
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_services import FakeGoogle, FakeN8N  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def bounded(wsgi_app, slots: int):
+    """Let at most `slots` requests run at once, like a server with that many worker threads"""
+    semaphore = threading.BoundedSemaphore(slots)
+
+    def handle(environ, start_response):
+        with semaphore:
+            return list(wsgi_app(environ, start_response))
+    return handle
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("login", "dashboard", "callback", "admin"):
+            raise argparse.ArgumentTypeError(f"Unknown traffic kind: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, username: str, record):
+        self.base_url = base_url
+        self.username = username
+        self.record = record
+        self.session = requests.Session()
+        self.reconnects = 0
+
+    def _send(self, route: str, method: str, path: str, **kwargs) -> None:
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", allow_redirects=False, timeout=60, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        self.record(route, time.perf_counter() - start, ok)
+
+    def login(self) -> None:
+        self._send("POST /login", "POST", "/login", data={"username": self.username, "password": BENCH_PASSWORD})
+
+    def dashboard(self) -> None:
+        self._send("GET /dashboard", "GET", "/dashboard")
+
+    def callback(self) -> None:
+        self.reconnects += 1
+        self._send("GET /login/callback", "GET", "/login/callback", params={"code": f"{self.username}.{self.reconnects}"})
+
+    def admin(self) -> None:
+        if random.random() < 0.5:
+            self._send("GET /users", "GET", "/users", params={"limit": 50})
+        else:
+            self._send("GET /api/users", "GET", "/api/users", params={"limit": 50})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the web app against fake n8n and Google services")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Measured duration")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured lead-in")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("login=1,dashboard=6,callback=1,admin=2"))
+    parser.add_argument("--n8n-latency-ms", type=float, default=20.0)
+    parser.add_argument("--n8n-error-rate", type=float, default=0.0)
+    parser.add_argument("--google-latency-ms", type=float, default=50.0)
+    parser.add_argument("--google-error-rate", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Extra random latency on both fakes")
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi",
+                        help="Serve app.py on threads or asgi.py on an event loop")
+    parser.add_argument("--threads", type=int, default=0, help="Concurrent request cap of the WSGI server (0 = none)")
+    args = parser.parse_args(argv)
+
+    n8n = FakeN8N(latency_ms=args.n8n_latency_ms, jitter_ms=args.jitter_ms, error_rate=args.n8n_error_rate)
+    google = FakeGoogle(latency_ms=args.google_latency_ms, jitter_ms=args.jitter_ms, error_rate=args.google_error_rate)
+    n8n_url, google_url = n8n.start(), google.start()
+
+    # config reads the environment at import, so the app is imported after this
+    os.environ.update(
+        N8N_URL=n8n_url,
+        N8N_API_KEY="bench",
+        GOOGLE_CLIENT_ID="bench",
+        GOOGLE_CLIENT_SECRET="bench",
+        GOOGLE_AUTH_URL=f"{google_url}/auth",
+        GOOGLE_TOKEN_URL=f"{google_url}/token",
+        GOOGLE_USERINFO_URL=f"{google_url}/userinfo",
+        REDIRECT_URI="http://127.0.0.1/login/callback",
+    )
+    for name in ("TOKEN_REFRESH_INTERVAL", "STATUS_SYNC_INTERVAL", "EXECUTION_INGEST_INTERVAL"):
+        os.environ.setdefault(name, "0")
+
+    from werkzeug.serving import make_server
+    import app as web
+    web.create_app()
+
+    usernames = [f"bench_user_{i}" for i in range(args.clients)]
+    for username in usernames:
+        web.db.create_user(username, BENCH_PASSWORD)
+
+    if args.server == "asgi":
+        import uvicorn
+        import asgi
+
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1024)
+        server = uvicorn.Server(uvicorn.Config(asgi.app, log_level="warning", lifespan="on"))
+        threading.Thread(target=server.run, kwargs={"sockets": [listener]}, name="bench-app", daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        base_url = f"http://127.0.0.1:{listener.getsockname()[1]}"
+
+        def stop_server():
+            server.should_exit = True
+    else:
+        wsgi_app = bounded(web.app, args.threads) if args.threads else web.app
+        server = make_server("127.0.0.1", 0, wsgi_app, threaded=True)
+        threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        stop_server = server.shutdown
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    measuring = threading.Event()
+    stop = threading.Event()
+
+    def record(route, seconds, ok):
+        if not measuring.is_set():
+            return
+        with lock:
+            latencies[route].append(seconds)
+            if not ok:
+                errors[route] += 1
+
+    kinds, weights = list(args.mix), list(args.mix.values())
+
+    def drive(username):
+        user = VirtualUser(base_url, username, record)
+        user.login()
+        while not stop.is_set():
+            getattr(user, random.choices(kinds, weights)[0])()
+
+    threads = [threading.Thread(target=drive, args=(u,), daemon=True) for u in usernames]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(args.seconds)
+    measuring.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    stop_server()
+
+    print(f"{args.clients} clients on {args.server}, {elapsed:.1f}s measured, mix "
+          + ",".join(f"{k}={v:g}" for k, v in args.mix.items()))
+    print(f"{'route':<22}{'requests':>10}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    total = 0
+    for route in sorted(latencies):
+        values = sorted(latencies[route])
+        total += len(values)
+        print(f"{route:<22}{len(values):>10}{len(values) / elapsed:>9.1f}{errors[route]:>8}"
+              f"{percentile(values, 0.5) * 1000:>9.1f}{percentile(values, 0.9) * 1000:>9.1f}"
+              f"{percentile(values, 0.99) * 1000:>9.1f}{values[-1] * 1000:>9.1f}")
+    print(f"{'total':<22}{total:>10}{total / elapsed:>9.1f}{sum(errors.values()):>8}")
+    print(f"fake n8n: {n8n.stats()}, fake Google: {google.stats()}")
+
+    web.provisioning.stop()
+    web.db.close()
+    n8n.stop()
+    google.stop()
+    return 1 if sum(errors.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Write throughput of the Gmail connection path.
+
+Connects ``--tenants`` fresh users three ways and reports tenants per
+second for each:
+- steps: save_credential, update_credential_n8n_id, create_workflow and
+  enqueue_provisioning_job, i.e. four connections and four commits per tenant
+- connect: one connect_gmail statement per tenant
+- bulk: connect_gmail_bulk in batches of ``--batch``
+
+Postgres is real: point the DB_* variables at a scratch database with the
+schema applied. Benchmark users are created with a placeholder password hash
+and deleted afterwards:
+
+    python benchmarks/bench_onboarding.py --tenants 2000 --batch 500
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2.extras
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import UserDB  # noqa: E402
+
+USER_PREFIX = "bench_onboard_"
+
+
+def create_users(db: UserDB, run: str, count: int) -> list:
+    with db._get_connection() as conn:
+        with conn.cursor() as cursor:
+            rows = psycopg2.extras.execute_values(
+                cursor,
+                "INSERT INTO user_accounts (username, password_hash) VALUES %s RETURNING id",
+                [(f"{USER_PREFIX}{run}_{i}", "!") for i in range(count)],
+                page_size=count,
+                fetch=True,
+            )
+    return [row[0] for row in rows]
+
+
+def delete_users(db: UserDB) -> None:
+    with db._get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM user_accounts WHERE username LIKE %s", (f"{USER_PREFIX}%",))
+
+
+def accounts_for(run: str, user_ids: list) -> list:
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    return [
+        (user_id, f"{run}.{user_id}@bench.example.com", "access", "refresh", expires_at, expires_at - timedelta(minutes=10))
+        for user_id in user_ids
+    ]
+
+
+def connect_steps(db: UserDB, accounts: list) -> None:
+    for user_id, email, access_token, refresh_token, expires_at, refresh_after in accounts:
+        credential_id = db.save_credential(user_id, email, access_token, refresh_token, expires_at, refresh_after)
+        db.update_credential_n8n_id(credential_id, None)
+        workflow_id = db.create_workflow(user_id, credential_id, None, workflow_status="pending")
+        db.enqueue_provisioning_job(user_id, credential_id, workflow_id)
+
+
+def connect_single(db: UserDB, accounts: list) -> None:
+    for account in accounts:
+        db.connect_gmail(*account)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Gmail connection writes")
+    parser.add_argument("--tenants", type=int, default=1000, help="Users connected per strategy")
+    parser.add_argument("--batch", type=int, default=500, help="Batch size of the bulk strategy")
+    args = parser.parse_args(argv)
+
+    def connect_bulk(db: UserDB, accounts: list) -> None:
+        for i in range(0, len(accounts), args.batch):
+            db.connect_gmail_bulk(accounts[i:i + args.batch])
+
+    strategies = [("steps", connect_steps), ("connect", connect_single), ("bulk", connect_bulk)]
+
+    db = UserDB()
+    try:
+        print(f"{'strategy':<10}{'tenants':>9}{'seconds':>10}{'tenants/s':>12}")
+        for name, run in strategies:
+            accounts = accounts_for(name, create_users(db, name, args.tenants))
+            start = time.perf_counter()
+            run(db, accounts)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<10}{len(accounts):>9}{elapsed:>10.2f}{len(accounts) / elapsed:>12.1f}")
+    finally:
+        delete_users(db)
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
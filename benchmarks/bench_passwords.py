@@ -0,0 +1,72 @@
+"""Password hashing throughput at different cost settings.
+
+Reports verifications per second on one core and with a process pool of
+``--workers`` processes, plus the latency of a single login, for each
+scrypt/PBKDF2 setting. Use it to pick the highest cost that still meets the
+login rate you need:
+
+    python benchmarks/bench_passwords.py --workers 4 --seconds 3
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from passwords import PasswordHasher  # noqa: E402
+
+SETTINGS = [
+    ("scrypt n=2^13", dict(algorithm="scrypt", scrypt_n=2 ** 13)),
+    ("scrypt n=2^14", dict(algorithm="scrypt", scrypt_n=2 ** 14)),
+    ("scrypt n=2^15", dict(algorithm="scrypt", scrypt_n=2 ** 15)),
+    ("pbkdf2 300k", dict(algorithm="pbkdf2_sha256", pbkdf2_iterations=300_000)),
+    ("pbkdf2 600k", dict(algorithm="pbkdf2_sha256", pbkdf2_iterations=600_000)),
+]
+
+
+def measure(hasher: PasswordHasher, stored: str, seconds: float, threads: int) -> float:
+    """Verifications per second sustained by `threads` concurrent callers"""
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        count = 0
+        while time.perf_counter() < deadline:
+            hasher.verify("correct horse battery staple", stored)
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        total = sum(executor.map(lambda _: worker(), range(threads)))
+    return total / (time.perf_counter() - started)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark password hashing cost settings")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Process pool size for the pooled run")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duration of each measurement")
+    args = parser.parse_args(argv)
+
+    print(f"{'setting':<16}{'login ms':>10}{'1 core/s':>10}{f'{args.workers} procs/s':>14}{'per core':>10}")
+    for name, options in SETTINGS:
+        inline = PasswordHasher(workers=0, **options)
+        stored = inline.hash("correct horse battery staple")
+
+        start = time.perf_counter()
+        inline.verify("correct horse battery staple", stored)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        single = measure(inline, stored, args.seconds, threads=1)
+        pooled_hasher = PasswordHasher(workers=args.workers, **options)
+        pooled_hasher.verify("warm up", stored)  # start the worker processes
+        pooled = measure(pooled_hasher, stored, args.seconds, threads=args.workers * 2)
+        pooled_hasher.close()
+
+        print(f"{name:<16}{latency_ms:>10.1f}{single:>10.1f}{pooled:>14.1f}{pooled / args.workers:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
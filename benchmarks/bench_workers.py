@@ -0,0 +1,140 @@
+"""Measure startup time and memory per worker of the gunicorn deployment.
+
+Launches ``gunicorn -c gunicorn.conf.py`` with and without WEB_PRELOAD,
+waits for every worker to report ready, serves a few requests, then
+reads each worker's memory from /proc (Linux only):
+- RSS counts pages shared with the master and the other workers in full
+- PSS splits shared pages between the processes sharing them
+- USS is memory private to the worker
+
+The sum of PSS over the fleet is what it really costs on the node.
+Postgres is used as configured, as in bench_app.py:
+
+    python benchmarks/bench_workers.py --workers 4
+    python benchmarks/bench_workers.py --workers 8 --preload on --requests 2000
+"""
+import argparse
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MASTER_READY_RE = re.compile(r"Master (\d+) ready in ([\d.]+)s")
+WORKER_READY_RE = re.compile(r"Worker (\d+) ready in ([\d.]+)s")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """RSS, PSS and USS of a process in kB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def run_fleet(workers: int, preload: bool, request_count: int, timeout: float) -> Dict:
+    port = free_port()
+    env = dict(
+        os.environ,
+        WEB_BIND=f"127.0.0.1:{port}",
+        WEB_WORKERS=str(workers),
+        WEB_PRELOAD="true" if preload else "false",
+        PYTHONUNBUFFERED="1",
+    )
+    for name in ("TOKEN_REFRESH_INTERVAL", "STATUS_SYNC_INTERVAL", "EXECUTION_INGEST_INTERVAL"):
+        env.setdefault(name, "0")
+
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    master_ready = threading.Event()
+    all_ready = threading.Event()
+    worker_ready: Dict[int, float] = {}
+    result = {}
+
+    def read_log():
+        for line in process.stdout:
+            match = MASTER_READY_RE.search(line)
+            if match:
+                result["master_seconds"] = float(match.group(2))
+                master_ready.set()
+            match = WORKER_READY_RE.search(line)
+            if match:
+                worker_ready[int(match.group(1))] = float(match.group(2))
+                if len(worker_ready) >= workers:
+                    result["fleet_seconds"] = time.monotonic() - started
+                    all_ready.set()
+
+    threading.Thread(target=read_log, daemon=True).start()
+    try:
+        if not all_ready.wait(timeout) or not master_ready.wait(timeout):
+            raise RuntimeError(f"{len(worker_ready)}/{workers} workers ready after {timeout:.0f}s")
+
+        session = requests.Session()
+        for _ in range(request_count):
+            session.get(f"http://127.0.0.1:{port}/api/health", timeout=10).raise_for_status()
+
+        result["master"] = memory_kb(process.pid)
+        result["workers"] = [memory_kb(pid) for pid in worker_ready]
+        result["worker_seconds"] = sorted(worker_ready.values())
+        return result
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def average(rows: List[Dict], field: str) -> float:
+    return statistics.mean(row[field] for row in rows) / 1024
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure gunicorn worker startup time and memory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--preload", choices=("on", "off", "both"), default="both")
+    parser.add_argument("--requests", type=int, default=200, help="Health checks served before measuring memory")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the workers")
+    args = parser.parse_args(argv)
+
+    modes = {"on": [True], "off": [False], "both": [True, False]}[args.preload]
+    print(f"{args.workers} workers, {args.requests} requests before measuring")
+    print(f"{'preload':<9}{'fleet s':>9}{'master s':>10}{'worker p50 s':>14}{'worker max s':>14}"
+          f"{'master RSS':>12}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}{'total PSS':>11}")
+    for preload in modes:
+        result = run_fleet(args.workers, preload, args.requests, args.timeout)
+        rows = result["workers"]
+        total_pss = (result["master"]["pss"] + sum(row["pss"] for row in rows)) / 1024
+        print(f"{'on' if preload else 'off':<9}{result['fleet_seconds']:>9.2f}{result['master_seconds']:>10.2f}"
+              f"{statistics.median(result['worker_seconds']):>14.2f}{result['worker_seconds'][-1]:>14.2f}"
+              f"{result['master']['rss'] / 1024:>9.0f} MB{average(rows, 'rss'):>9.0f} MB"
+              f"{average(rows, 'pss'):>9.0f} MB{average(rows, 'uss'):>9.0f} MB{total_pss:>8.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""Local stand-ins for the n8n API and Google OAuth, for benchmarks.
+
+Both keep their state in memory and serve it over real HTTP, so the
+app's connection pools, retries and timeouts behave as in production.
+Every request can be delayed by ``latency_ms`` (plus up to ``jitter_ms``)
+and failed with a 503 at ``error_rate``.
+
+    n8n = FakeN8N(latency_ms=20, error_rate=0.01)
+    url = n8n.start()        # http://127.0.0.1:<port>
+    ...
+    n8n.stop()
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+Response = Tuple[int, Optional[object], Dict[str, str]]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        status, payload, headers = self.server.service.dispatch(self.command, self.path, raw, self.headers)
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeService:
+    """Threaded HTTP server with latency and error injection; subclasses implement route()"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.injected_errors = 0
+        self.lock = threading.Lock()
+        self._server = None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in a background thread; returns the base URL"""
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def dispatch(self, method: str, path: str, raw: bytes, headers) -> Response:
+        with self.lock:
+            self.requests += 1
+            delay = (self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return 503, {"message": "injected error"}, {}
+
+        url = urlparse(path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            body = {key: values[-1] for key, values in parse_qs(raw.decode()).items()}
+        else:
+            body = json.loads(raw) if raw else None
+        try:
+            return self.route(method, url.path, query, body, headers)
+        except KeyError:
+            return 404, {"message": "not found"}, {}
+
+    def route(self, method: str, path: str, query: Dict, body, headers) -> Response:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {"requests": self.requests, "injected_errors": self.injected_errors}
+
+
+class FakeN8N(FakeService):
+    """The subset of the n8n public API the app uses"""
+
+    ITEM_RE = re.compile(r"^/api/v1/(workflows|credentials)/([^/]+)(/activate)?$")
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {"workflows": {}, "credentials": {}}
+        self._next_id = 0
+
+    def _new_id(self) -> str:
+        with self.lock:
+            self._next_id += 1
+            return str(self._next_id)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
+
+    def _page(self, items: list, query: Dict) -> Response:
+        limit = int(query.get("limit", 100))
+        offset = int(query.get("cursor", 0))
+        page = items[offset:offset + limit]
+        next_cursor = str(offset + limit) if offset + limit < len(items) else None
+        return 200, {"data": page, "nextCursor": next_cursor}, {}
+
+    def route(self, method: str, path: str, query: Dict, body, headers) -> Response:
+        if path in ("/api/v1/workflows", "/api/v1/credentials"):
+            kind = path.rsplit("/", 1)[-1]
+            if method == "GET":
+                return self._page(list(self.objects[kind].values()), query)
+            if method == "POST":
+                now = self._now()
+                item = dict(body, id=self._new_id(), createdAt=now, updatedAt=now)
+                if kind == "workflows":
+                    item.update(active=False, versionId=self._new_id())
+                else:
+                    item.pop("data", None)
+                self.objects[kind][item["id"]] = item
+                return 200, item, {}
+
+        if path == "/api/v1/executions" and method == "GET":
+            return 200, {"data": [], "nextCursor": None}, {}
+        if path.startswith("/webhook/") and method == "POST":
+            return 200, {"message": "Workflow was started"}, {}
+
+        match = self.ITEM_RE.match(path)
+        if not match:
+            return 404, {"message": "not found"}, {}
+        kind, item_id, activate = match.groups()
+        item = self.objects[kind][item_id]
+        if activate and method == "POST":
+            item.update(active=True, updatedAt=self._now())
+            return 200, item, {}
+        if method == "GET":
+            return 200, item, {}
+        if method in ("PUT", "PATCH"):
+            item.update({k: v for k, v in body.items() if k != "data"}, updatedAt=self._now())
+            if kind == "workflows":
+                item["versionId"] = self._new_id()
+            return 200, item, {}
+        if method == "DELETE":
+            del self.objects[kind][item_id]
+            return 200, item, {}
+        return 405, {"message": "method not allowed"}, {}
+
+
+class FakeGoogle(FakeService):
+    """Google OAuth consent, token and userinfo endpoints.
+
+    An authorization code ``<name>.<anything>`` signs in as
+    ``<name>@bench.example.com``, so a client can reconnect the same
+    mailbox with fresh codes.
+    """
+
+    EMAIL_DOMAIN = "bench.example.com"
+
+    def route(self, method: str, path: str, query: Dict, body, headers) -> Response:
+        if path == "/auth" and method == "GET":
+            code = f"consent.{self.random.getrandbits(32)}"
+            return 302, None, {"Location": f"{query['redirect_uri']}?{urlencode({'code': code})}"}
+
+        if path == "/token" and method == "POST":
+            if body.get("grant_type") == "authorization_code":
+                name = body["code"].split(".", 1)[0]
+                return 200, {
+                    "access_token": f"access-{name}-{self.random.getrandbits(32)}",
+                    "refresh_token": f"refresh-{name}",
+                    "expires_in": 3600,
+                    "token_type": "Bearer",
+                }, {}
+            if body.get("grant_type") == "refresh_token":
+                name = body["refresh_token"].split("-", 1)[1]
+                return 200, {"access_token": f"access-{name}-{self.random.getrandbits(32)}", "expires_in": 3600}, {}
+            return 400, {"error": "unsupported_grant_type"}, {}
+
+        if path == "/userinfo" and method == "GET":
+            token = headers.get("Authorization", "").replace("Bearer ", "")
+            if not token.startswith("access-"):
+                return 401, {"error": "invalid_token"}, {}
+            name = token[len("access-"):].rsplit("-", 1)[0]
+            return 200, {"email": f"{name}@{self.EMAIL_DOMAIN}"}, {}
+
+        return 404, {"error": "not_found"}, {}
@@ -0,0 +1,229 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict
+
+import config
+
+MISSING = object()
+
+
+class Cache:
+    """Base class with read-through loading and hit/miss counters.
+
+    ``get_or_load`` remembers the invalidation generation of the key before
+    calling the loader and only stores the result if no ``delete`` of that
+    key happened meanwhile, so a slow read cannot re-populate the cache with
+    a row that a concurrent write has just invalidated.
+    """
+
+    _GENERATION_SLOTS = 4096
+    # Whether a delete here is seen by every worker process
+    shared_across_processes = False
+
+    def __init__(self):
+        self._generations = [0] * self._GENERATION_SLOTS
+        self._counter_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "sets": 0, "invalidations": 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    def _slot(self, key: str) -> int:
+        return hash(key) % self._GENERATION_SLOTS
+
+    def _bump_generations(self, keys) -> None:
+        for key in keys:
+            self._generations[self._slot(key)] += 1
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    def get_or_load(self, key: str, loader: Callable):
+        """Return the cached value for key, calling loader on a miss (None is cached too)"""
+        value = self.get(key)
+        if value is not MISSING:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+        generation = self._generations[self._slot(key)]
+        value = loader()
+        if self._generations[self._slot(key)] == generation:
+            self.set(key, value)
+        return value
+
+    async def get_or_load_async(self, key: str, loader: Callable[[], Awaitable]):
+        """get_or_load for a coroutine loader, used by the async routes"""
+        value = self.get(key)
+        if value is not MISSING:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+        generation = self._generations[self._slot(key)]
+        value = await loader()
+        if self._generations[self._slot(key)] == generation:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        with self._counter_lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self).__name__
+        return stats
+
+
+class NullCache(Cache):
+    """Cache that stores nothing; every lookup goes to the loader"""
+
+    def get(self, key: str):
+        return MISSING
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        pass
+
+    def delete(self, *keys: str) -> None:
+        self._bump_generations(keys)
+
+
+class LRUCache(Cache):
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters["evictions"] = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        evicted = 0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def delete(self, *keys: str) -> None:
+        self._bump_generations(keys)
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+        self._count("invalidations", len(keys))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        with self._lock:
+            stats["entries"] = len(self._data)
+        stats["max_entries"] = self.maxsize
+        return stats
+
+
+class LocalKVStore:
+    """In-process stand-in for a shared key-value server.
+
+    Implements the subset of the Redis client API that ``SharedCache`` uses
+    (``get``, ``set`` with ``ex``, ``delete``), storing bytes like a real
+    server would, so the shared code path can run without one.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ex: float = None) -> bool:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+
+class SharedCache(Cache):
+    """Cache stored in a shared key-value backend so every worker process sees invalidations"""
+
+    def __init__(self, backend, ttl: float = 30.0, prefix: str = "n8n_saas:"):
+        super().__init__()
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.shared_across_processes = not isinstance(backend, LocalKVStore)
+
+    def get(self, key: str):
+        raw = self.backend.get(self.prefix + key)
+        if raw is None:
+            return MISSING
+        return pickle.loads(raw)
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.backend.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+        self._count("sets")
+
+    def delete(self, *keys: str) -> None:
+        self._bump_generations(keys)
+        if keys:
+            self.backend.delete(*[self.prefix + key for key in keys])
+        self._count("invalidations", len(keys))
+
+
+def create_cache() -> Cache:
+    """Build the cache configured by CACHE_BACKEND (memory, shared or none)"""
+    backend = config.CACHE_BACKEND
+    if backend == "none":
+        return NullCache()
+    if backend == "shared":
+        if config.CACHE_URL:
+            try:
+                import redis
+                return SharedCache(redis.Redis.from_url(config.CACHE_URL), ttl=config.CACHE_TTL)
+            except ImportError:
+                print("⚠️ CACHE_URL is set but the redis package is not installed; using a local stand-in")
+        return SharedCache(LocalKVStore(), ttl=config.CACHE_TTL)
+    return LRUCache(maxsize=config.CACHE_MAX_ENTRIES, ttl=config.CACHE_TTL)
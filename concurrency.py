@@ -0,0 +1,105 @@
+"""Run independent outbound calls concurrently under one deadline.
+
+Request handlers use ``fan_out`` for calls that do not depend on each other
+(n8n deletes, Gmail watch stops, independent lookups), so a flow takes as
+long as its slowest call instead of the sum of all of them. The calls run
+on a shared, bounded thread pool.
+
+Callers already running on that pool must not fan out again, or the pool
+can deadlock waiting on itself; batch jobs use their own executor for the
+outer level.
+
+The async routes (asgi.py) use ``fan_out_async``, which runs coroutines on
+the caller's event loop under the same deadline and error rules.
+"""
+import asyncio
+import threading
+from concurrent.futures import ALL_COMPLETED, FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, List
+
+import config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """Not every fanned-out call finished before the deadline"""
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The process-wide fan-out pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.FANOUT_WORKERS, thread_name_prefix="fanout")
+        return _executor
+
+
+def fan_out(*calls: Callable, timeout: float = None, return_exceptions: bool = False) -> List:
+    """Run zero-argument callables concurrently and return their results in order.
+
+    All calls share one deadline of ``timeout`` seconds (default
+    ``FANOUT_TIMEOUT``); if it passes, unstarted calls are cancelled and
+    ``DeadlineExceeded`` is raised. The first exception raised by a call is
+    re-raised unless ``return_exceptions`` is set, in which case exceptions
+    take the place of results. A single call runs inline in the caller's
+    thread, bounded only by its own timeouts.
+    """
+    if not calls:
+        return []
+    if len(calls) == 1 and not return_exceptions:
+        return [calls[0]()]
+
+    timeout = config.FANOUT_TIMEOUT if timeout is None else timeout
+    executor = get_executor()
+    futures = [executor.submit(call) for call in calls]
+    done, pending = wait(futures, timeout=timeout, return_when=ALL_COMPLETED if return_exceptions else FIRST_EXCEPTION)
+
+    if not return_exceptions:
+        failed = [f for f in futures if f in done and f.exception() is not None]
+        if failed:
+            for future in pending:
+                future.cancel()
+            raise failed[0].exception()
+    if pending:
+        for future in pending:
+            future.cancel()
+        raise DeadlineExceeded(f"{len(pending)} of {len(calls)} calls did not finish within {timeout}s")
+
+    if return_exceptions:
+        return [f.exception() if f.exception() is not None else f.result() for f in futures]
+    return [f.result() for f in futures]
+
+
+async def fan_out_async(*calls: Callable[[], Awaitable], timeout: float = None,
+                        return_exceptions: bool = False) -> List:
+    """fan_out for zero-argument coroutine functions, run as tasks on the current loop.
+
+    Blocking calls can take part as ``partial(asyncio.to_thread, fn, *args)``.
+    """
+    if not calls:
+        return []
+    if len(calls) == 1 and not return_exceptions:
+        return [await calls[0]()]
+
+    timeout = config.FANOUT_TIMEOUT if timeout is None else timeout
+    tasks = [asyncio.ensure_future(call()) for call in calls]
+    done, pending = await asyncio.wait(
+        tasks, timeout=timeout, return_when=ALL_COMPLETED if return_exceptions else FIRST_EXCEPTION
+    )
+
+    if not return_exceptions:
+        failed = [t for t in tasks if t in done and t.exception() is not None]
+        if failed:
+            for task in pending:
+                task.cancel()
+            raise failed[0].exception()
+    if pending:
+        for task in pending:
+            task.cancel()
+        raise DeadlineExceeded(f"{len(pending)} of {len(calls)} calls did not finish within {timeout}s")
+
+    if return_exceptions:
+        return [t.exception() if t.exception() is not None else t.result() for t in tasks]
+    return [t.result() for t in tasks]
@@ -7,6 +7,11 @@ load_dotenv()
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+# Overridable so benchmarks can point at a local stand-in
+GOOGLE_AUTH_URL = os.getenv("GOOGLE_AUTH_URL", "https://accounts.google.com/o/oauth2/auth")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v1/userinfo")
+GMAIL_API_URL = os.getenv("GMAIL_API_URL", "https://gmail.googleapis.com/gmail/v1/users/me")
 
 # n8n Configuration
 N8N_URL = os.getenv("N8N_URL")
@@ -23,3 +28,143 @@ DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
+
+# PostgreSQL Connection Pool
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_MAX_USES = int(os.getenv("DB_POOL_MAX_USES", "1000"))
+DB_POOL_MAX_AGE = float(os.getenv("DB_POOL_MAX_AGE", "1800"))
+DB_POOL_HEALTH_CHECK_IDLE = float(os.getenv("DB_POOL_HEALTH_CHECK_IDLE", "30"))
+
+# Admin Listing
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+ADMIN_MAX_PAGE_SIZE = int(os.getenv("ADMIN_MAX_PAGE_SIZE", "500"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+# n8n HTTP Client
+N8N_POOL_SIZE = int(os.getenv("N8N_POOL_SIZE", "10"))
+N8N_CONNECT_TIMEOUT = float(os.getenv("N8N_CONNECT_TIMEOUT", "3.05"))
+N8N_READ_TIMEOUT = float(os.getenv("N8N_READ_TIMEOUT", "30"))
+N8N_MAX_RETRIES = int(os.getenv("N8N_MAX_RETRIES", "3"))
+N8N_RETRY_BACKOFF = float(os.getenv("N8N_RETRY_BACKOFF", "0.5"))
+N8N_PAGE_SIZE = int(os.getenv("N8N_PAGE_SIZE", "250"))
+N8N_WORKFLOW_INDEX_TTL = float(os.getenv("N8N_WORKFLOW_INDEX_TTL", "300"))
+
+# Background Provisioning
+PROVISIONING_WORKERS = int(os.getenv("PROVISIONING_WORKERS", "2"))
+PROVISIONING_POLL_INTERVAL = float(os.getenv("PROVISIONING_POLL_INTERVAL", "2"))
+PROVISIONING_LEASE_SECONDS = float(os.getenv("PROVISIONING_LEASE_SECONDS", "300"))
+PROVISIONING_MAX_ATTEMPTS = int(os.getenv("PROVISIONING_MAX_ATTEMPTS", "5"))
+PROVISIONING_RETRY_BACKOFF = float(os.getenv("PROVISIONING_RETRY_BACKOFF", "10"))
+
+# Lookup Cache
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_URL = os.getenv("CACHE_URL")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Workflow Layout: "per_tenant" (one polling workflow per Gmail account)
+# or "shared" (tenants sharded into WORKFLOW_SHARDS workflows)
+WORKFLOW_MODE = os.getenv("WORKFLOW_MODE", "per_tenant")
+WORKFLOW_SHARDS = int(os.getenv("WORKFLOW_SHARDS", "16"))
+SHARD_LEASE_SECONDS = float(os.getenv("SHARD_LEASE_SECONDS", "120"))  # max time one shard rebuild may take
+
+# Gmail Ingestion: "poll" (n8n Gmail trigger) or "push" (Gmail users.watch
+# notifications via Pub/Sub, forwarded to a per-tenant webhook workflow)
+INGESTION_MODE = os.getenv("INGESTION_MODE", "poll")
+GMAIL_PUSH_TOPIC = os.getenv("GMAIL_PUSH_TOPIC")  # projects/<project>/topics/<topic>
+GMAIL_PUSH_TOKEN = os.getenv("GMAIL_PUSH_TOKEN")  # ?token= on the Pub/Sub push subscription URL
+GMAIL_PUSH_SOURCE = os.getenv("GMAIL_PUSH_SOURCE", "google")  # "local" for an offline stand-in
+GMAIL_WATCH_RENEW_HOURS = float(os.getenv("GMAIL_WATCH_RENEW_HOURS", "48"))
+GMAIL_PUSH_LEASE_SECONDS = float(os.getenv("GMAIL_PUSH_LEASE_SECONDS", "120"))  # max forwarding time per mailbox
+
+# Adaptive Poll Scheduling: interval tiers in minutes (fastest first), the
+# mails/hour needed to use each tier but the slowest, and how far the rate
+# must fall below a tier's threshold before moving to a slower one
+POLL_TIERS = [int(m) for m in os.getenv("POLL_TIERS", "1,5,15,60").split(",")]
+POLL_TIER_THRESHOLDS = [float(r) for r in os.getenv("POLL_TIER_THRESHOLDS", "6,1,0.25").split(",")]
+POLL_HYSTERESIS = float(os.getenv("POLL_HYSTERESIS", "0.5"))
+POLL_RATE_WINDOW_MINUTES = int(os.getenv("POLL_RATE_WINDOW_MINUTES", "60"))
+POLL_RATE_SMOOTHING = float(os.getenv("POLL_RATE_SMOOTHING", "0.5"))
+POLL_SCHEDULER_INTERVAL = float(os.getenv("POLL_SCHEDULER_INTERVAL", "900"))
+
+# OAuth Token Refresh: renew access tokens TOKEN_REFRESH_LEAD seconds (plus
+# up to TOKEN_REFRESH_JITTER) before they expire
+TOKEN_REFRESH_INTERVAL = float(os.getenv("TOKEN_REFRESH_INTERVAL", "60"))  # 0 = not in the web process
+TOKEN_REFRESH_LEAD = float(os.getenv("TOKEN_REFRESH_LEAD", "600"))
+TOKEN_REFRESH_JITTER = float(os.getenv("TOKEN_REFRESH_JITTER", "900"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "4"))
+TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", "100"))
+TOKEN_REFRESH_LEASE = float(os.getenv("TOKEN_REFRESH_LEASE", "300"))
+
+# Password Hashing: "scrypt" or "pbkdf2_sha256"; existing hashes with other
+# parameters are upgraded on the next successful login
+PASSWORD_HASH_ALGORITHM = os.getenv("PASSWORD_HASH_ALGORITHM", "scrypt")
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", "600000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # 0 = hash in the request thread
+PASSWORD_VERIFY_CACHE_SIZE = int(os.getenv("PASSWORD_VERIFY_CACHE_SIZE", "10000"))  # 0 = disabled
+PASSWORD_VERIFY_CACHE_TTL = float(os.getenv("PASSWORD_VERIFY_CACHE_TTL", "300"))
+
+# Concurrent Fan-out of independent external calls in request handlers
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "16"))
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "20"))
+BULK_DELETE_CONCURRENCY = int(os.getenv("BULK_DELETE_CONCURRENCY", "8"))
+BULK_DELETE_MAX = int(os.getenv("BULK_DELETE_MAX", "500"))
+
+# Reconciliation between the database and n8n
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "3600"))
+RECONCILE_GRACE_SECONDS = float(os.getenv("RECONCILE_GRACE_SECONDS", "600"))  # leave younger n8n objects alone
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "50"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
+RECONCILE_MAX_DELETES = int(os.getenv("RECONCILE_MAX_DELETES", "100"))  # refuse larger orphan sweeps
+
+# Workflow Status Sync: copy n8n workflow state into the database so the
+# dashboard never has to ask n8n
+STATUS_SYNC_INTERVAL = float(os.getenv("STATUS_SYNC_INTERVAL", "60"))  # 0 = not in the web process
+STATUS_SYNC_BATCH_SIZE = int(os.getenv("STATUS_SYNC_BATCH_SIZE", "500"))
+STATUS_SYNC_LEASE_SECONDS = float(os.getenv("STATUS_SYNC_LEASE_SECONDS", "300"))  # renewed after the listing and every page
+
+# Execution History: pull finished n8n executions into Postgres and roll
+# them up per tenant per hour and day
+EXECUTION_INGEST_INTERVAL = float(os.getenv("EXECUTION_INGEST_INTERVAL", "300"))  # 0 = not in the web process
+EXECUTION_INGEST_BATCH_SIZE = int(os.getenv("EXECUTION_INGEST_BATCH_SIZE", "500"))
+EXECUTION_INGEST_LEASE_SECONDS = float(os.getenv("EXECUTION_INGEST_LEASE_SECONDS", "300"))  # renewed before every batch
+EXECUTION_INGEST_INCLUDE_DATA = os.getenv("EXECUTION_INGEST_INCLUDE_DATA", "false").lower() == "true"  # needed to count messages
+EXECUTION_RETENTION_DAYS = int(os.getenv("EXECUTION_RETENTION_DAYS", "90"))  # raw rows; 0 = keep forever
+USAGE_DASHBOARD_DAYS = int(os.getenv("USAGE_DASHBOARD_DAYS", "7"))
+
+# Sessions: "server" keeps them in Postgres (revocable, cookie holds only a
+# random token); "cookie" is Flask's signed cookie
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "server")
+SESSION_LIFETIME = float(os.getenv("SESSION_LIFETIME", str(14 * 24 * 3600)))
+SESSION_REFRESH_INTERVAL = float(os.getenv("SESSION_REFRESH_INTERVAL", "300"))  # min seconds between expiry extensions
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "600"))
+SESSION_SWEEP_BATCH = int(os.getenv("SESSION_SWEEP_BATCH", "1000"))
+
+# Stored Functions: deploy changed psql_stored_procedure/ files when the web
+# process starts (also done by `python migrate_db.py up`)
+DEPLOY_STORED_FUNCTIONS = os.getenv("DEPLOY_STORED_FUNCTIONS", "true").lower() == "true"
+
+# Async Serving: asgi.py runs the OAuth callback, workflow creation, deletes
+# and JSON APIs on an event loop (asyncpg, httpx); the rest stays on Flask
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", "1"))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "20"))
+ASYNC_WSGI_THREADS = int(os.getenv("ASYNC_WSGI_THREADS", "10"))  # threads serving the mounted Flask routes
+
+# Production Serving: gunicorn.conf.py forks WEB_WORKERS processes (default:
+# one per core), each with its own database pool, HTTP clients and provisioning
+# workers. WEB_PRELOAD imports the app and compiles templates once in the master
+PRELOAD_TEMPLATES = os.getenv("PRELOAD_TEMPLATES", "true").lower() == "true"
+WEB_BIND = os.getenv("WEB_BIND", "0.0.0.0:5000")
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))  # request threads per worker
+WEB_PRELOAD = os.getenv("WEB_PRELOAD", "true").lower() == "true"
+WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", "60"))
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "0"))  # recycle a worker after this many requests (0 = never)
+# Who runs token refresh, status sync and execution ingest: "leader" (one
+# worker), "all" (every worker) or "none" (run them standalone instead)
+WEB_SINGLETON_JOBS = os.getenv("WEB_SINGLETON_JOBS", "leader").lower()
@@ -1,21 +1,213 @@
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
-from typing import Optional, Dict, List
-import hashlib
+import base64
+import secrets
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, List, Iterator, Tuple
+import config
 from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from db_pool import ConnectionPool
+from cache import create_cache
+from passwords import PasswordHasher
+from metrics import DB_QUERY_DURATION, DB_QUERY_ERRORS, instrument_methods
+
+
+USER_BY_ID_SQL = "SELECT * FROM user_accounts WHERE id = %s"
+
+USER_CREDENTIAL_SQL = """
+    SELECT * FROM gmail_credentials 
+    WHERE user_id = %s AND status = 'active'
+    ORDER BY updated_at DESC
+    LIMIT 1
+"""
+
+USER_WORKFLOW_SQL = """
+    SELECT w.*, c.gmail_email 
+    FROM workflows w
+    JOIN gmail_credentials c ON w.gmail_credential_id = c.id
+    WHERE w.user_id = %s AND w.status = 'active'
+    ORDER BY w.updated_at DESC
+    LIMIT 1
+"""
+
+CREDENTIAL_BY_EMAIL_SQL = "SELECT * FROM gmail_credentials WHERE gmail_email = %s AND status = 'active'"
+
+# One open job per workflow (see migrations/0011): enqueueing again makes a
+# queued job due now with fresh attempts, or flags a running one to rerun
+ENQUEUE_PROVISIONING_JOB_SQL = """
+    INSERT INTO provisioning_jobs AS j (user_id, gmail_credential_id, workflow_id, max_attempts)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (workflow_id) WHERE status IN ('queued', 'running') DO UPDATE SET
+        rerun = j.rerun OR j.status = 'running',
+        attempts = CASE WHEN j.status = 'queued' THEN 0 ELSE j.attempts END,
+        run_after = LEAST(j.run_after, EXCLUDED.run_after),
+        max_attempts = EXCLUDED.max_attempts,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING id
+"""
+
+# Hot paths call versioned stored functions (psql_stored_procedure/, deployed
+# at startup by migrate_db.deploy_functions) through server-side prepared
+# statements. The functions return whole table rows, expanded here so callers
+# still get flat dicts; _execute_prepared re-prepares them when a migration
+# adds a column.
+WORKFLOW_BY_N8N_ID_SQL = """
+    SELECT (f.workflow_row).*, f.gmail_email, f.username
+    FROM workflow_by_n8n_id_v1($1) f
+"""
+
+WORKFLOW_OWNER_SQL = "SELECT get_user_id_by_n8n_workflow_v1($1) AS user_id"
+
+ALL_WORKFLOWS_SQL = """
+    SELECT w.*, c.gmail_email, ua.username, ua.email as user_email
+    FROM workflows w
+    JOIN gmail_credentials c ON w.gmail_credential_id = c.id
+    JOIN user_accounts ua ON w.user_id = ua.id
+    WHERE w.status = 'active'
+    ORDER BY w.created_at DESC, w.id DESC
+"""
+
+WORKFLOWS_FIRST_PAGE_SQL = """
+    SELECT w.*, c.gmail_email, ua.username, ua.email as user_email
+    FROM workflows w
+    JOIN gmail_credentials c ON w.gmail_credential_id = c.id
+    JOIN user_accounts ua ON w.user_id = ua.id
+    WHERE w.status = 'active'
+    ORDER BY w.created_at DESC, w.id DESC
+    LIMIT %s
+"""
+
+WORKFLOWS_NEXT_PAGE_SQL = """
+    SELECT w.*, c.gmail_email, ua.username, ua.email as user_email
+    FROM workflows w
+    JOIN gmail_credentials c ON w.gmail_credential_id = c.id
+    JOIN user_accounts ua ON w.user_id = ua.id
+    WHERE w.status = 'active' AND (w.created_at, w.id) < (%s, %s)
+    ORDER BY w.created_at DESC, w.id DESC
+    LIMIT %s
+"""
+
+# User, newest active credential and newest active workflow in one round trip.
+# The NULL marker columns split the row back into its three parts.
+DASHBOARD_SQL = """
+    SELECT (d.account_row).*, NULL AS credential__, (d.credential_row).*,
+           NULL AS workflow__, (d.workflow_row).*, d.workflow_gmail_email AS gmail_email
+    FROM user_dashboard_v1($1) d
+"""
+
+CONNECT_GMAIL_SQL = "SELECT * FROM connect_gmail_v1($1, $2, $3, $4, $5, $6, $7)"
+
+def encode_page_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a token from encode_page_cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid page cursor: {cursor}") from e
 
 
 class UserDB:
     def __init__(self):
         self.conn_string = f"host={DB_HOST} port={DB_PORT} dbname={DB_NAME} user={DB_USER} password={DB_PASSWORD}"
+        self.pool = ConnectionPool(
+            self.conn_string,
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            timeout=config.DB_POOL_TIMEOUT,
+            max_uses=config.DB_POOL_MAX_USES,
+            max_age=config.DB_POOL_MAX_AGE,
+            health_check_idle=config.DB_POOL_HEALTH_CHECK_IDLE,
+        )
+        self.cache = create_cache()
+        self.hasher = PasswordHasher.from_config()
 
+    @contextmanager
     def _get_connection(self):
-        return psycopg2.connect(self.conn_string)
+        """Borrow a pooled connection; commits on success, rolls back on error"""
+        with self.pool.connection() as conn:
+            with conn:
+                yield conn
+
+    def _execute_prepared(self, cursor, name: str, sql: str, params: tuple) -> None:
+        """Execute a server-side prepared statement, preparing it once per connection.
+
+        A statement that expands table rows fixes its result columns when
+        prepared, so after a migration adds a column, executing it fails with
+        "cached plan must not change result type". It is then re-prepared and
+        retried once, which rolls the transaction back: call this first in it.
+        """
+        conn = cursor.connection
+        if name not in conn.prepared_statements:
+            cursor.execute(f"PREPARE {name} AS {sql}")
+            conn.prepared_statements.add(name)
+        placeholders = ", ".join(["%s"] * len(params))
+        try:
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+        except psycopg2.errors.FeatureNotSupported:
+            conn.rollback()
+            cursor.execute(f"DEALLOCATE {name}")
+            cursor.execute(f"PREPARE {name} AS {sql}")
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+    def _fetch_one(self, sql: str, params: tuple) -> Optional[Dict]:
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+                return dict(row) if row else None
+
+    def _fetch_prepared(self, name: str, sql: str, params: tuple) -> Optional[Dict]:
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                self._execute_prepared(cursor, name, sql, params)
+                row = cursor.fetchone()
+                return dict(row) if row else None
+
+    def _invalidate_users(self, *user_ids) -> None:
+        """Drop cached credential, workflow and dashboard entries of users"""
+        keys = []
+        for user_id in set(user_ids):
+            if user_id is not None:
+                keys += [f"credential:{user_id}", f"workflow:{user_id}", f"dashboard:{user_id}"]
+        if keys:
+            self.cache.delete(*keys)
+
+    def _invalidate_n8n_workflows(self, *n8n_workflow_ids) -> None:
+        """Drop cached lookups by n8n workflow ID"""
+        keys = []
+        for n8n_id in set(n8n_workflow_ids):
+            if n8n_id:
+                keys += [f"workflow_n8n:{n8n_id}", f"workflow_owner:{n8n_id}"]
+        if keys:
+            self.cache.delete(*keys)
+
+    def cache_stats(self) -> Dict:
+        """Get lookup cache hit/miss statistics"""
+        return self.cache.stats()
+
+    def pool_stats(self) -> Dict:
+        """Get connection pool statistics"""
+        return self.pool.stats()
+
+    def close(self) -> None:
+        """Close all pooled connections"""
+        self.pool.close()
+        self.hasher.close()
 
     def create_user(self, username: str, password: str, email: str = None) -> bool:
         """Create a new user account"""
         try:
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            password_hash = self.hasher.hash(password)
             with self._get_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(
@@ -32,47 +224,59 @@ class UserDB:
 
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
         """Authenticate user and return user data"""
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        user = self._fetch_one(
+            "SELECT * FROM user_accounts WHERE username = %s AND status = 'active'", (username,)
+        )
+        ok, new_hash = self.hasher.verify(password, user["password_hash"] if user else None)
+        if not ok:
+            return None
+        if new_hash:
+            self._update_password_hash(user["id"], user["password_hash"], new_hash)
+        return user
+
+    def _update_password_hash(self, user_id: int, old_hash: str, new_hash: str) -> None:
+        """Upgrade a stored hash unless the password was changed meanwhile"""
         with self._get_connection() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            with conn.cursor() as cursor:
                 cursor.execute(
-                    """
-                    SELECT * FROM user_accounts 
-                    WHERE username = %s AND password_hash = %s AND status = 'active'
-                """,
-                    (username, password_hash),
+                    "UPDATE user_accounts SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                    (new_hash, user_id, old_hash),
                 )
-                row = cursor.fetchone()
-                return dict(row) if row else None
+            conn.commit()
+        self.cache.delete(f"user:{user_id}", f"dashboard:{user_id}")
 
     def get_user_by_id(self, user_id: int) -> Optional[Dict]:
         """Get user by ID"""
-        with self._get_connection() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                cursor.execute("SELECT * FROM user_accounts WHERE id = %s", (user_id,))
-                row = cursor.fetchone()
-                return dict(row) if row else None
+        return self.cache.get_or_load(f"user:{user_id}", lambda: self._fetch_one(USER_BY_ID_SQL, (user_id,)))
 
-    def save_credential(self, user_id: int, email: str, access_token: str, refresh_token: str) -> int:
+    def save_credential(self, user_id: int, email: str, access_token: str, refresh_token: str,
+                        token_expires_at: datetime = None, token_refresh_after: datetime = None) -> int:
         """Save or update Gmail credential and return credential ID"""
         with self._get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     """
-                    INSERT INTO gmail_credentials (user_id, gmail_email, access_token, refresh_token)
-                    VALUES (%s, %s, %s, %s)
+                    WITH previous AS (
+                        SELECT user_id FROM gmail_credentials WHERE gmail_email = %s
+                    )
+                    INSERT INTO gmail_credentials (user_id, gmail_email, access_token, refresh_token,
+                                                   token_expires_at, token_refresh_after)
+                    VALUES (%s, %s, %s, %s, %s, %s)
                     ON CONFLICT (gmail_email) DO UPDATE SET
                         user_id = EXCLUDED.user_id,
                         access_token = EXCLUDED.access_token,
                         refresh_token = EXCLUDED.refresh_token,
+                        token_expires_at = EXCLUDED.token_expires_at,
+                        token_refresh_after = EXCLUDED.token_refresh_after,
                         updated_at = CURRENT_TIMESTAMP
-                    RETURNING id
+                    RETURNING id, (SELECT user_id FROM previous)
                 """,
-                    (user_id, email, access_token, refresh_token),
+                    (email, user_id, email, access_token, refresh_token, token_expires_at, token_refresh_after),
                 )
-                credential_id = cursor.fetchone()
+                credential_id, previous_user_id = cursor.fetchone()
             conn.commit()
-            return credential_id
+        self._invalidate_users(user_id, previous_user_id)
+        return credential_id
 
     def update_credential_n8n_id(self, credential_id: int, n8n_gmail_credential: str) -> None:
         """Update credential with n8n credential ID"""
@@ -83,26 +287,55 @@ class UserDB:
                     UPDATE gmail_credentials 
                     SET n8n_gmail_credential = %s, updated_at = CURRENT_TIMESTAMP
                     WHERE id = %s
+                    RETURNING user_id
                 """,
                     (n8n_gmail_credential, credential_id),
                 )
+                row = cursor.fetchone()
             conn.commit()
+        if row:
+            self._invalidate_users(row[0])
 
-    def create_workflow(self, user_id: int, gmail_credential_id: int, n8n_workflow_id: str, workflow_name: str = "Gmail to Telegram Automation") -> int:
+    def create_workflow(self, user_id: int, gmail_credential_id: int, n8n_workflow_id: Optional[str], workflow_name: str = "Gmail to Telegram Automation", workflow_status: str = "inactive") -> int:
         """Create a new workflow record"""
         with self._get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     """
-                    INSERT INTO workflows (user_id, gmail_credential_id, n8n_workflow_id, workflow_name)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO workflows (user_id, gmail_credential_id, n8n_workflow_id, workflow_name, workflow_status)
+                    VALUES (%s, %s, %s, %s, %s)
                     RETURNING id
                 """,
-                    (user_id, gmail_credential_id, n8n_workflow_id, workflow_name),
+                    (user_id, gmail_credential_id, n8n_workflow_id, workflow_name, workflow_status),
+                )
+                workflow_id = cursor.fetchone()[0]
+            conn.commit()
+        self._invalidate_users(user_id)
+        self._invalidate_n8n_workflows(n8n_workflow_id)
+        return workflow_id
+
+    def update_workflow_n8n_id(self, workflow_id: int, n8n_workflow_id: str) -> None:
+        """Update workflow with n8n workflow ID, forgetting the state observed for the old one"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    WITH previous AS (
+                        SELECT n8n_workflow_id FROM workflows WHERE id = %s
+                    )
+                    UPDATE workflows 
+                    SET n8n_workflow_id = %s, n8n_active = NULL, n8n_fingerprint = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    RETURNING user_id, (SELECT n8n_workflow_id FROM previous)
+                """,
+                    (workflow_id, n8n_workflow_id, workflow_id),
                 )
-                workflow_id = cursor.fetchone()
+                row = cursor.fetchone()
             conn.commit()
-            return workflow_id
+        if row:
+            self._invalidate_users(row[0])
+            self._invalidate_n8n_workflows(n8n_workflow_id, row[1])
 
     def update_workflow_status(self, workflow_id: int, status: str) -> None:
         """Update workflow status"""
@@ -113,127 +346,1030 @@ class UserDB:
                     UPDATE workflows 
                     SET workflow_status = %s, updated_at = CURRENT_TIMESTAMP
                     WHERE id = %s
+                    RETURNING user_id, n8n_workflow_id
                 """,
                     (status, workflow_id),
                 )
+                row = cursor.fetchone()
             conn.commit()
+        if row:
+            self._invalidate_users(row[0])
+            self._invalidate_n8n_workflows(row[1])
+
+    def connect_gmail(self, user_id: int, email: str, access_token: str, refresh_token: str,
+                      token_expires_at: datetime = None, token_refresh_after: datetime = None,
+                      max_attempts: int = 5) -> Optional[Dict]:
+        """Save a Gmail connection, its pending workflow and provisioning job in one transaction.
+
+        Returns the credential, workflow and job IDs, or None if the mailbox
+        belongs to another user.
+        """
+        rows = self.connect_gmail_bulk(
+            [(user_id, email, access_token, refresh_token, token_expires_at, token_refresh_after)], max_attempts
+        )
+        return rows[0] if rows else None
+
+    def connect_gmail_bulk(self, accounts: List[Tuple], max_attempts: int = 5) -> List[Dict]:
+        """Bulk connect_gmail for (user_id, email, access_token, refresh_token, token_expires_at,
+        token_refresh_after) tuples; one statement per call. Later duplicates of a user or
+        mailbox win; mailboxes owned by other users are skipped"""
+        by_user = {account[0]: account for account in accounts}
+        by_email = {account[1]: account for account in by_user.values()}
+        if not by_email:
+            return []
+        columns = tuple(list(column) for column in zip(*by_email.values()))
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                self._execute_prepared(cursor, "connect_gmail", CONNECT_GMAIL_SQL, columns + (max_attempts,))
+                rows = [dict(row) for row in cursor.fetchall()]
+            conn.commit()
+        self._invalidate_users(*(row["user_id"] for row in rows))
+        self._invalidate_n8n_workflows(*(row["n8n_workflow_id"] for row in rows))
+        return rows
 
     def get_user_credential(self, user_id: int) -> Optional[Dict]:
         """Get user's Gmail credential"""
+        return self.cache.get_or_load(f"credential:{user_id}", lambda: self._fetch_one(USER_CREDENTIAL_SQL, (user_id,)))
+
+    def get_user_workflow(self, user_id: int) -> Optional[Dict]:
+        """Get user's workflow"""
+        return self.cache.get_or_load(f"workflow:{user_id}", lambda: self._fetch_one(USER_WORKFLOW_SQL, (user_id,)))
+
+    def get_user_dashboard_data(self, user_id: int) -> Dict:
+        """Get user, credential and workflow for the dashboard"""
+        return self.cache.get_or_load(f"dashboard:{user_id}", lambda: self._load_dashboard_data(user_id))
+
+    def _load_dashboard_data(self, user_id: int) -> Dict:
+        """Load user, credential and workflow for the dashboard in a single query"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                self._execute_prepared(cursor, "user_dashboard", DASHBOARD_SQL, (user_id,))
+                row = cursor.fetchone()
+                columns = [col.name for col in cursor.description]
+
+        if not row:
+            return {'user': None, 'credential': None, 'workflow': None}
+
+        credential_at = columns.index("credential__")
+        workflow_at = columns.index("workflow__")
+        user = dict(zip(columns[:credential_at], row[:credential_at]))
+        credential = dict(zip(columns[credential_at + 1:workflow_at], row[credential_at + 1:workflow_at]))
+        workflow = dict(zip(columns[workflow_at + 1:], row[workflow_at + 1:]))
+
+        return {
+            'user': user,
+            'credential': credential if credential['id'] is not None else None,
+            'workflow': workflow if workflow['id'] is not None else None
+        }
+
+    def get_credential_by_id(self, credential_id: int) -> Optional[Dict]:
+        """Get credential by ID"""
         with self._get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                cursor.execute(
-                    """
-                    SELECT * FROM gmail_credentials 
-                    WHERE user_id = %s AND status = 'active'
-                    ORDER BY updated_at DESC
-                    LIMIT 1
-                """,
-                    (user_id,),
-                )
+                cursor.execute("SELECT * FROM gmail_credentials WHERE id = %s", (credential_id,))
                 row = cursor.fetchone()
                 return dict(row) if row else None
 
-    def get_user_workflow(self, user_id: int) -> Optional[Dict]:
-        """Get user's workflow"""
+    def get_workflow_by_id(self, workflow_id: int) -> Optional[Dict]:
+        """Get workflow by ID"""
         with self._get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                cursor.execute(
-                    """
-                    SELECT w.*, c.gmail_email 
-                    FROM workflows w
-                    JOIN gmail_credentials c ON w.gmail_credential_id = c.id
-                    WHERE w.user_id = %s AND w.status = 'active'
-                    ORDER BY w.updated_at DESC
-                    LIMIT 1
-                """,
-                    (user_id,),
-                )
+                cursor.execute("SELECT * FROM workflows WHERE id = %s", (workflow_id,))
                 row = cursor.fetchone()
                 return dict(row) if row else None
 
-    def get_user_dashboard_data(self, user_id: int) -> Dict:
-        """Get all data needed for user dashboard"""
-        credential = self.get_user_credential(user_id)
-        workflow = self.get_user_workflow(user_id)
-        
-        return {
-            'credential': credential,
-            'workflow': workflow
-        }
-
     def get_credential_by_email(self, email: str) -> Optional[Dict]:
         """Get credential by email"""
         with self._get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                cursor.execute("SELECT * FROM gmail_credentials WHERE gmail_email = %s AND status = 'active'", (email,))
+                cursor.execute(CREDENTIAL_BY_EMAIL_SQL, (email,))
                 row = cursor.fetchone()
                 return dict(row) if row else None
 
     def get_workflow_by_n8n_id(self, n8n_workflow_id: str) -> Optional[Dict]:
         """Get workflow by n8n workflow ID"""
+        return self.cache.get_or_load(
+            f"workflow_n8n:{n8n_workflow_id}",
+            lambda: self._fetch_prepared("workflow_by_n8n_id", WORKFLOW_BY_N8N_ID_SQL, (n8n_workflow_id,)),
+        )
+
+    def get_workflow_owner(self, n8n_workflow_id: str) -> Optional[int]:
+        """Get the user ID owning an active workflow, by n8n workflow ID"""
+        return self.cache.get_or_load(
+            f"workflow_owner:{n8n_workflow_id}",
+            lambda: self._fetch_prepared("workflow_owner", WORKFLOW_OWNER_SQL, (n8n_workflow_id,))["user_id"],
+        )
+
+    def get_all_workflows(self) -> List[Dict]:
+        """Get all workflows with user and credential info"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(ALL_WORKFLOWS_SQL)
+                return [dict(row) for row in cursor.fetchall()]
+
+    def get_workflows_page(self, limit: int, after: Tuple[datetime, int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get one keyset page of workflows, newest first, and the cursor of the next page"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                if after:
+                    cursor.execute(WORKFLOWS_NEXT_PAGE_SQL, (after[0], after[1], limit + 1))
+                else:
+                    cursor.execute(WORKFLOWS_FIRST_PAGE_SQL, (limit + 1,))
+                rows = [dict(row) for row in cursor.fetchall()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_page_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        return rows, next_cursor
+
+    def iter_all_workflows(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream all workflows through a server-side cursor, batch_size rows at a time"""
+        with self._get_connection() as conn:
+            with conn.cursor(name="all_workflows_stream", cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(ALL_WORKFLOWS_SQL)
+                for row in cursor:
+                    yield dict(row)
+
+    def iter_reconcile_rows(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream every credential with its workflow rows (if any) for reconciliation with n8n"""
+        with self._get_connection() as conn:
+            with conn.cursor(name="reconcile_stream", cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(
+                    """
+                    SELECT c.id AS credential_id, c.user_id, c.gmail_email, c.n8n_gmail_credential,
+                           w.id AS workflow_id, w.n8n_workflow_id, w.workflow_status, w.shard_id,
+                           w.status AS row_status
+                    FROM gmail_credentials c
+                    LEFT JOIN workflows w ON w.gmail_credential_id = c.id
+                    ORDER BY c.id
+                """
+                )
+                for row in cursor:
+                    yield dict(row)
+
+    def get_workflow_sync_states(self, after_workflow_id: int = 0, limit: int = 500) -> List[Dict]:
+        """Get a batch of workflows with the n8n workflow that runs them and their last synced fingerprint"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    SELECT w.id, COALESCE(w.n8n_workflow_id, s.n8n_workflow_id) AS n8n_workflow_id, w.n8n_fingerprint
+                    FROM workflows w
+                    LEFT JOIN workflow_shards s ON s.shard_id = w.shard_id
+                    WHERE w.status = 'active' AND w.id > %s
+                      AND COALESCE(w.n8n_workflow_id, s.n8n_workflow_id) IS NOT NULL
+                    ORDER BY w.id
+                    LIMIT %s
+                """,
+                    (after_workflow_id, limit),
+                )
+                return [dict(row) for row in cursor.fetchall()]
+
+    def update_workflow_sync_states(self, states: List[Tuple[int, bool, Optional[datetime], str]]) -> int:
+        """Store observed n8n state for (workflow id, active, updated_at, fingerprint) rows in one statement"""
+        if not states:
+            return 0
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                rows = psycopg2.extras.execute_values(
+                    cursor,
+                    """
+                    UPDATE workflows AS w
+                    SET n8n_active = v.active, n8n_updated_at = v.updated_at,
+                        n8n_fingerprint = v.fingerprint, n8n_synced_at = CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS v (id, active, updated_at, fingerprint)
+                    WHERE w.id = v.id AND w.n8n_fingerprint IS DISTINCT FROM v.fingerprint
+                    RETURNING w.user_id
+                """,
+                    states,
+                    template="(%s::int, %s::boolean, %s::timestamp, %s::text)",
+                    page_size=len(states),
+                    fetch=True,
+                )
+            conn.commit()
+        self._invalidate_users(*[row[0] for row in rows])
+        return len(rows)
+
+    def get_shards(self) -> List[Dict]:
+        """Get every shard's n8n workflow record"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute("SELECT * FROM workflow_shards ORDER BY shard_id")
+                return [dict(row) for row in cursor.fetchall()]
+
+    def set_workflows_status(self, workflow_ids: List[int], status: str) -> None:
+        """Update the workflow_status of many workflows in one statement"""
+        if not workflow_ids:
+            return
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE workflows 
+                    SET workflow_status = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ANY(%s) AND workflow_status <> %s
+                    RETURNING user_id, n8n_workflow_id
+                """,
+                    (status, list(workflow_ids), status),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        self._invalidate_users(*[row[0] for row in rows])
+        self._invalidate_n8n_workflows(*[row[1] for row in rows])
+
+    def clear_n8n_credential_ids(self, credential_ids: List[int]) -> None:
+        """Forget the n8n credential of many credentials, e.g. after it was deleted in n8n"""
+        if not credential_ids:
+            return
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE gmail_credentials 
+                    SET n8n_gmail_credential = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ANY(%s)
+                    RETURNING user_id
+                """,
+                    (list(credential_ids),),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        self._invalidate_users(*[row[0] for row in rows])
+
+    def _delete_credentials(self, where: str, value) -> bool:
+        """Delete credentials and invalidate them plus the workflows removed by ON DELETE CASCADE"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    WITH cascaded AS (
+                        SELECT w.user_id, w.n8n_workflow_id
+                        FROM workflows w
+                        JOIN gmail_credentials c ON w.gmail_credential_id = c.id
+                        WHERE c.{where} = %s
+                    ), deleted AS (
+                        DELETE FROM gmail_credentials WHERE {where} = %s RETURNING user_id
+                    )
+                    SELECT
+                        ARRAY(SELECT user_id FROM deleted),
+                        ARRAY(SELECT user_id FROM cascaded),
+                        ARRAY(SELECT n8n_workflow_id FROM cascaded)
+                """,
+                    (value, value),
+                )
+                credential_users, workflow_users, n8n_workflow_ids = cursor.fetchone()
+            conn.commit()
+        self._invalidate_users(*credential_users, *workflow_users)
+        self._invalidate_n8n_workflows(*n8n_workflow_ids)
+        return len(credential_users) > 0
+
+    def _delete_workflows(self, where: str, value) -> bool:
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM workflows WHERE {where} = %s RETURNING user_id, n8n_workflow_id",
+                    (value,),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        self._invalidate_users(*[row[0] for row in rows])
+        self._invalidate_n8n_workflows(*[row[1] for row in rows])
+        return len(rows) > 0
+
+    def delete_user_credential(self, user_id: int) -> bool:
+        """Delete user's credential"""
+        return self._delete_credentials("user_id", user_id)
+
+    def delete_user_workflow(self, user_id: int) -> bool:
+        """Delete user's workflow"""
+        return self._delete_workflows("user_id", user_id)
+
+    def delete_workflow_by_n8n_id(self, n8n_workflow_id: str) -> bool:
+        """Delete workflow by n8n workflow ID"""
+        return self._delete_workflows("n8n_workflow_id", n8n_workflow_id)
+
+    def delete_credential_by_email(self, email: str) -> bool:
+        """Delete credential by email"""
+        return self._delete_credentials("gmail_email", email)
+
+    def get_provisioned_tenants(self, after_workflow_id: int = 0, limit: int = 200) -> List[Dict]:
+        """Get a batch of active workflows that have an n8n credential, ordered by workflow id"""
         with self._get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
                 cursor.execute(
                     """
-                    SELECT w.*, c.gmail_email, ua.username
+                    SELECT w.id AS workflow_id, w.user_id, w.n8n_workflow_id, w.shard_id,
+                           w.poll_interval_minutes, w.message_rate, w.rate_updated_at,
+                           c.id AS credential_id, c.gmail_email, c.n8n_gmail_credential,
+                           ua.quiet_hours_start, ua.quiet_hours_end, ua.timezone
                     FROM workflows w
                     JOIN gmail_credentials c ON w.gmail_credential_id = c.id
                     JOIN user_accounts ua ON w.user_id = ua.id
-                    WHERE w.n8n_workflow_id = %s AND w.status = 'active'
+                    WHERE w.status = 'active' AND c.status = 'active'
+                      AND c.n8n_gmail_credential IS NOT NULL
+                      AND w.id > %s
+                    ORDER BY w.id
+                    LIMIT %s
                 """,
-                    (n8n_workflow_id,),
+                    (after_workflow_id, limit),
+                )
+                return [dict(row) for row in cursor.fetchall()]
+
+    def update_workflow_poll_schedule(self, workflow_id: int, poll_interval_minutes: int, message_rate: Optional[float], measured_at: datetime) -> None:
+        """Record a workflow's poll interval tier and estimated mails per hour as of measured_at (UTC)"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE workflows 
+                    SET poll_interval_minutes = %s, message_rate = %s,
+                        rate_updated_at = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    RETURNING user_id
+                """,
+                    (poll_interval_minutes, message_rate, measured_at, workflow_id),
                 )
                 row = cursor.fetchone()
-                return dict(row) if row else None
+            conn.commit()
+        if row:
+            self._invalidate_users(row[0])
 
-    def get_all_workflows(self) -> List[Dict]:
-        """Get all workflows with user and credential info"""
+    def update_quiet_hours(self, user_id: int, start: Optional[int], end: Optional[int], timezone: str = "UTC") -> None:
+        """Set a user's quiet hours (local hours, end exclusive); None clears them"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE user_accounts 
+                    SET quiet_hours_start = %s, quiet_hours_end = %s, timezone = %s
+                    WHERE id = %s
+                """,
+                    (start, end, timezone, user_id),
+                )
+            conn.commit()
+        self.cache.delete(f"user:{user_id}")
+        self._invalidate_users(user_id)
+
+    def set_workflow_shard(self, workflow_id: int, shard_id: Optional[int]) -> None:
+        """Assign a workflow to a shared-pool shard"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE workflows 
+                    SET shard_id = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    RETURNING user_id
+                """,
+                    (shard_id, workflow_id),
+                )
+                row = cursor.fetchone()
+            conn.commit()
+        if row:
+            self._invalidate_users(row[0])
+
+    def get_shard_members(self, shard_id: int) -> List[Dict]:
+        """Get the provisioned tenants assigned to a shard"""
         with self._get_connection() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
                 cursor.execute(
                     """
-                    SELECT w.*, c.gmail_email, ua.username, ua.email as user_email
+                    SELECT w.id AS workflow_id, w.user_id, c.gmail_email, c.n8n_gmail_credential
                     FROM workflows w
                     JOIN gmail_credentials c ON w.gmail_credential_id = c.id
-                    JOIN user_accounts ua ON w.user_id = ua.id
-                    WHERE w.status = 'active'
-                    ORDER BY w.created_at DESC
+                    WHERE w.shard_id = %s AND w.status = 'active'
+                      AND c.status = 'active' AND c.n8n_gmail_credential IS NOT NULL
+                    ORDER BY w.id
+                """,
+                    (shard_id,),
+                )
+                return [dict(row) for row in cursor.fetchall()]
+
+    def get_shard(self, shard_id: int) -> Optional[Dict]:
+        """Get a shard's n8n workflow record"""
+        return self._fetch_one("SELECT * FROM workflow_shards WHERE shard_id = %s", (shard_id,))
+
+    def save_shard(self, shard_id: int, n8n_workflow_id: Optional[str], member_count: int) -> None:
+        """Create or update a shard's n8n workflow record"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO workflow_shards (shard_id, n8n_workflow_id, member_count)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (shard_id) DO UPDATE SET
+                        n8n_workflow_id = EXCLUDED.n8n_workflow_id,
+                        member_count = EXCLUDED.member_count,
+                        updated_at = CURRENT_TIMESTAMP
+                """,
+                    (shard_id, n8n_workflow_id, member_count),
+                )
+            conn.commit()
+
+    def set_shard_members_status(self, shard_id: int, status: str) -> None:
+        """Set workflow_status of every active workflow in a shard"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE workflows 
+                    SET workflow_status = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE shard_id = %s AND status = 'active' AND workflow_status <> %s
+                    RETURNING user_id
+                """,
+                    (status, shard_id, status),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        self._invalidate_users(*[row[0] for row in rows])
+
+    @contextmanager
+    def advisory_lock(self, namespace: int, key: int, wait: bool = True):
+        """Hold a session-level Postgres advisory lock for the duration of a with block.
+
+        With ``wait=False`` the block runs at once and the with target is
+        False if another session holds the lock.
+        """
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                if wait:
+                    cursor.execute("SELECT pg_advisory_lock(%s, %s)", (namespace, key))
+                    acquired = True
+                else:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", (namespace, key))
+                    acquired = cursor.fetchone()[0]
+            conn.commit()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_advisory_unlock(%s, %s)", (namespace, key))
+                    conn.commit()
+
+    @contextmanager
+    def lease(self, name: str, seconds: float, wait: bool = True):
+        """Hold a named lease for the duration of a with block.
+
+        Unlike advisory_lock no connection is kept checked out, so the block
+        can make slow n8n calls. The lease lapses after ``seconds`` if its
+        holder dies. The with target is the lease token for extend_lease(),
+        or None with ``wait=False`` if another holder has the lease.
+        """
+        token = secrets.token_hex(16)
+        delay = 0.05
+        while not self.claim_lease(name, token, seconds):
+            if not wait:
+                yield None
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        try:
+            yield token
+        finally:
+            self.release_lease(name, token)
+
+    def claim_lease(self, name: str, token: str, seconds: float) -> bool:
+        """Take a named lease for token unless someone else holds an unexpired one"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO leases (name, token, expires_at)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+                    ON CONFLICT (name) DO UPDATE SET token = EXCLUDED.token, expires_at = EXCLUDED.expires_at
+                    WHERE leases.expires_at < CURRENT_TIMESTAMP
+                    RETURNING token
+                """,
+                    (name, token, seconds),
+                )
+                claimed = cursor.fetchone() is not None
+            conn.commit()
+            return claimed
+
+    def extend_lease(self, name: str, token: str, seconds: float) -> bool:
+        """Push a held lease's expiry out; False if it lapsed and was taken over"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE leases SET expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s) WHERE name = %s AND token = %s",
+                    (seconds, name, token),
+                )
+                extended = cursor.rowcount == 1
+            conn.commit()
+            return extended
+
+    def release_lease(self, name: str, token: str) -> None:
+        """Drop a lease if token still holds it"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM leases WHERE name = %s AND token = %s", (name, token))
+            conn.commit()
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        """Get a server-side session record.
+
+        Cached only in a cache every process shares: a per-process cache
+        would keep accepting a session revoked by another worker until TTL.
+        """
+        def load():
+            return self._fetch_one(
+                "SELECT id, user_id, data, refreshed_at, expires_at FROM user_sessions WHERE id = %s", (session_id,)
+            )
+        if not self.cache.shared_across_processes:
+            return load()
+        return self.cache.get_or_load(f"session:{session_id}", load)
+
+    def save_session(self, session_id: str, user_id: Optional[int], data: str, refreshed_at: datetime, expires_at: datetime) -> None:
+        """Create or replace a server-side session and extend its expiry"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO user_sessions (id, user_id, data, refreshed_at, expires_at) VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (id) DO UPDATE SET user_id = EXCLUDED.user_id, data = EXCLUDED.data,
+                        refreshed_at = EXCLUDED.refreshed_at, expires_at = EXCLUDED.expires_at
+                """,
+                    (session_id, user_id, data, refreshed_at, expires_at),
+                )
+            conn.commit()
+        self.cache.delete(f"session:{session_id}")
+
+    def delete_sessions(self, *session_ids: str) -> None:
+        """Delete server-side sessions"""
+        if not session_ids:
+            return
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM user_sessions WHERE id = ANY(%s)", (list(session_ids),))
+            conn.commit()
+        self.cache.delete(*[f"session:{session_id}" for session_id in session_ids])
+
+    def revoke_user_sessions(self, user_ids: List[int], keep: str = None) -> int:
+        """Delete every session of the given users except keep; returns how many were revoked"""
+        if not user_ids:
+            return 0
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM user_sessions WHERE user_id = ANY(%s) AND id <> %s RETURNING id",
+                    (list(user_ids), keep or ""),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        self.cache.delete(*[f"session:{row[0]}" for row in rows])
+        return len(rows)
+
+    def delete_expired_sessions(self, now: datetime, limit: int = 1000) -> int:
+        """Delete up to limit sessions that expired before now"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    DELETE FROM user_sessions WHERE id IN (
+                        SELECT id FROM user_sessions WHERE expires_at < %s LIMIT %s
+                    )
+                    RETURNING id
+                """,
+                    (now, limit),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        self.cache.delete(*[f"session:{row[0]}" for row in rows])
+        return len(rows)
+
+    def count_sessions(self, now: datetime) -> Dict:
+        """Count unexpired sessions and the users they belong to"""
+        return self._fetch_one(
+            "SELECT COUNT(*) AS sessions, COUNT(DISTINCT user_id) AS users FROM user_sessions WHERE expires_at >= %s",
+            (now,),
+        )
+
+    def get_ingest_cursor(self, name: str) -> Optional[str]:
+        """Get the saved resume position of an incremental ingester"""
+        row = self._fetch_one("SELECT position FROM ingest_cursors WHERE name = %s", (name,))
+        return row["position"] if row else None
+
+    def save_ingest_cursor(self, name: str, position: str) -> None:
+        """Save the resume position of an incremental ingester"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO ingest_cursors (name, position) VALUES (%s, %s)
+                    ON CONFLICT (name) DO UPDATE SET position = EXCLUDED.position, updated_at = CURRENT_TIMESTAMP
+                """,
+                    (name, position),
+                )
+            conn.commit()
+
+    def get_execution_workflow_map(self) -> Dict[str, Dict]:
+        """Map every n8n workflow id we own to its workflow row (per-tenant) or shard"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    SELECT n8n_workflow_id, id AS workflow_id, user_id, NULL::int AS shard_id
+                    FROM workflows WHERE n8n_workflow_id IS NOT NULL
+                    UNION ALL
+                    SELECT n8n_workflow_id, NULL, NULL, shard_id
+                    FROM workflow_shards WHERE n8n_workflow_id IS NOT NULL
+                """
+                )
+                return {row["n8n_workflow_id"]: dict(row) for row in cursor.fetchall()}
+
+    def ensure_execution_partitions(self, months: List[Tuple[int, int]]) -> None:
+        """Create the monthly workflow_executions partitions for (year, month) pairs if missing"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                for year, month in sorted(set(months)):
+                    start = datetime(year, month, 1)
+                    end = datetime(year + month // 12, month % 12 + 1, 1)
+                    cursor.execute(
+                        f"""
+                        CREATE TABLE IF NOT EXISTS workflow_executions_{year:04d}{month:02d}
+                        PARTITION OF workflow_executions FOR VALUES FROM (%s) TO (%s)
+                    """,
+                        (start, end),
+                    )
+            conn.commit()
+
+    def drop_execution_partitions(self, before: datetime) -> List[str]:
+        """Drop monthly execution partitions that end on or before a time; returns their names"""
+        dropped = []
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT child.relname
+                    FROM pg_inherits
+                    JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+                    JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+                    WHERE parent.relname = 'workflow_executions'
                 """
                 )
+                for (name,) in cursor.fetchall():
+                    suffix = name.rsplit("_", 1)[-1]
+                    if not suffix.isdigit() or len(suffix) != 6:
+                        continue
+                    year, month = int(suffix[:4]), int(suffix[4:])
+                    if datetime(year + month // 12, month % 12 + 1, 1) <= before:
+                        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+                        dropped.append(name)
+            conn.commit()
+        return dropped
+
+    def insert_executions(self, rows: List[Tuple]) -> int:
+        """Append execution rows, skipping ones already stored; returns how many were new.
+
+        Rows are (n8n_execution_id, started_at, stopped_at, workflow_id,
+        user_id, shard_id, n8n_workflow_id, status, mode, duration_ms, messages).
+        """
+        if not rows:
+            return 0
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                inserted = psycopg2.extras.execute_values(
+                    cursor,
+                    """
+                    INSERT INTO workflow_executions (
+                        n8n_execution_id, started_at, stopped_at, workflow_id, user_id, shard_id,
+                        n8n_workflow_id, status, mode, duration_ms, messages
+                    ) VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                """,
+                    rows,
+                    page_size=len(rows),
+                    fetch=True,
+                )
+            conn.commit()
+        return len(inserted)
+
+    def refresh_execution_rollups(self, workflow_ids: List[int], start: datetime, end: datetime) -> None:
+        """Recompute the hourly and daily rollups of workflows for the buckets covering [start, end]"""
+        if not workflow_ids:
+            return
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO execution_rollups_hourly (
+                        workflow_id, bucket, user_id, executions, failed, messages, total_duration_ms, max_duration_ms
+                    )
+                    SELECT workflow_id, date_trunc('hour', started_at), MAX(user_id), COUNT(*),
+                           COUNT(*) FILTER (WHERE status <> 'success'), SUM(messages),
+                           COALESCE(SUM(duration_ms), 0), MAX(duration_ms)
+                    FROM workflow_executions
+                    WHERE workflow_id = ANY(%(ids)s)
+                      AND started_at >= date_trunc('hour', %(start)s::timestamp)
+                      AND started_at < date_trunc('hour', %(end)s::timestamp) + INTERVAL '1 hour'
+                    GROUP BY workflow_id, date_trunc('hour', started_at)
+                    ON CONFLICT (workflow_id, bucket) DO UPDATE SET
+                        user_id = EXCLUDED.user_id, executions = EXCLUDED.executions, failed = EXCLUDED.failed,
+                        messages = EXCLUDED.messages, total_duration_ms = EXCLUDED.total_duration_ms,
+                        max_duration_ms = EXCLUDED.max_duration_ms
+                """,
+                    {"ids": list(workflow_ids), "start": start, "end": end},
+                )
+                cursor.execute(
+                    """
+                    INSERT INTO execution_rollups_daily (
+                        workflow_id, bucket, user_id, executions, failed, messages, total_duration_ms, max_duration_ms
+                    )
+                    SELECT workflow_id, date_trunc('day', bucket), MAX(user_id), SUM(executions), SUM(failed),
+                           SUM(messages), SUM(total_duration_ms), MAX(max_duration_ms)
+                    FROM execution_rollups_hourly
+                    WHERE workflow_id = ANY(%(ids)s)
+                      AND bucket >= date_trunc('day', %(start)s::timestamp)
+                      AND bucket < date_trunc('day', %(end)s::timestamp) + INTERVAL '1 day'
+                    GROUP BY workflow_id, date_trunc('day', bucket)
+                    ON CONFLICT (workflow_id, bucket) DO UPDATE SET
+                        user_id = EXCLUDED.user_id, executions = EXCLUDED.executions, failed = EXCLUDED.failed,
+                        messages = EXCLUDED.messages, total_duration_ms = EXCLUDED.total_duration_ms,
+                        max_duration_ms = EXCLUDED.max_duration_ms
+                """,
+                    {"ids": list(workflow_ids), "start": start, "end": end},
+                )
+            conn.commit()
+
+    def get_user_usage(self, user_id: int, since: datetime) -> Dict:
+        """Sum a user's daily execution rollups since a day"""
+        return self.cache.get_or_load(f"usage:{user_id}:{since:%Y-%m-%d}", lambda: self._fetch_one(
+            """
+            SELECT COALESCE(SUM(executions), 0)::bigint AS executions, COALESCE(SUM(failed), 0)::bigint AS failed,
+                   SUM(messages)::bigint AS messages,
+                   (SUM(total_duration_ms) / NULLIF(SUM(executions), 0))::int AS avg_duration_ms
+            FROM execution_rollups_daily
+            WHERE user_id = %s AND bucket >= %s
+        """,
+            (user_id, since),
+        ))
+
+    def get_usage_report(self, since: datetime, limit: int = 100) -> List[Dict]:
+        """Per-tenant totals from the daily rollups since a day, busiest first"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    SELECT r.workflow_id, r.user_id, c.gmail_email,
+                           SUM(r.executions)::bigint AS executions, SUM(r.failed)::bigint AS failed,
+                           SUM(r.messages)::bigint AS messages,
+                           (SUM(r.total_duration_ms) / NULLIF(SUM(r.executions), 0))::int AS avg_duration_ms,
+                           MAX(r.max_duration_ms) AS max_duration_ms
+                    FROM execution_rollups_daily r
+                    LEFT JOIN workflows w ON w.id = r.workflow_id
+                    LEFT JOIN gmail_credentials c ON c.id = w.gmail_credential_id
+                    WHERE r.bucket >= %s
+                    GROUP BY r.workflow_id, r.user_id, c.gmail_email
+                    ORDER BY executions DESC
+                    LIMIT %s
+                """,
+                    (since, limit),
+                )
                 return [dict(row) for row in cursor.fetchall()]
 
-    def delete_user_credential(self, user_id: int) -> bool:
-        """Delete user's credential"""
+    def update_credential_tokens(self, credential_id: int, access_token: str, token_expires_at: datetime,
+                                 token_refresh_after: Optional[datetime], refresh_token: str = None) -> None:
+        """Store a refreshed access token (and a rotated refresh token, if Google sent one)"""
         with self._get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("DELETE FROM gmail_credentials WHERE user_id = %s", (user_id,))
+                cursor.execute(
+                    """
+                    UPDATE gmail_credentials 
+                    SET access_token = %s, refresh_token = COALESCE(%s, refresh_token),
+                        token_expires_at = %s, token_refresh_after = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    RETURNING user_id
+                """,
+                    (access_token, refresh_token, token_expires_at, token_refresh_after, credential_id),
+                )
+                row = cursor.fetchone()
             conn.commit()
-            return cursor.rowcount > 0
+        if row:
+            self._invalidate_users(row[0])
 
-    def delete_user_workflow(self, user_id: int) -> bool:
-        """Delete user's workflow"""
+    def claim_token_refreshes(self, now: datetime, lease_until: datetime, limit: int = 100) -> List[Dict]:
+        """Claim credentials due for an access token refresh.
+
+        Claimed rows are pushed to ``lease_until`` so concurrent schedulers
+        skip them, and are retried then if this one dies mid-refresh.
+        """
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    UPDATE gmail_credentials 
+                    SET token_refresh_after = %s
+                    WHERE id IN (
+                        SELECT id FROM gmail_credentials
+                        WHERE status = 'active' AND token_refresh_after <= %s
+                        ORDER BY token_refresh_after
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                """,
+                    (lease_until, now, limit),
+                )
+                rows = [dict(row) for row in cursor.fetchall()]
+            conn.commit()
+        return rows
+
+    def reschedule_token_refresh(self, credential_id: int, refresh_after: Optional[datetime]) -> None:
+        """Set when a credential's token is refreshed next; None stops refreshing it"""
         with self._get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("DELETE FROM workflows WHERE user_id = %s", (user_id,))
+                cursor.execute(
+                    "UPDATE gmail_credentials SET token_refresh_after = %s WHERE id = %s",
+                    (refresh_after, credential_id),
+                )
             conn.commit()
-            return cursor.rowcount > 0
 
-    def delete_workflow_by_n8n_id(self, n8n_workflow_id: str) -> bool:
-        """Delete workflow by n8n workflow ID"""
+    def save_gmail_watch(self, credential_id: int, history_id: Optional[int], expires_at: Optional[datetime]) -> None:
+        """Record a Gmail users.watch registration (None clears it)"""
         with self._get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("DELETE FROM workflows WHERE n8n_workflow_id = %s", (n8n_workflow_id,))
+                cursor.execute(
+                    """
+                    UPDATE gmail_credentials 
+                    SET gmail_history_id = COALESCE(%s, gmail_history_id), watch_expires_at = %s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    RETURNING user_id
+                """,
+                    (history_id, expires_at, credential_id),
+                )
+                row = cursor.fetchone()
             conn.commit()
-            return cursor.rowcount > 0
+        if row:
+            self._invalidate_users(row[0])
 
-    def delete_credential_by_email(self, email: str) -> bool:
-        """Delete credential by email"""
+    def claim_gmail_push(self, credential_id: int, lease_seconds: float) -> Optional[Dict]:
+        """Lease a credential's push forwarding; returns its current row, or None if the lease is held"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    UPDATE gmail_credentials
+                    SET push_lease_until = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    WHERE id = %s AND (push_lease_until IS NULL OR push_lease_until < CURRENT_TIMESTAMP)
+                    RETURNING *
+                """,
+                    (lease_seconds, credential_id),
+                )
+                row = cursor.fetchone()
+            conn.commit()
+            return dict(row) if row else None
+
+    def release_gmail_push(self, credential_id: int, lease_until: datetime) -> None:
+        """Release a credential's push forwarding lease, unless it expired and was claimed again"""
         with self._get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("DELETE FROM gmail_credentials WHERE gmail_email = %s", (email,))
+                cursor.execute(
+                    "UPDATE gmail_credentials SET push_lease_until = NULL WHERE id = %s AND push_lease_until = %s",
+                    (credential_id, lease_until),
+                )
             conn.commit()
-            return cursor.rowcount > 0
+
+    def advance_credential_history_id(self, credential_id: int, expected: Optional[int], history_id: int) -> bool:
+        """Move the last forwarded Gmail historyId from expected to history_id; False if it moved meanwhile"""
+        # Not shown anywhere we cache, and written on every notification, so
+        # the cached credential rows are left alone
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE gmail_credentials SET gmail_history_id = %s WHERE id = %s AND gmail_history_id IS NOT DISTINCT FROM %s",
+                    (history_id, credential_id, expected),
+                )
+                moved = cursor.rowcount == 1
+            conn.commit()
+            return moved
+
+    def get_expiring_gmail_watches(self, before: datetime, after: Tuple[Optional[datetime], int] = None,
+                                   limit: int = 500) -> List[Dict]:
+        """Get provisioned credentials with no Gmail watch or one expiring before the given time.
+
+        Pages by (watch_expires_at NULLS FIRST, id): pass the values of the
+        previous page's last row as ``after``.
+        """
+        after_expires_at, after_id = after or (None, 0)
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    SELECT * FROM gmail_credentials
+                    WHERE status = 'active' AND n8n_gmail_credential IS NOT NULL
+                      AND (watch_expires_at IS NULL OR watch_expires_at < %s)
+                      AND (COALESCE(watch_expires_at, '-infinity'), id) > (COALESCE(%s::timestamp, '-infinity'), %s)
+                    ORDER BY watch_expires_at NULLS FIRST, id
+                    LIMIT %s
+                """,
+                    (before, after_expires_at, after_id, limit),
+                )
+                return [dict(row) for row in cursor.fetchall()]
+
+    def enqueue_provisioning_job(self, user_id: int, gmail_credential_id: int, workflow_id: int, max_attempts: int = 5) -> int:
+        """Queue a job that provisions the n8n credential and workflow, reusing the workflow's open job"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(ENQUEUE_PROVISIONING_JOB_SQL, (user_id, gmail_credential_id, workflow_id, max_attempts))
+                job_id = cursor.fetchone()[0]
+            conn.commit()
+            return job_id
+
+    def claim_provisioning_job(self, lease_seconds: float) -> Optional[Dict]:
+        """Lock the next due job (or one whose worker died with attempts left) and mark it running"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    UPDATE provisioning_jobs
+                    SET status = 'running', attempts = attempts + 1,
+                        locked_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT id FROM provisioning_jobs
+                        WHERE (status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+                           OR (status = 'running' AND locked_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                               AND attempts < max_attempts)
+                        ORDER BY run_after
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                """,
+                    (lease_seconds,),
+                )
+                row = cursor.fetchone()
+            conn.commit()
+            return dict(row) if row else None
+
+    def complete_provisioning_job(self, job_id: int) -> Optional[str]:
+        """Mark a running job done, or queue it again if a rerun was requested. Returns the new status"""
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE provisioning_jobs
+                    SET status = CASE WHEN rerun THEN 'queued' ELSE 'done' END,
+                        attempts = CASE WHEN rerun THEN 0 ELSE attempts END,
+                        run_after = CURRENT_TIMESTAMP, rerun = FALSE,
+                        locked_at = NULL, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND status = 'running'
+                    RETURNING status
+                """,
+                    (job_id,),
+                )
+                row = cursor.fetchone()
+            conn.commit()
+            return row[0] if row else None
+
+    def fail_provisioning_job(self, job_id: int, error: str, retry_delay: float) -> Optional[str]:
+        """Record a failed attempt; requeue after retry_delay or give up.
+
+        Returns the new status, or None if the job was no longer running.
+        """
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE provisioning_jobs
+                    SET status = CASE WHEN attempts >= max_attempts AND NOT rerun THEN 'failed' ELSE 'queued' END,
+                        attempts = CASE WHEN rerun THEN 0 ELSE attempts END, rerun = FALSE,
+                        run_after = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                        locked_at = NULL, last_error = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND status = 'running'
+                    RETURNING status
+                """,
+                    (retry_delay, error, job_id),
+                )
+                row = cursor.fetchone()
+            conn.commit()
+            return row[0] if row else None
+
+    def fail_abandoned_provisioning_jobs(self, lease_seconds: float) -> List[Dict]:
+        """Give up on jobs whose worker died on their last attempt; returns their id and workflow_id"""
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    UPDATE provisioning_jobs
+                    SET status = CASE WHEN rerun THEN 'queued' ELSE 'failed' END,
+                        attempts = CASE WHEN rerun THEN 0 ELSE attempts END,
+                        run_after = CURRENT_TIMESTAMP, rerun = FALSE, locked_at = NULL,
+                        last_error = COALESCE(last_error, 'Worker lost its lease'), updated_at = CURRENT_TIMESTAMP
+                    WHERE status = 'running' AND locked_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                      AND attempts >= max_attempts
+                    RETURNING id, workflow_id, status
+                """,
+                    (lease_seconds,),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+            return [dict(row) for row in rows if row["status"] == "failed"]
 
     # Legacy methods for backward compatibility
     def save_user(self, email: str, access_token: str, refresh_token: str) -> None:
@@ -263,3 +1399,6 @@ class UserDB:
     def update_workflow_info(self, email: str, credential_id: str, workflow_id: str, workflow_status: str = "active") -> None:
         """Legacy method - use create_workflow and update_workflow_status instead"""
         pass
+
+
+instrument_methods(UserDB, DB_QUERY_DURATION, DB_QUERY_ERRORS)
@@ -0,0 +1,218 @@
+"""Execution history ingestion and per-tenant usage rollups.
+
+n8n keeps executions only until it prunes them, and listing them is slow,
+so finished executions are copied into ``workflow_executions``. That table
+is append-only and partitioned by month of ``started_at``. Each pass walks
+n8n's listing newest first until it reaches the saved cursor (the highest
+execution id already ingested), so only new executions are fetched.
+Executions still running hold the cursor back, so they are picked up once
+they finish. Re-reading an execution is harmless, since inserts skip
+duplicates. A pass holds a lease row (see ``UserDB.lease``), so only one
+process ingests at a time and no database connection stays checked out
+while n8n is paged.
+
+Every batch recomputes the hourly and daily rollups for the tenants and
+hours it touched. Dashboards and the admin usage report read only the
+rollups. Raw months older than ``EXECUTION_RETENTION_DAYS`` are dropped by
+partition.
+
+Shard workflows serve many tenants per execution. They are stored raw with
+their ``shard_id`` but are not rolled up per tenant.
+
+The ingester runs inside the web process (``EXECUTION_INGEST_INTERVAL``) or
+standalone:
+    python execution_ingest.py
+    python execution_ingest.py --once
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from database import UserDB
+from n8n_manager import N8NManager
+
+INGEST_LEASE = "execution_ingest"
+CURSOR_NAME = "n8n_executions"
+TELEGRAM_NODE_NAME = "Send Telegram"
+FINISHED_STATUSES = {"success", "error", "crashed", "canceled"}
+# Executions "running" longer than this are assumed lost and stop holding the cursor back
+STALE_RUNNING = timedelta(hours=24)
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """n8n ISO timestamp as naive UTC"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def execution_status(execution: Dict) -> str:
+    """Execution status, derived from older n8n versions' finished flag when missing"""
+    if execution.get("status"):
+        return execution["status"]
+    if execution.get("finished"):
+        return "success"
+    return "error" if execution.get("stoppedAt") else "running"
+
+
+def count_messages(execution: Dict) -> Optional[int]:
+    """Items the Telegram node sent, or None when the execution was listed without data"""
+    data = execution.get("data")
+    if not data:
+        return None
+    runs = data.get("resultData", {}).get("runData", {}).get(TELEGRAM_NODE_NAME, [])
+    return sum(len((run.get("data") or {}).get("main", [[]])[0] or []) for run in runs)
+
+
+def execution_row(execution: Dict, workflows: Dict[str, Dict]) -> Optional[Tuple]:
+    """workflow_executions row for a finished execution of one of our workflows, else None"""
+    owner = workflows.get(str(execution.get("workflowId")))
+    started_at = parse_time(execution.get("startedAt"))
+    if owner is None or started_at is None:
+        return None
+    stopped_at = parse_time(execution.get("stoppedAt"))
+    duration_ms = int((stopped_at - started_at).total_seconds() * 1000) if stopped_at else None
+    return (
+        int(execution["id"]), started_at, stopped_at, owner["workflow_id"], owner["user_id"], owner["shard_id"],
+        str(execution["workflowId"]), execution_status(execution), execution.get("mode"), duration_ms,
+        count_messages(execution),
+    )
+
+
+class ExecutionIngester:
+    def __init__(self, db: UserDB, n8n: N8NManager, interval: float = None, batch_size: int = None,
+                 include_data: bool = None):
+        self.db = db
+        self.n8n = n8n
+        self.interval = config.EXECUTION_INGEST_INTERVAL if interval is None else interval
+        self.batch_size = batch_size or config.EXECUTION_INGEST_BATCH_SIZE
+        self.include_data = config.EXECUTION_INGEST_INCLUDE_DATA if include_data is None else include_data
+        self.leader = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, leader: Callable[[], bool] = None) -> None:
+        """Start the ingestion thread; with ``leader``, passes only run while it returns True"""
+        self.leader = leader
+        self._thread = threading.Thread(target=self._run, name="execution-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Ask the ingestion thread to exit after its current pass and wait for it"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self.leader and not self.leader():
+                self._stop.wait(self.interval)
+                continue
+            try:
+                report = self.run_once()
+                if report["inserted"]:
+                    print(f"📈 Ingested {report['inserted']} n8n executions")
+            except Exception as e:
+                print(f"❌ Execution ingestion error: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def store(self, rows: List[Tuple]) -> int:
+        """Append a batch of execution rows and refresh the rollups it touches"""
+        if not rows:
+            return 0
+        self.db.ensure_execution_partitions([(row[1].year, row[1].month) for row in rows])
+        inserted = self.db.insert_executions(rows)
+        workflow_ids = {row[3] for row in rows if row[3] is not None}
+        if workflow_ids:
+            started = [row[1] for row in rows]
+            self.db.refresh_execution_rollups(sorted(workflow_ids), min(started), max(started))
+        return inserted
+
+    def _keep_lease(self, lease: str) -> None:
+        if not self.db.extend_lease(INGEST_LEASE, lease, config.EXECUTION_INGEST_LEASE_SECONDS):
+            raise RuntimeError("Execution ingest lease expired and was taken over")
+
+    def run_once(self) -> Dict:
+        """Ingest executions newer than the cursor, then drop expired partitions"""
+        report = {"seen": 0, "inserted": 0, "dropped_partitions": 0, "skipped": False}
+        # Another process is already ingesting
+        with self.db.lease(INGEST_LEASE, config.EXECUTION_INGEST_LEASE_SECONDS, wait=False) as lease:
+            if not lease:
+                report["skipped"] = True
+                return report
+
+            last_id = int(self.db.get_ingest_cursor(CURSOR_NAME) or 0)
+            workflows = self.db.get_execution_workflow_map()
+            stale_before = datetime.utcnow() - STALE_RUNNING
+            newest, oldest_running, batch = last_id, None, []
+
+            for execution in self.n8n.iter_executions(include_data=self.include_data):
+                execution_id = int(execution["id"])
+                if execution_id <= last_id:
+                    break
+                report["seen"] += 1
+                newest = max(newest, execution_id)
+                if execution_status(execution) not in FINISHED_STATUSES:
+                    started_at = parse_time(execution.get("startedAt"))
+                    if started_at is None or started_at >= stale_before:
+                        oldest_running = execution_id
+                    continue
+                row = execution_row(execution, workflows)
+                if row:
+                    batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._keep_lease(lease)
+                    report["inserted"] += self.store(batch)
+                    batch = []
+            self._keep_lease(lease)
+            report["inserted"] += self.store(batch)
+
+            # Resume just below the oldest execution still running
+            self.db.save_ingest_cursor(CURSOR_NAME, str(oldest_running - 1 if oldest_running else newest))
+
+            if config.EXECUTION_RETENTION_DAYS > 0:
+                cutoff = datetime.utcnow() - timedelta(days=config.EXECUTION_RETENTION_DAYS)
+                dropped = self.db.drop_execution_partitions(cutoff)
+                report["dropped_partitions"] = len(dropped)
+                for name in dropped:
+                    print(f"🗑️ Dropped execution partition {name}")
+        return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest n8n executions and roll up per-tenant usage")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--interval", type=float, default=config.EXECUTION_INGEST_INTERVAL or 300)
+    args = parser.parse_args(argv)
+
+    db = UserDB()
+    n8n = N8NManager()
+    ingester = ExecutionIngester(db, n8n, args.interval)
+    try:
+        if args.once:
+            report = ingester.run_once()
+            if report["skipped"]:
+                print("⚠️ Another ingester is running")
+                return 1
+            print(f"✅ {report['seen']} new executions seen, {report['inserted']} stored, "
+                  f"{report['dropped_partitions']} partitions dropped")
+            return 0
+        ingester.start()
+        print(f"🚀 Execution ingestion running every {args.interval:.0f}s")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        ingester.stop()
+        return 0
+    finally:
+        n8n.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
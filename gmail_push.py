@@ -0,0 +1,349 @@
+"""Gmail push ingestion: users.watch notifications instead of minute polling.
+
+With ``INGESTION_MODE=push`` every credential gets a Gmail ``users.watch``
+registration publishing mailbox changes to the Pub/Sub topic
+``GMAIL_PUSH_TOPIC``. The topic's push subscription calls ``/gmail/push``;
+for each notification we read the mailbox history since the last
+``gmail_history_id`` we forwarded and POST every new unread inbox message to
+the tenant's webhook workflow in n8n. Nothing polls, so latency is seconds
+and Gmail API usage follows actual mail volume.
+
+``GMAIL_PUSH_SOURCE=local`` swaps Gmail and Pub/Sub for an in-memory
+mailbox (``LocalPushSource``) so the whole path runs offline.
+
+Watches expire after seven days; renew them daily:
+    python gmail_push.py renew
+"""
+import argparse
+import base64
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+import config
+from database import UserDB
+from metrics import GOOGLE_REQUEST_DURATION
+from n8n_manager import N8NManager
+from oauth_handler import GoogleOAuth
+from token_refresh import refresh_credential_tokens
+
+class PushBusy(Exception):
+    """Another request is forwarding this mailbox's history right now"""
+
+
+class TokenExpired(Exception):
+    """The Gmail API rejected the credential's access token"""
+
+
+class HistoryExpired(Exception):
+    """The stored historyId is too old for users.history.list"""
+
+
+def encode_push_envelope(email: str, history_id: int, message_id: str = "local") -> Dict:
+    """Build a Pub/Sub push request body carrying a Gmail notification"""
+    data = json.dumps({"emailAddress": email, "historyId": history_id}).encode()
+    return {
+        "message": {"data": base64.b64encode(data).decode(), "messageId": message_id},
+        "subscription": "local",
+    }
+
+
+def decode_push_envelope(body: Optional[Dict]) -> Tuple[str, int]:
+    """Extract (email, historyId) from a Pub/Sub push body; raises ValueError if malformed"""
+    try:
+        data = json.loads(base64.b64decode(body["message"]["data"]))
+        return data["emailAddress"], int(data["historyId"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid Gmail push notification") from e
+
+
+class GmailAPI:
+    """The few Gmail API calls push ingestion needs"""
+
+    def __init__(self):
+        self.base_url = config.GMAIL_API_URL
+        self.session = requests.Session()
+
+    def _call(self, name: str, method: str, path: str, credential: Dict, **kwargs) -> requests.Response:
+        status = "error"
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                f"{self.base_url}{path}",
+                headers={"Authorization": f"Bearer {credential['access_token']}"},
+                timeout=(3.05, 30),
+                **kwargs,
+            )
+            status = str(response.status_code)
+        finally:
+            GOOGLE_REQUEST_DURATION.observe(time.perf_counter() - start, call=name, status=status)
+        if response.status_code == 401:
+            raise TokenExpired(credential["gmail_email"])
+        return response
+
+    def watch(self, credential: Dict, topic: str) -> Dict:
+        """Register a watch on the inbox; returns historyId and expiration (ms)"""
+        body = {"topicName": topic, "labelIds": ["INBOX"], "labelFilterBehavior": "include"}
+        response = self._call("gmail_watch", "POST", "/watch", credential, json=body)
+        if response.status_code != 200:
+            raise Exception(f"Gmail watch failed: {response.text}")
+        return response.json()
+
+    def stop(self, credential: Dict) -> None:
+        """Stop push notifications for the mailbox"""
+        self._call("gmail_stop", "POST", "/stop", credential)
+
+    def list_history(self, credential: Dict, start_history_id: int) -> Tuple[List[Tuple[int, List[str]]], int]:
+        """Unread inbox messages added since start_history_id.
+
+        Returns ``([(history_id, [message_id, ...]), ...], latest_history_id)``.
+        """
+        params = {"startHistoryId": start_history_id, "historyTypes": "messageAdded", "labelId": "INBOX"}
+        records, latest = [], start_history_id
+        while True:
+            response = self._call("gmail_history", "GET", "/history", credential, params=params)
+            if response.status_code == 404:
+                raise HistoryExpired(credential["gmail_email"])
+            if response.status_code != 200:
+                raise Exception(f"Gmail history failed: {response.text}")
+            page = response.json()
+            latest = int(page.get("historyId", latest))
+            for record in page.get("history", []):
+                message_ids = [
+                    added["message"]["id"]
+                    for added in record.get("messagesAdded", [])
+                    if "UNREAD" in added["message"].get("labelIds", [])
+                ]
+                records.append((int(record["id"]), message_ids))
+            if not page.get("nextPageToken"):
+                return records, latest
+            params["pageToken"] = page["nextPageToken"]
+
+    def get_message(self, credential: Dict, message_id: str) -> Optional[Dict]:
+        """Subject, sender and date of a message, or None if it is gone"""
+        response = self._call(
+            "gmail_message",
+            "GET",
+            f"/messages/{message_id}",
+            credential,
+            params={"format": "metadata", "metadataHeaders": ["Subject", "From", "Date"]},
+        )
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise Exception(f"Gmail message fetch failed: {response.text}")
+        message = response.json()
+        headers = {h["name"].lower(): h["value"] for h in message.get("payload", {}).get("headers", [])}
+        return {
+            "id": message["id"],
+            "subject": headers.get("subject", ""),
+            "from": headers.get("from", ""),
+            "date": headers.get("date", ""),
+            "snippet": message.get("snippet", ""),
+        }
+
+
+class LocalPushSource:
+    """In-memory stand-in for Gmail and Pub/Sub.
+
+    Implements the ``GmailAPI`` interface over per-address mailboxes.
+    ``deliver`` adds a message and, if the mailbox is watched, returns the
+    Pub/Sub push body a real subscription would send.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._history_id = 1000
+        self._mailboxes = {}  # email -> {"watched": bool, "history": [(history_id, message)]}
+
+    def _mailbox(self, email: str) -> Dict:
+        return self._mailboxes.setdefault(email, {"watched": False, "history": []})
+
+    def watch(self, credential: Dict, topic: str) -> Dict:
+        with self._lock:
+            self._mailbox(credential["gmail_email"])["watched"] = True
+            expiration = (time.time() + 7 * 24 * 3600) * 1000
+            return {"historyId": str(self._history_id), "expiration": str(int(expiration))}
+
+    def stop(self, credential: Dict) -> None:
+        with self._lock:
+            self._mailbox(credential["gmail_email"])["watched"] = False
+
+    def list_history(self, credential: Dict, start_history_id: int):
+        with self._lock:
+            history = self._mailbox(credential["gmail_email"])["history"]
+            records = [(hid, [message["id"]]) for hid, message in history if hid > start_history_id]
+            return records, self._history_id
+
+    def get_message(self, credential: Dict, message_id: str) -> Optional[Dict]:
+        with self._lock:
+            for _, message in self._mailbox(credential["gmail_email"])["history"]:
+                if message["id"] == message_id:
+                    return dict(message)
+        return None
+
+    def deliver(self, email: str, subject: str, sender: str) -> Optional[Dict]:
+        """Add a message to a mailbox; returns the push body if the mailbox is watched"""
+        with self._lock:
+            self._history_id += 1
+            mailbox = self._mailbox(email)
+            message = {
+                "id": f"local-{self._history_id}",
+                "subject": subject,
+                "from": sender,
+                "date": datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S +0000"),
+                "snippet": "",
+            }
+            mailbox["history"].append((self._history_id, message))
+            if not mailbox["watched"]:
+                return None
+            return encode_push_envelope(email, self._history_id, message["id"])
+
+
+def create_push_source():
+    """Gmail API client, or the offline stand-in when GMAIL_PUSH_SOURCE=local"""
+    if config.GMAIL_PUSH_SOURCE == "local":
+        return LocalPushSource()
+    return GmailAPI()
+
+
+class GmailPushService:
+    def __init__(self, db: UserDB, n8n: N8NManager, oauth: GoogleOAuth, source=None):
+        self.db = db
+        self.n8n = n8n
+        self.oauth = oauth
+        self.source = source or create_push_source()
+
+    def _with_token(self, credential: Dict, call, *args):
+        """Run a Gmail call, refreshing the access token once if it has expired"""
+        try:
+            return call(credential, *args)
+        except TokenExpired:
+            refresh_credential_tokens(self.db, self.oauth, credential)
+            return call(credential, *args)
+
+    def start_watch(self, credential: Dict) -> None:
+        """Register (or renew) the Gmail watch for a credential"""
+        result = self._with_token(credential, self.source.watch, config.GMAIL_PUSH_TOPIC)
+        expires_at = datetime.utcfromtimestamp(int(result["expiration"]) / 1000)
+        # Renewals keep the stored position so nothing between watches is skipped
+        history_id = None if credential.get("gmail_history_id") else int(result["historyId"])
+        self.db.save_gmail_watch(credential["id"], history_id, expires_at)
+        print(f"✅ Gmail watch for {credential['gmail_email']} until {expires_at:%Y-%m-%d %H:%M}")
+
+    def stop_watch(self, credential: Dict) -> None:
+        """Best-effort stop of a credential's Gmail watch"""
+        try:
+            self._with_token(credential, self.source.stop)
+        except Exception as e:
+            print(f"⚠️ Could not stop Gmail watch for {credential['gmail_email']}: {str(e)}")
+
+    def renew_watches(self, within_hours: float = None) -> Dict:
+        """Register missing watches and renew those expiring within the given number of hours"""
+        within_hours = config.GMAIL_WATCH_RENEW_HOURS if within_hours is None else within_hours
+        before = datetime.utcnow() + timedelta(hours=within_hours)
+        renewed, failed, after = 0, 0, None
+        while True:
+            pending = self.db.get_expiring_gmail_watches(before, after)
+            if not pending:
+                break
+            # Keyset on the values read, so credentials that keep failing are passed once
+            after = (pending[-1]["watch_expires_at"], pending[-1]["id"])
+            for credential in pending:
+                try:
+                    self.start_watch(credential)
+                    renewed += 1
+                except Exception as e:
+                    print(f"❌ Gmail watch renewal failed for {credential['gmail_email']}: {str(e)}")
+                    failed += 1
+        return {"renewed": renewed, "failed": failed}
+
+    def handle_notification(self, body: Dict) -> int:
+        """Forward the new messages behind one push notification; returns how many were sent
+
+        Raises ValueError for a malformed body and PushBusy while another
+        request holds the mailbox's lease. Any exception means the
+        notification should be redelivered; the stored history position only
+        advances past records that were fully forwarded.
+
+        The lease is a timestamp on the credential row, so no database
+        connection is held while Gmail and n8n are called. Each advance of
+        the position is a compare-and-set, so a request that outlived its
+        lease stops instead of moving the position back.
+        """
+        email, notified_history_id = decode_push_envelope(body)
+        known = self.db.get_credential_by_email(email)
+        if not known or (known["gmail_history_id"] or 0) >= notified_history_id:
+            return 0
+
+        credential = self.db.claim_gmail_push(known["id"], config.GMAIL_PUSH_LEASE_SECONDS)
+        if credential is None:
+            raise PushBusy(f"Gmail history of {email} is being forwarded by another request")
+        try:
+            return self._forward(credential, notified_history_id)
+        finally:
+            self.db.release_gmail_push(credential["id"], credential["push_lease_until"])
+
+    def _forward(self, credential: Dict, notified_history_id: int) -> int:
+        email = credential["gmail_email"]
+        workflow = self.db.get_user_workflow(credential["user_id"])
+        if not credential["n8n_gmail_credential"] or not workflow or workflow["workflow_status"] != "active":
+            return 0
+
+        start = credential["gmail_history_id"]
+        if start is None or start >= notified_history_id:
+            if start is None:
+                self.db.advance_credential_history_id(credential["id"], None, notified_history_id)
+            return 0
+
+        try:
+            records, latest = self._with_token(credential, self.source.list_history, start)
+        except HistoryExpired:
+            print(f"⚠️ Gmail history for {email} expired, resuming from {notified_history_id}")
+            self.db.advance_credential_history_id(credential["id"], start, notified_history_id)
+            return 0
+
+        path = self.n8n.push_webhook_path(credential["n8n_gmail_credential"])
+        sent, position = 0, start
+        for history_id, message_ids in records:
+            for message_id in message_ids:
+                message = self._with_token(credential, self.source.get_message, message_id)
+                if message is None:
+                    continue
+                if not self.n8n.trigger_webhook(path, dict(message, email=email)):
+                    raise Exception(f"n8n webhook {path} rejected message {message_id}")
+                sent += 1
+            if not self.db.advance_credential_history_id(credential["id"], position, history_id):
+                print(f"⚠️ Gmail history position of {email} moved while forwarding, stopping")
+                return sent
+            position = history_id
+
+        self.db.advance_credential_history_id(credential["id"], position, max(latest, notified_history_id))
+        return sent
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage Gmail push watches")
+    parser.add_argument("command", choices=["renew"])
+    parser.add_argument("--within-hours", type=float, help="Renew watches expiring within this many hours")
+    args = parser.parse_args(argv)
+
+    db = UserDB()
+    n8n = N8NManager()
+    try:
+        result = GmailPushService(db, n8n, GoogleOAuth()).renew_watches(args.within_hours)
+    finally:
+        n8n.close()
+        db.close()
+    print(f"✅ Renewed {result['renewed']} Gmail watches, {result['failed']} failed")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
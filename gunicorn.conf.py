@@ -0,0 +1,114 @@
+"""Production serving: gunicorn with one worker process per core.
+
+    gunicorn -c gunicorn.conf.py
+
+With WEB_PRELOAD the master imports app.py and compiles the templates once,
+then forks, so workers share those pages copy-on-write and start faster.
+Nothing that holds a socket, lock or thread is created before the fork:
+each worker builds its own database pool, Google and n8n clients and
+provisioning workers in ``post_worker_init``. Token refresh, status sync
+and execution ingest only need one runner: with WEB_SINGLETON_JOBS=leader
+(the default) every worker starts them, but only the worker whose pid the
+master keeps in shared memory runs passes; when it exits the master hands
+the role to another live worker. Stored functions are deployed once, by
+the master. A per-process lookup cache would serve rows another worker
+changed for up to CACHE_TTL, so unless CACHE_BACKEND is set, several
+workers use the shared cache when CACHE_URL is set and no cache otherwise.
+Every worker logs how long it took from fork to ready and its resident
+memory; ``benchmarks/bench_workers.py`` collects both across a fleet.
+"""
+import multiprocessing
+import os
+import time
+
+import config
+import metrics
+
+# Read before the master imports the app, so startup time includes the preload
+BOOTED_AT = time.monotonic()
+# Pid of the worker running the singleton jobs, shared with every fork
+LEADER = multiprocessing.Value("i", 0, lock=False)
+
+wsgi_app = "app:create_app(init=False)"
+bind = config.WEB_BIND
+workers = config.WEB_WORKERS
+threads = config.WEB_THREADS
+worker_class = "gthread"
+preload_app = config.WEB_PRELOAD
+timeout = config.WEB_TIMEOUT
+max_requests = config.WEB_MAX_REQUESTS
+max_requests_jitter = config.WEB_MAX_REQUESTS // 10
+
+if workers > 1 and "CACHE_BACKEND" not in os.environ:
+    config.CACHE_BACKEND = "shared" if config.CACHE_URL else "none"
+
+
+def cache_is_per_process() -> bool:
+    return config.CACHE_BACKEND != "none" and not (config.CACHE_BACKEND == "shared" and config.CACHE_URL)
+
+
+def on_starting(server):
+    if server.cfg.workers > 1 and cache_is_per_process():
+        backend = "CACHE_BACKEND=shared without CACHE_URL" if config.CACHE_BACKEND == "shared" else f"CACHE_BACKEND={config.CACHE_BACKEND}"
+        print(f"⚠️ {backend} is local to each of the {server.cfg.workers} workers, so lookups "
+              f"can be {config.CACHE_TTL:.0f}s stale. Set CACHE_BACKEND=shared with a CACHE_URL", flush=True)
+    if config.DEPLOY_STORED_FUNCTIONS:
+        from database import UserDB
+        from migrate_db import deploy_functions
+
+        db = UserDB()
+        try:
+            deploy_functions(db)
+        except Exception as e:
+            print(f"⚠️ Could not deploy stored functions: {str(e)}")
+        finally:
+            db.close()
+
+
+def when_ready(server):
+    preloaded = "preloaded" if server.cfg.preload_app else "loaded per worker"
+    print(f"🚀 Master {server.pid} ready in {time.monotonic() - BOOTED_AT:.2f}s, app {preloaded}, "
+          f"RSS {metrics.resident_memory_bytes() / 2 ** 20:.0f} MB, {server.cfg.workers} workers", flush=True)
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_leader() -> bool:
+    return LEADER.value == os.getpid()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+    if not LEADER.value or not alive(LEADER.value):
+        LEADER.value = worker.pid
+
+
+def post_worker_init(worker):
+    import app as web
+
+    mode = config.WEB_SINGLETON_JOBS
+    web.init_components(deploy=False, singletons=mode != "none", leader=is_leader if mode == "leader" else None)
+    role = ", leader" if mode == "leader" and is_leader() else ""
+    print(f"👷 Worker {worker.pid} ready in {time.monotonic() - worker.forked_at:.2f}s, "
+          f"RSS {metrics.resident_memory_bytes() / 2 ** 20:.0f} MB{role}", flush=True)
+
+
+def child_exit(server, worker):
+    # Runs in the master after the worker left server.WORKERS
+    if LEADER.value == worker.pid:
+        LEADER.value = next(iter(server.WORKERS), 0)
+
+
+def worker_exit(server, worker):
+    import app as web
+
+    if web.db is not None:
+        web.close_components()
@@ -0,0 +1,339 @@
+"""Versioned schema migrations and index usage checks.
+
+Usage:
+    python migrate_db.py up              # apply pending migrations and deploy stored functions
+    python migrate_db.py status          # list applied / pending migrations
+    python migrate_db.py functions       # deploy changed stored functions only
+    python migrate_db.py check-indexes   # EXPLAIN hot UserDB queries
+
+Stored functions live in ``psql_stored_procedure/<name>_v<N>.sql``, one
+function per file, named like its file. A file is re-run only when its
+checksum differs from the one recorded in ``stored_functions``, because
+CREATE OR REPLACE invalidates every session's cached plans. A change to
+a function's signature or result columns needs a new ``_v<N+1>`` file;
+old versions stay deployed so processes still running the previous
+release keep working.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+from collections import namedtuple
+from typing import Dict, List
+
+import psycopg2
+
+import database
+from database import UserDB
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+MIGRATION_LOCK_ID = 724_181_001
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "psql_stored_procedure")
+FUNCTION_FILE_RE = re.compile(r"^(\w+_v\d+)\.sql$")
+FUNCTIONS_LOCK_NAMESPACE = 724_181_015
+
+# Tables that must never be read with a sequential scan on a hot path
+INDEXED_TABLES = {"user_accounts", "gmail_credentials", "workflows"}
+
+# (UserDB method, SQL, sample parameters) for every hot lookup
+HOT_QUERIES = [
+    ("get_user_by_id", database.USER_BY_ID_SQL, (0,)),
+    ("get_user_credential", database.USER_CREDENTIAL_SQL, (0,)),
+    ("get_user_workflow", database.USER_WORKFLOW_SQL, (0,)),
+    ("get_user_dashboard_data", database.DASHBOARD_SQL, (0,)),
+    ("get_credential_by_email", database.CREDENTIAL_BY_EMAIL_SQL, ("check@example.com",)),
+    ("get_workflow_by_n8n_id", database.WORKFLOW_BY_N8N_ID_SQL, ("check",)),
+    ("get_all_workflows", database.ALL_WORKFLOWS_SQL, ()),
+    ("get_workflows_page", database.WORKFLOWS_FIRST_PAGE_SQL, (50,)),
+    ("get_workflows_page (next)", database.WORKFLOWS_NEXT_PAGE_SQL, ("2024-01-01", 0, 50)),
+]
+
+Migration = namedtuple("Migration", "version name path sql checksum transactional")
+StoredFunction = namedtuple("StoredFunction", "name path sql checksum")
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Load numbered migration files in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        migrations.append(
+            Migration(
+                version=int(match.group(1)),
+                name=match.group(2),
+                path=path,
+                sql=sql,
+                checksum=hashlib.sha256(sql.encode()).hexdigest(),
+                transactional=NO_TRANSACTION_MARKER not in sql,
+            )
+        )
+
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise Exception(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a migration into statements on lines ending with ';'"""
+    statements, current = [], []
+    for line in sql.splitlines():
+        if line.strip().startswith("--") and not current:
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statement = "\n".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+    tail = "\n".join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def ensure_migrations_table(conn) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        )
+    conn.commit()
+
+
+def applied_migrations(conn) -> Dict[int, str]:
+    """Map of applied version -> checksum"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version, checksum FROM schema_migrations ORDER BY version")
+        return dict(cursor.fetchall())
+
+
+def apply_migration(conn, migration: Migration) -> None:
+    if migration.transactional:
+        with conn.cursor() as cursor:
+            cursor.execute(migration.sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum),
+            )
+        conn.commit()
+        return
+
+    # CREATE INDEX CONCURRENTLY and friends cannot run inside a transaction
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for statement in split_statements(migration.sql):
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum),
+            )
+    finally:
+        conn.autocommit = False
+
+
+def migrate(db: UserDB, dry_run: bool = False) -> List[Migration]:
+    """Apply all pending migrations and return the ones applied"""
+    conn = psycopg2.connect(db.conn_string)
+    try:
+        ensure_migrations_table(conn)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        try:
+            applied = applied_migrations(conn)
+            pending = []
+            for migration in discover_migrations():
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        print(f"⚠️ Migration {migration.version:04d}_{migration.name} changed after being applied")
+                    continue
+                pending.append(migration)
+
+            for migration in pending:
+                print(f"🔄 Applying {migration.version:04d}_{migration.name}...")
+                if not dry_run:
+                    apply_migration(conn, migration)
+                print(f"✅ Applied {migration.version:04d}_{migration.name}")
+            return pending
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def discover_functions(directory: str = FUNCTIONS_DIR) -> List[StoredFunction]:
+    """Load versioned stored function files in name order"""
+    functions = []
+    for filename in sorted(os.listdir(directory)):
+        match = FUNCTION_FILE_RE.match(filename)
+        if not match:
+            continue
+        name = match.group(1)
+        path = os.path.join(directory, filename)
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        if not re.search(rf"CREATE OR REPLACE FUNCTION (public\.)?{name}\(", sql):
+            raise Exception(f"{filename} must define function {name}")
+        functions.append(StoredFunction(name, path, sql, hashlib.sha256(sql.encode()).hexdigest()))
+    return functions
+
+
+def deploy_functions(db: UserDB, dry_run: bool = False) -> List[StoredFunction]:
+    """Create or replace stored functions whose files changed and return them"""
+    with db.advisory_lock(FUNCTIONS_LOCK_NAMESPACE, 0):
+        with db._get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS stored_functions (
+                        name TEXT PRIMARY KEY,
+                        checksum TEXT NOT NULL,
+                        deployed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """
+                )
+                cursor.execute("SELECT name, checksum FROM stored_functions")
+                deployed = dict(cursor.fetchall())
+                changed = [f for f in discover_functions() if deployed.get(f.name) != f.checksum]
+                for function in changed:
+                    print(f"🔄 Deploying function {function.name}...")
+                    if dry_run:
+                        continue
+                    cursor.execute(function.sql)
+                    cursor.execute(
+                        """
+                        INSERT INTO stored_functions (name, checksum) VALUES (%s, %s)
+                        ON CONFLICT (name) DO UPDATE SET checksum = EXCLUDED.checksum, deployed_at = CURRENT_TIMESTAMP
+                    """,
+                        (function.name, function.checksum),
+                    )
+            conn.commit()
+    return changed
+
+
+def migration_status(db: UserDB) -> List[Dict]:
+    conn = psycopg2.connect(db.conn_string)
+    try:
+        ensure_migrations_table(conn)
+        applied = applied_migrations(conn)
+    finally:
+        conn.close()
+    return [
+        {
+            "version": m.version,
+            "name": m.name,
+            "applied": m.version in applied,
+            "modified": m.version in applied and applied[m.version] != m.checksum,
+        }
+        for m in discover_migrations()
+    ]
+
+
+def _plan_nodes(plan: Dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def explain_query(cursor, sql: str, params: tuple) -> Dict:
+    """Return the JSON plan of a query with sequential scans discouraged"""
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    if "$1" in sql:
+        cursor.execute(f"PREPARE index_check AS {sql}")
+        placeholders = ", ".join(["%s"] * len(params))
+        cursor.execute(f"EXPLAIN (FORMAT JSON) EXECUTE index_check ({placeholders})", params)
+        plan = cursor.fetchone()[0][0]["Plan"]
+        cursor.execute("DEALLOCATE index_check")
+        return plan
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    return cursor.fetchone()[0][0]["Plan"]
+
+
+def check_index_usage(db: UserDB) -> List[Dict]:
+    """EXPLAIN every hot UserDB query and report tables read by sequential scan.
+
+    ``enable_seqscan`` is switched off so the planner picks an index whenever
+    a usable one exists, even on small development tables; a remaining
+    ``Seq Scan`` therefore means the access path has no supporting index.
+    """
+    results = []
+    with db._get_connection() as conn:
+        with conn.cursor() as cursor:
+            for name, sql, params in HOT_QUERIES:
+                plan = explain_query(cursor, sql, params)
+                nodes = list(_plan_nodes(plan))
+                seq_scans = sorted(
+                    {
+                        node["Relation Name"]
+                        for node in nodes
+                        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in INDEXED_TABLES
+                    }
+                )
+                indexes = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+                results.append({"query": name, "ok": not seq_scans, "seq_scans": seq_scans, "indexes": indexes})
+        conn.rollback()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Database migrations")
+    parser.add_argument("command", nargs="?", default="up", choices=["up", "status", "functions", "check-indexes"])
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    args = parser.parse_args(argv)
+
+    db = UserDB()
+    try:
+        if args.command == "up":
+            applied = migrate(db, dry_run=args.dry_run)
+            deployed = deploy_functions(db, dry_run=args.dry_run)
+            if not applied and not deployed:
+                print("✅ Database is up to date")
+            return 0
+
+        if args.command == "functions":
+            if not deploy_functions(db, dry_run=args.dry_run):
+                print("✅ Stored functions are up to date")
+            return 0
+
+        if args.command == "status":
+            for row in migration_status(db):
+                state = "applied" if row["applied"] else "pending"
+                if row["modified"]:
+                    state += " (modified)"
+                print(f"{row['version']:04d}_{row['name']}: {state}")
+            return 0
+
+        # Hot lookups go through the stored functions
+        deploy_functions(db)
+        failed = False
+        for result in check_index_usage(db):
+            if result["ok"]:
+                print(f"✅ {result['query']}: {', '.join(result['indexes']) or 'no table scan'}")
+            else:
+                failed = True
+                print(f"❌ {result['query']}: sequential scan on {', '.join(result['seq_scans'])}")
+        return 1 if failed else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+-- migrate:no-transaction
+-- Indexes for the hot UserDB lookups. Built CONCURRENTLY so they can be
+-- applied to a live database without blocking writes.
+
+-- get_user_credential / dashboard: active credential for a user, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_gmail_credentials_user_active
+    ON gmail_credentials (user_id, updated_at DESC)
+    WHERE status = 'active';
+
+-- get_user_workflow / dashboard: active workflow for a user, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_user_active
+    ON workflows (user_id, updated_at DESC)
+    WHERE status = 'active';
+
+-- get_all_workflows: admin listing ordered by creation time
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_active_created
+    ON workflows (created_at DESC)
+    WHERE status = 'active';
+
+-- Joins and ON DELETE CASCADE from gmail_credentials
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_gmail_credential_id
+    ON workflows (gmail_credential_id);
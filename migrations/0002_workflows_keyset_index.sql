@@ -0,0 +1,9 @@
+-- migrate:no-transaction
+-- Keyset pagination over the admin listing orders by (created_at, id), so
+-- the id tie-breaker has to be part of the index.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_active_created_id
+    ON workflows (created_at DESC, id DESC)
+    WHERE status = 'active';
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_workflows_active_created;
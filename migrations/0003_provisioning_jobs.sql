@@ -0,0 +1,28 @@
+-- Job queue for background n8n provisioning. Workers claim rows with
+-- SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can run.
+
+CREATE TABLE IF NOT EXISTS provisioning_jobs (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    user_id INT NOT NULL,
+    gmail_credential_id INT NOT NULL,
+    workflow_id INT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user_accounts (id) ON DELETE CASCADE,
+    FOREIGN KEY (gmail_credential_id) REFERENCES gmail_credentials (id) ON DELETE CASCADE,
+    FOREIGN KEY (workflow_id) REFERENCES workflows (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_provisioning_jobs_queued
+    ON provisioning_jobs (run_after)
+    WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS idx_provisioning_jobs_running
+    ON provisioning_jobs (locked_at)
+    WHERE status = 'running';
@@ -0,0 +1,16 @@
+-- Shared pool mode: tenants are grouped into a fixed number of n8n
+-- workflows ("shards") instead of one polling workflow each.
+
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS shard_id INT;
+
+CREATE TABLE IF NOT EXISTS workflow_shards (
+    shard_id INT PRIMARY KEY,
+    n8n_workflow_id TEXT UNIQUE,
+    member_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_workflows_shard_active
+    ON workflows (shard_id, id)
+    WHERE status = 'active' AND shard_id IS NOT NULL;
@@ -0,0 +1,9 @@
+-- Gmail push ingestion: each credential's users.watch registration and the
+-- last mailbox historyId already forwarded to its webhook workflow.
+
+ALTER TABLE gmail_credentials ADD COLUMN IF NOT EXISTS gmail_history_id BIGINT;
+ALTER TABLE gmail_credentials ADD COLUMN IF NOT EXISTS watch_expires_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_gmail_credentials_watch_expires
+    ON gmail_credentials (watch_expires_at)
+    WHERE status = 'active';
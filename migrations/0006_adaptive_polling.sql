@@ -0,0 +1,10 @@
+-- Adaptive poll scheduling: each polling workflow's current interval tier
+-- and estimated mail rate, plus per-user quiet hours.
+
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS poll_interval_minutes INT NOT NULL DEFAULT 1;
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS message_rate DOUBLE PRECISION;
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS rate_updated_at TIMESTAMP;
+
+ALTER TABLE user_accounts ADD COLUMN IF NOT EXISTS quiet_hours_start SMALLINT;
+ALTER TABLE user_accounts ADD COLUMN IF NOT EXISTS quiet_hours_end SMALLINT;
+ALTER TABLE user_accounts ADD COLUMN IF NOT EXISTS timezone TEXT NOT NULL DEFAULT 'UTC';
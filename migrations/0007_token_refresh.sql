@@ -0,0 +1,14 @@
+-- Proactive OAuth refresh: real access token expiry per credential and the
+-- (jittered) time the refresh scheduler should renew it. Existing rows have
+-- unknown expiry, so they are spread over the next 30 minutes.
+
+ALTER TABLE gmail_credentials ADD COLUMN IF NOT EXISTS token_expires_at TIMESTAMP;
+ALTER TABLE gmail_credentials ADD COLUMN IF NOT EXISTS token_refresh_after TIMESTAMP;
+
+UPDATE gmail_credentials
+SET token_refresh_after = (NOW() AT TIME ZONE 'UTC') + random() * INTERVAL '30 minutes'
+WHERE token_refresh_after IS NULL AND status = 'active';
+
+CREATE INDEX IF NOT EXISTS idx_gmail_credentials_token_refresh
+    ON gmail_credentials (token_refresh_after)
+    WHERE status = 'active' AND token_refresh_after IS NOT NULL;
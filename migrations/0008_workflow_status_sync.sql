@@ -0,0 +1,8 @@
+-- Observed n8n state of each workflow, written by the status syncer only
+-- when the fingerprint (active flag, updatedAt, versionId) changes.
+-- workflow_status stays the state provisioning intended.
+
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS n8n_active BOOLEAN;
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS n8n_updated_at TIMESTAMP;
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS n8n_fingerprint TEXT;
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS n8n_synced_at TIMESTAMP;
@@ -0,0 +1,56 @@
+-- Execution history pulled from n8n. Raw rows are append-only and
+-- partitioned by month of started_at, so old months are dropped whole;
+-- the ingester creates each month's partition before writing to it.
+-- Hourly and daily per-tenant rollups are what dashboards read.
+
+CREATE TABLE IF NOT EXISTS workflow_executions (
+    n8n_execution_id BIGINT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    stopped_at TIMESTAMP,
+    workflow_id INT,                -- workflows.id; NULL for shard workflows
+    user_id INT,
+    shard_id INT,
+    n8n_workflow_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    mode TEXT,
+    duration_ms INT,
+    messages INT,                   -- items sent to Telegram, if ingested with execution data
+    PRIMARY KEY (n8n_execution_id, started_at)
+) PARTITION BY RANGE (started_at);
+
+CREATE INDEX IF NOT EXISTS idx_workflow_executions_workflow_started
+    ON workflow_executions (workflow_id, started_at);
+
+CREATE TABLE IF NOT EXISTS execution_rollups_hourly (
+    workflow_id INT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    user_id INT,
+    executions INT NOT NULL,
+    failed INT NOT NULL,
+    messages INT,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    max_duration_ms INT,
+    PRIMARY KEY (workflow_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS execution_rollups_daily (
+    workflow_id INT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    user_id INT,
+    executions INT NOT NULL,
+    failed INT NOT NULL,
+    messages INT,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    max_duration_ms INT,
+    PRIMARY KEY (workflow_id, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_execution_rollups_daily_bucket
+    ON execution_rollups_daily (bucket);
+
+-- Resume positions of incremental ingesters
+CREATE TABLE IF NOT EXISTS ingest_cursors (
+    name TEXT PRIMARY KEY,
+    position TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,28 @@
+-- At most one queued or running provisioning job per workflow. Enqueueing
+-- again reuses the open job: a queued one reads the latest rows when it
+-- runs, a running one is flagged to rerun once it finishes, so two workers
+-- never provision the same workflow at once.
+
+ALTER TABLE provisioning_jobs ADD COLUMN IF NOT EXISTS rerun BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Keep one open job per workflow (a running one if any, else the newest)
+WITH ranked AS (
+    SELECT id, status,
+           row_number() OVER (PARTITION BY workflow_id ORDER BY status = 'running' DESC, id DESC) AS n,
+           count(*) OVER (PARTITION BY workflow_id) AS open_jobs
+    FROM provisioning_jobs
+    WHERE status IN ('queued', 'running')
+), superseded AS (
+    UPDATE provisioning_jobs j
+    SET status = 'superseded', locked_at = NULL, updated_at = CURRENT_TIMESTAMP
+    FROM ranked r
+    WHERE j.id = r.id AND r.n > 1
+)
+UPDATE provisioning_jobs j
+SET rerun = TRUE
+FROM ranked r
+WHERE j.id = r.id AND r.n = 1 AND r.status = 'running' AND r.open_jobs > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_provisioning_jobs_open_workflow
+    ON provisioning_jobs (workflow_id)
+    WHERE status IN ('queued', 'running');
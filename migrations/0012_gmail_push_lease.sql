@@ -0,0 +1,4 @@
+-- Push forwarding lease: the request forwarding a mailbox's history holds
+-- it instead of a database connection while it calls Gmail and n8n.
+
+ALTER TABLE gmail_credentials ADD COLUMN IF NOT EXISTS push_lease_until TIMESTAMP;
@@ -0,0 +1,9 @@
+-- Named leases for work that calls n8n while it runs (shard rebuilds,
+-- background passes). A holder keeps a row here instead of a database
+-- connection; the row lapses at expires_at if the holder dies.
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
@@ -1,22 +1,121 @@
-import json
+import re
+import threading
+import time
 import requests
 import uuid
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import config
+from metrics import N8N_REQUEST_DURATION
+
+# Collapse ids in API paths so metric labels stay low-cardinality
+ENDPOINT_ID_RE = re.compile(r"/(workflows|credentials|executions|webhook)/[^/]+")
+
+
+class N8NRetry(Retry):
+    """Retry policy for the n8n API.
+
+    5xx responses are only retried for idempotent methods, but a 429 means
+    n8n rejected the request without processing it, so it is retried for
+    any method (honouring Retry-After).
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class WorkflowNameIndex:
+    """Thread-safe name -> workflow id map of the n8n workflow listing.
+
+    Entries are kept current by our own creates and deletes; the whole map
+    is considered stale after ``ttl`` seconds to pick up changes made
+    directly in n8n.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._ids = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def is_stale(self) -> bool:
+        with self._lock:
+            return self._synced_at is None or time.monotonic() - self._synced_at >= self.ttl
+
+    def get(self, name: str):
+        with self._lock:
+            return self._ids.get(name)
+
+    def set(self, name: str, workflow_id: str) -> None:
+        with self._lock:
+            self._ids[name] = workflow_id
+
+    def discard_id(self, workflow_id: str) -> None:
+        with self._lock:
+            self._ids = {name: wid for name, wid in self._ids.items() if wid != workflow_id}
+
+    def replace(self, mapping: dict) -> None:
+        with self._lock:
+            self._ids = dict(mapping)
+            self._synced_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._synced_at = None
 
 
 class N8NManager:
-    def __init__(self):
+    def __init__(self, pool_size: int = None):
         self.base_url = config.N8N_URL
         self.headers = {
             "Content-Type": "application/json",
             "X-N8N-API-KEY": config.N8N_API_KEY,
         }
+        self.timeout = (config.N8N_CONNECT_TIMEOUT, config.N8N_READ_TIMEOUT)
+        self.session = self._create_session(max(pool_size or 0, config.N8N_POOL_SIZE))
+        self.workflow_index = WorkflowNameIndex(config.N8N_WORKFLOW_INDEX_TTL)
+        self._index_sync_lock = threading.Lock()
 
-    def create_credential(
-        self, email: str, access_token: str, refresh_token: str
-    ) -> dict:
-        """Create Gmail credential in n8n following API documentation format"""
-        data = {
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """Create a keep-alive session with a connection pool and retries"""
+        retry = N8NRetry(
+            total=config.N8N_MAX_RETRIES,
+            connect=config.N8N_MAX_RETRIES,
+            read=0,
+            status=config.N8N_MAX_RETRIES,
+            backoff_factor=config.N8N_RETRY_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request to the n8n API over the pooled session"""
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = ENDPOINT_ID_RE.sub(r"/\1/{id}", path)
+        status = "error"
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            N8N_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, endpoint=endpoint, status=status)
+
+    def close(self) -> None:
+        """Close pooled HTTP connections"""
+        self.session.close()
+
+    def _credential_data(self, email: str, access_token: str, refresh_token: str, expiry_date: int = None) -> dict:
+        """gmailOAuth2 credential body; expiry_date is the access token expiry in epoch ms"""
+        return {
             "name": f"Gmail - {email}",
             "type": "gmailOAuth2",
             "data": {
@@ -29,33 +128,71 @@ class N8NManager:
                     "refresh_token": refresh_token,
                     "scope": "https://www.googleapis.com/auth/gmail.readonly https://www.googleapis.com/auth/gmail.send",
                     "token_type": "Bearer",
-                    "expiry_date": 1640995200000,
+                    # Unknown expiry: mark it expired so n8n refreshes before first use
+                    "expiry_date": expiry_date or 1640995200000,
                 },
             },
         }
 
-        print(f"Creating credential with data: {json.dumps(data, indent=2)}")
+    def create_credential(
+        self, email: str, access_token: str, refresh_token: str, expiry_date: int = None
+    ) -> dict:
+        """Create Gmail credential in n8n following API documentation format"""
+        data = self._credential_data(email, access_token, refresh_token, expiry_date)
+
+        print(f"Creating credential for {email}")
 
-        response = requests.post(
-            f"{self.base_url}/api/v1/credentials", json=data, headers=self.headers
-        )
+        response = self._request("POST", "/api/v1/credentials", json=data)
 
         print(f"Response status: {response.status_code}")
         print(f"Response text: {response.text}")
 
         return response.json()
 
-    def create_or_update_workflow(self, email: str, credential_id: str) -> dict:
-        """Create or update Gmail to Telegram workflow"""
+    def update_credential_tokens(
+        self, credential_id: str, email: str, access_token: str, refresh_token: str, expiry_date: int
+    ) -> bool:
+        """Replace the OAuth token data of an existing Gmail credential"""
+        data = self._credential_data(email, access_token, refresh_token, expiry_date)
+        response = self._request("PATCH", f"/api/v1/credentials/{credential_id}", json=data)
+        return response.status_code in [200, 201, 204]
 
-        workflow_name = f"gmail_telegram_{email.replace('@', '_').replace('.', '_')}"
+    @staticmethod
+    def workflow_name_for(email: str) -> str:
+        """n8n workflow name used for a tenant's Gmail address"""
+        return f"gmail_telegram_{email.replace('@', '_').replace('.', '_')}"
 
-        clean_workflow_data = {
-            "name": workflow_name,
+    @staticmethod
+    def build_poll_times(poll_minutes: int = 1, quiet_hours: tuple = None) -> dict:
+        """Gmail trigger ``pollTimes`` for an interval, skipping quiet hours (start, end) if given"""
+        if quiet_hours and quiet_hours[0] != quiet_hours[1]:
+            start, end = quiet_hours
+            active = [h for h in range(24) if not (start <= h < end if start < end else h >= start or h < end)]
+            ranges, first = [], active[0]
+            for previous, hour in zip(active, active[1:] + [None]):
+                if hour != previous + 1:
+                    ranges.append(str(first) if first == previous else f"{first}-{previous}")
+                    first = hour
+            minute = "*" if poll_minutes == 1 else "0" if poll_minutes >= 60 else f"*/{poll_minutes}"
+            return {"item": [{"mode": "custom", "cronExpression": f"{minute} {','.join(ranges)} * * *"}]}
+        if poll_minutes == 1:
+            return {"item": [{"mode": "everyMinute"}]}
+        if poll_minutes % 60 == 0:
+            return {"item": [{"mode": "everyX", "value": poll_minutes // 60, "unit": "hours"}]}
+        return {"item": [{"mode": "everyX", "value": poll_minutes, "unit": "minutes"}]}
+
+    def build_workflow_data(self, email: str, credential_id: str, poll_minutes: int = 1,
+                            quiet_hours: tuple = None, timezone: str = None) -> dict:
+        """Build the Gmail to Telegram workflow definition for a tenant"""
+        settings = {"executionOrder": "v1"}
+        if timezone:
+            settings["timezone"] = timezone
+        return {
+            "name": self.workflow_name_for(email),
             "nodes": [
                 {
                     "parameters": {
-                        "pollTimes": {"item": [{"mode": "everyMinute"}]},
+                        "pollTimes": self.build_poll_times(poll_minutes, quiet_hours),
                         "simple": False,
                         "filters": {"readStatus": "unread"},
                         "options": {},
@@ -86,68 +223,247 @@ class N8NManager:
                     "main": [[{"node": "Send Telegram", "type": "main", "index": 0}]]
                 }
             },
+            "settings": settings,
+        }
+
+    @staticmethod
+    def push_webhook_path(credential_id: str) -> str:
+        """Webhook path a tenant's push workflow listens on.
+
+        Keyed by the tenant's n8n credential id, which is random and never
+        shown to users, so the URL cannot be guessed from an email address.
+        """
+        return f"gmail-push-{credential_id}"
+
+    def build_push_workflow_data(self, email: str, credential_id: str) -> dict:
+        """Build the webhook to Telegram workflow used in push ingestion mode"""
+        return {
+            "name": self.workflow_name_for(email),
+            "nodes": [
+                {
+                    "parameters": {
+                        "httpMethod": "POST",
+                        "path": self.push_webhook_path(credential_id),
+                        "responseMode": "onReceived",
+                        "options": {},
+                    },
+                    "type": "n8n-nodes-base.webhook",
+                    "typeVersion": 2,
+                    "position": [0, 0],
+                    "id": str(uuid.uuid4()),
+                    "webhookId": str(uuid.uuid5(uuid.NAMESPACE_URL, self.push_webhook_path(credential_id))),
+                    "name": "Gmail Push",
+                },
+                {
+                    "parameters": {
+                        "chatId": config.TELEGRAM_CHAT_ID,
+                        "text": f"=📧 New email for {email}\n\n📋 Subject: {{{{ $json.body.subject }}}}\n👤 From: {{{{ $json.body.from }}}}\n📅 Date: {{{{ $json.body.date }}}}",
+                        "additionalFields": {"appendAttribution": False},
+                    },
+                    "type": "n8n-nodes-base.telegram",
+                    "typeVersion": 1.2,
+                    "position": [300, 0],
+                    "id": str(uuid.uuid4()),
+                    "name": "Send Telegram",
+                    "credentials": {"telegramApi": {"id": config.TELEGRAM_CRED_ID}},
+                },
+            ],
+            "connections": {
+                "Gmail Push": {
+                    "main": [[{"node": "Send Telegram", "type": "main", "index": 0}]]
+                }
+            },
             "settings": {"executionOrder": "v1"},
         }
 
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/v1/workflows", headers=self.headers
+    def trigger_webhook(self, path: str, payload: dict) -> bool:
+        """POST a payload to an active workflow's production webhook"""
+        response = self._request("POST", f"/webhook/{path}", json=payload)
+        return response.status_code in [200, 201, 204]
+
+    @staticmethod
+    def shard_workflow_name_for(shard_id: int) -> str:
+        """n8n workflow name of a shared-pool shard"""
+        return f"gmail_telegram_shard_{shard_id:04d}"
+
+    def build_shard_workflow_data(self, shard_id: int, members: list, poll_minutes: int = 1) -> dict:
+        """Build one workflow that polls every member mailbox of a shard on a single schedule
+
+        Each member gets a Gmail node (named after its address) reading unread
+        mail received since the previous tick; all of them feed one Telegram
+        node. A failing mailbox only drops its own branch.
+        """
+        trigger_name = "Schedule Trigger"
+        telegram_name = "Send Telegram"
+        nodes = [
+            {
+                "parameters": {"rule": {"interval": [{"field": "minutes", "minutesInterval": poll_minutes}]}},
+                "type": "n8n-nodes-base.scheduleTrigger",
+                "typeVersion": 1.2,
+                "position": [0, 0],
+                "id": str(uuid.uuid4()),
+                "name": trigger_name,
+            },
+            {
+                "parameters": {
+                    "chatId": config.TELEGRAM_CHAT_ID,
+                    "text": "=📧 New email for {{ $prevNode.name.slice(6) }}\n\n📋 Subject: {{ $json.subject }}\n👤 From: {{ $json.from.text }}\n📅 Date: {{ $json.date }}",
+                    "additionalFields": {"appendAttribution": False},
+                },
+                "type": "n8n-nodes-base.telegram",
+                "typeVersion": 1.2,
+                "position": [600, 0],
+                "id": str(uuid.uuid4()),
+                "name": telegram_name,
+                "credentials": {"telegramApi": {"id": config.TELEGRAM_CRED_ID}},
+            },
+        ]
+        connections = {trigger_name: {"main": [[]]}}
+
+        for index, member in enumerate(members):
+            node_name = f"Gmail {member['gmail_email']}"
+            nodes.append(
+                {
+                    "parameters": {
+                        "operation": "getAll",
+                        "returnAll": True,
+                        "simple": False,
+                        "filters": {
+                            "readStatus": "unread",
+                            "receivedAfter": f"={{{{ $now.minus({{minutes: {poll_minutes}}}).toISO() }}}}",
+                        },
+                        "options": {},
+                    },
+                    "type": "n8n-nodes-base.gmail",
+                    "typeVersion": 2.1,
+                    "position": [300, index * 120],
+                    "id": str(uuid.uuid4()),
+                    "name": node_name,
+                    "onError": "continueErrorOutput",
+                    "credentials": {"gmailOAuth2": {"id": member["n8n_gmail_credential"]}},
+                }
             )
-            if response.status_code == 200:
-                workflows_data = response.json()
-
-                # Handle both response formats
-                if isinstance(workflows_data, dict) and "data" in workflows_data:
-                    workflows = workflows_data["data"]
-                else:
-                    workflows = workflows_data
-
-                existing_workflow = None
-                for workflow in workflows:
-                    if workflow["name"] == workflow_name:
-                        existing_workflow = workflow
-                        break
-
-                if existing_workflow:
-                    print(f"Updating existing workflow: {workflow_name}")
-                    response = requests.put(
-                        f"{self.base_url}/api/v1/workflows/{existing_workflow['id']}",
-                        json=clean_workflow_data,
-                        headers=self.headers,
-                    )
-                else:
-                    print(f"Creating new workflow: {workflow_name}")
-                    response = requests.post(
-                        f"{self.base_url}/api/v1/workflows",
-                        json=clean_workflow_data,
-                        headers=self.headers,
-                    )
-
-                if response.status_code in [200, 201]:
-                    result = response.json()
-                    print(f"✅ Success! Workflow ID: {result['id']}")
-
-                    # Activate the workflow
-                    self._activate_workflow(result["id"])
-
-                    return result
-                else:
-                    raise Exception(
-                        f"Workflow creation failed: {response.status_code} - {response.text}"
-                    )
-
-            else:
-                raise Exception(f"Cannot connect to n8n: {response.status_code}")
+            connections[trigger_name]["main"][0].append({"node": node_name, "type": "main", "index": 0})
+            connections[node_name] = {"main": [[{"node": telegram_name, "type": "main", "index": 0}]]}
+
+        return {
+            "name": self.shard_workflow_name_for(shard_id),
+            "nodes": nodes,
+            "connections": connections,
+            "settings": {"executionOrder": "v1"},
+        }
+
+    def create_or_update_workflow(self, email: str, credential_id: str, workflow_id: str = None,
+                                  poll_minutes: int = 1, quiet_hours: tuple = None, timezone: str = None) -> dict:
+        """Create or update Gmail to Telegram workflow
 
+        ``workflow_id`` is the n8n id already recorded in our database, if
+        any; without it the id is resolved through the cached name index.
+        ``poll_minutes``, ``quiet_hours`` and ``timezone`` set the polling
+        schedule and are ignored in push ingestion mode.
+        """
+        if config.INGESTION_MODE == "push":
+            workflow_data = self.build_push_workflow_data(email, credential_id)
+        else:
+            workflow_data = self.build_workflow_data(email, credential_id, poll_minutes, quiet_hours, timezone)
+        try:
+            return self.upsert_workflow(workflow_data, workflow_id)
         except Exception as e:
             raise Exception(f"Workflow operation failed: {str(e)}")
 
-    def _activate_workflow(self, workflow_id: str) -> bool:
+    def upsert_workflow(self, workflow_data: dict, workflow_id: str = None) -> dict:
+        """Create or replace a workflow by name and activate it"""
+        workflow_name = workflow_data["name"]
+        existing_id = workflow_id or self.find_workflow_id(workflow_name)
+
+        response = None
+        if existing_id:
+            print(f"Updating existing workflow: {workflow_name}")
+            response = self._request(
+                "PUT", f"/api/v1/workflows/{existing_id}", json=workflow_data
+            )
+            if response.status_code == 404:
+                # Deleted in n8n behind our back; fall through to create
+                self.workflow_index.discard_id(existing_id)
+                response = None
+
+        if response is None:
+            print(f"Creating new workflow: {workflow_name}")
+            response = self._request("POST", "/api/v1/workflows", json=workflow_data)
+
+        if response.status_code not in [200, 201]:
+            raise Exception(
+                f"Workflow creation failed: {response.status_code} - {response.text}"
+            )
+
+        result = response.json()
+        self.workflow_index.set(workflow_name, result["id"])
+        print(f"✅ Success! Workflow ID: {result['id']}")
+
+        # Activate the workflow
+        result["active"] = self.activate_workflow(result["id"])
+
+        return result
+
+    def find_workflow_id(self, workflow_name: str):
+        """Look up a workflow id by name, refreshing the index when stale"""
+        if self.workflow_index.is_stale():
+            self.sync_workflow_index()
+        return self.workflow_index.get(workflow_name)
+
+    def sync_workflow_index(self) -> None:
+        """Rebuild the name index from a full, paginated workflow listing"""
+        with self._index_sync_lock:
+            if not self.workflow_index.is_stale():
+                return
+            mapping = {
+                workflow["name"]: workflow["id"]
+                for workflow in self._iter_paginated("/api/v1/workflows")
+            }
+            self.workflow_index.replace(mapping)
+
+    def _iter_paginated(self, path: str, params: dict = None):
+        """Yield every item of a cursor-paginated n8n listing"""
+        params = dict(params or {})
+        params.setdefault("limit", config.N8N_PAGE_SIZE)
+        while True:
+            response = self._request("GET", path, params=params)
+            if response.status_code != 200:
+                raise Exception(f"Cannot connect to n8n: {response.status_code}")
+            page = response.json()
+
+            # Handle both response formats
+            if not isinstance(page, dict) or "data" not in page:
+                yield from page
+                return
+            yield from page["data"]
+
+            if not page.get("nextCursor"):
+                return
+            params["cursor"] = page["nextCursor"]
+
+    def iter_workflows(self):
+        """Yield every workflow, following pagination; raises if n8n cannot be listed"""
+        yield from self._iter_paginated("/api/v1/workflows")
+
+    def iter_credentials(self):
+        """Yield every credential, following pagination; raises if n8n cannot be listed"""
+        yield from self._iter_paginated("/api/v1/credentials")
+
+    def iter_executions(self, status: str = None, workflow_id: str = None, include_data: bool = False):
+        """Yield executions newest first, following pagination"""
+        params = {"includeData": "true"} if include_data else {}
+        if status:
+            params["status"] = status
+        if workflow_id:
+            params["workflowId"] = workflow_id
+        yield from self._iter_paginated("/api/v1/executions", params)
+
+    def activate_workflow(self, workflow_id: str) -> bool:
         """Activate workflow"""
         try:
-            response = requests.post(
-                f"{self.base_url}/api/v1/workflows/{workflow_id}/activate",
-                headers=self.headers,
+            response = self._request(
+                "POST", f"/api/v1/workflows/{workflow_id}/activate"
             )
             return response.status_code in [200, 201]
         except:
@@ -156,48 +472,32 @@ class N8NManager:
     def delete_workflow(self, workflow_id: str) -> bool:
         """Delete workflow from n8n"""
         try:
-            response = requests.delete(
-                f"{self.base_url}/api/v1/workflows/{workflow_id}", headers=self.headers
-            )
-            return response.status_code in [200, 204]
+            response = self._request("DELETE", f"/api/v1/workflows/{workflow_id}")
+            deleted = response.status_code in [200, 204]
+            if deleted:
+                self.workflow_index.discard_id(workflow_id)
+            return deleted
         except:
             return False
 
     def delete_credential(self, credential_id: str) -> bool:
         """Delete credential from n8n"""
         try:
-            response = requests.delete(
-                f"{self.base_url}/api/v1/credentials/{credential_id}",
-                headers=self.headers,
-            )
+            response = self._request("DELETE", f"/api/v1/credentials/{credential_id}")
             return response.status_code in [200, 204]
         except:
             return False
 
     def get_workflows(self) -> list:
-        """Get all workflows"""
+        """Get all workflows, following pagination"""
         try:
-            response = requests.get(
-                f"{self.base_url}/api/v1/workflows", headers=self.headers
-            )
-            if response.status_code == 200:
-                workflows_data = response.json()
-                if isinstance(workflows_data, dict) and "data" in workflows_data:
-                    return workflows_data["data"]
-                else:
-                    return workflows_data
-            return []
+            return list(self.iter_workflows())
         except:
             return []
 
     def get_credentials(self) -> list:
-        """Get all credentials for debugging"""
+        """Get all credentials, following pagination"""
         try:
-            response = requests.get(
-                f"{self.base_url}/api/v1/credentials", headers=self.headers
-            )
-            if response.status_code == 200:
-                return response.json()
-            return []
+            return list(self.iter_credentials())
         except:
             return []
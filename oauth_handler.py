@@ -1,6 +1,12 @@
+import time
 import requests
 from urllib.parse import urlencode
 import config
+from metrics import GOOGLE_REQUEST_DURATION
+
+
+class TokenRevoked(Exception):
+    """Google rejected a refresh token (revoked access or expired grant)"""
 
 
 class GoogleOAuth:
@@ -9,6 +15,17 @@ class GoogleOAuth:
         self.client_secret = config.GOOGLE_CLIENT_SECRET
         self.redirect_uri = config.REDIRECT_URI
 
+    def _timed(self, call: str, send, *args, **kwargs) -> requests.Response:
+        """Send a request to Google and record its latency"""
+        status = "error"
+        start = time.perf_counter()
+        try:
+            response = send(*args, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            GOOGLE_REQUEST_DURATION.observe(time.perf_counter() - start, call=call, status=status)
+
     def get_auth_url(self) -> str:
         """Get Google OAuth authorization URL"""
         params = {
@@ -19,7 +36,7 @@ class GoogleOAuth:
             "access_type": "offline",
             "prompt": "consent",
         }
-        return f"https://accounts.google.com/o/oauth2/auth?{urlencode(params)}"
+        return f"{config.GOOGLE_AUTH_URL}?{urlencode(params)}"
 
     def exchange_code(self, code: str) -> dict:
         """Exchange authorization code for tokens"""
@@ -30,17 +47,34 @@ class GoogleOAuth:
             "grant_type": "authorization_code",
             "redirect_uri": self.redirect_uri,
         }
-        response = requests.post("https://oauth2.googleapis.com/token", data=data)
+        response = self._timed("exchange_code", requests.post, config.GOOGLE_TOKEN_URL, data=data)
         if response.status_code != 200:
             raise Exception(f"Token exchange failed: {response.text}")
         return response.json()
 
     def get_user_email(self, access_token: str) -> str:
         """Get user email from access token"""
-        response = requests.get(
-            "https://www.googleapis.com/oauth2/v1/userinfo",
+        response = self._timed(
+            "userinfo",
+            requests.get,
+            config.GOOGLE_USERINFO_URL,
             headers={"Authorization": f"Bearer {access_token}"},
         )
         if response.status_code != 200:
             raise Exception(f"Failed to get user info: {response.text}")
         return response.json().get("email")
+
+    def refresh_access_token(self, refresh_token: str) -> dict:
+        """Get a new access token for a stored refresh token"""
+        data = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "refresh_token": refresh_token,
+            "grant_type": "refresh_token",
+        }
+        response = self._timed("refresh_token", requests.post, config.GOOGLE_TOKEN_URL, data=data)
+        if response.status_code == 400 and "invalid_grant" in response.text:
+            raise TokenRevoked(response.text)
+        if response.status_code != 200:
+            raise Exception(f"Token refresh failed: {response.text}")
+        return response.json()
@@ -0,0 +1,174 @@
+"""Password hashing with a tunable KDF.
+
+Hashes are self-describing strings, so cost parameters can change without
+invalidating existing accounts:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+Legacy accounts hold an unsalted SHA-256 hex digest; ``verify`` accepts
+those and asks the caller to store a proper hash (as it does for hashes
+made with outdated parameters).
+
+Key derivation runs in a process pool (``PASSWORD_HASH_WORKERS``) so a burst
+of logins cannot hold up every request thread, and successful verifications
+are remembered briefly so repeated logins skip the KDF.
+"""
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import config
+from cache import MISSING, LRUCache
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def derive_key(algorithm: str, password: str, salt: bytes, params: Tuple[int, ...]) -> bytes:
+    """Run the KDF; module-level so it can execute in a worker process"""
+    if algorithm == "scrypt":
+        n, r, p = params
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 1024 * 1024, dklen=KEY_BYTES
+        )
+    if algorithm == "pbkdf2_sha256":
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=KEY_BYTES)
+    raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+
+
+def parse_hash(stored: str) -> Optional[Tuple[str, Tuple[int, ...], bytes, bytes]]:
+    """Split a stored hash into (algorithm, params, salt, key); None for legacy or unknown formats"""
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            return "scrypt", tuple(int(x) for x in parts[1:4]), _b64decode(parts[4]), _b64decode(parts[5])
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            return "pbkdf2_sha256", (int(parts[1]),), _b64decode(parts[2]), _b64decode(parts[3])
+    except ValueError:
+        return None
+    return None
+
+
+def is_legacy_hash(stored: str) -> bool:
+    """Unsalted SHA-256 hex digest from before KDF hashing"""
+    return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+
+class PasswordHasher:
+    def __init__(self, algorithm: str = "scrypt", scrypt_n: int = 2 ** 14, scrypt_r: int = 8, scrypt_p: int = 1,
+                 pbkdf2_iterations: int = 600_000, workers: int = 0, cache_size: int = 0, cache_ttl: float = 300):
+        self.algorithm = algorithm
+        if algorithm == "scrypt":
+            self.params = (scrypt_n, scrypt_r, scrypt_p)
+        elif algorithm == "pbkdf2_sha256":
+            self.params = (pbkdf2_iterations,)
+        else:
+            raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Keys are HMACs under a per-process secret, so entries are useless
+        # outside this process and never hold anything derived from the
+        # password alone
+        self._cache = LRUCache(maxsize=cache_size, ttl=cache_ttl) if cache_size > 0 else None
+        self._cache_secret = os.urandom(32)
+        # Verified against when the user does not exist, so unknown
+        # usernames take as long as wrong passwords
+        self._dummy_hash = None
+
+    @classmethod
+    def from_config(cls) -> "PasswordHasher":
+        return cls(
+            algorithm=config.PASSWORD_HASH_ALGORITHM,
+            scrypt_n=config.PASSWORD_SCRYPT_N,
+            scrypt_r=config.PASSWORD_SCRYPT_R,
+            scrypt_p=config.PASSWORD_SCRYPT_P,
+            pbkdf2_iterations=config.PASSWORD_PBKDF2_ITERATIONS,
+            workers=config.PASSWORD_HASH_WORKERS,
+            cache_size=config.PASSWORD_VERIFY_CACHE_SIZE,
+            cache_ttl=config.PASSWORD_VERIFY_CACHE_TTL,
+        )
+
+    def _derive(self, algorithm: str, password: str, salt: bytes, params: Tuple[int, ...]) -> bytes:
+        if self.workers <= 0:
+            return derive_key(algorithm, password, salt, params)
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: forking a threaded web process is unsafe. Spawned
+                # children re-import the entry module as __mp_main__, so entry
+                # modules must not open pools or start threads at import
+                # (app.py builds them in create_app, asgi.py in its lifespan)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = self._executor
+        return executor.submit(derive_key, algorithm, password, salt, params).result()
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured algorithm and cost"""
+        salt = os.urandom(SALT_BYTES)
+        key = self._derive(self.algorithm, password, salt, self.params)
+        params = "$".join(str(x) for x in self.params)
+        return f"{self.algorithm}${params}${_b64encode(salt)}${_b64encode(key)}"
+
+    def needs_rehash(self, stored: str) -> bool:
+        parsed = parse_hash(stored)
+        return parsed is None or parsed[0] != self.algorithm or parsed[1] != self.params
+
+    def _cache_key(self, password: str, stored: str) -> str:
+        return hmac.new(self._cache_secret, f"{stored}\0{password}".encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check a password against a stored hash.
+
+        Returns ``(ok, new_hash)``; ``new_hash`` is set when the password was
+        right but the stored hash is legacy or uses outdated parameters.
+        """
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash(os.urandom(16).hex())
+            self.verify(password, self._dummy_hash)
+            return False, None
+
+        cache_key = self._cache_key(password, stored) if self._cache else None
+        if cache_key and self._cache.get(cache_key) is not MISSING:
+            return True, None
+
+        if is_legacy_hash(stored):
+            ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        else:
+            parsed = parse_hash(stored)
+            if parsed is None:
+                return False, None
+            algorithm, params, salt, key = parsed
+            ok = hmac.compare_digest(self._derive(algorithm, password, salt, params), key)
+
+        if not ok:
+            return False, None
+        if self.needs_rehash(stored):
+            return True, self.hash(password)
+        if cache_key:
+            self._cache.set(cache_key, True)
+        return True, None
+
+    def close(self) -> None:
+        """Shut down the worker processes"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,215 @@
+"""Adaptive per-tenant poll scheduling.
+
+Every polling workflow starts at a one minute interval. The scheduler
+periodically counts each workflow's successful n8n executions since its
+previous pass, at most ``POLL_RATE_WINDOW_MINUTES`` back (a Gmail trigger
+only starts an execution when a poll finds new mail), estimates the
+tenant's mails per hour and moves the workflow between the ``POLL_TIERS`` intervals. Moving to a faster tier
+happens as soon as the rate crosses its threshold; moving to a slower one
+needs the rate to fall below ``POLL_HYSTERESIS`` times the threshold, so a
+tenant near a boundary does not flap. Users' quiet hours are written into
+the trigger as a cron schedule so nothing polls while they sleep.
+
+Run alongside the web app:
+    python poll_scheduler.py                  # loop every POLL_SCHEDULER_INTERVAL seconds
+    python poll_scheduler.py --once --dry-run
+"""
+import argparse
+import math
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import config
+from database import UserDB
+from n8n_manager import N8NManager
+
+
+def quiet_hours_of(row: Dict) -> Optional[tuple]:
+    """(start, end) quiet hours of a user or tenant row, or None"""
+    start, end = row.get("quiet_hours_start"), row.get("quiet_hours_end")
+    if start is None or end is None or start == end:
+        return None
+    return start, end
+
+
+def schedule_for(row: Dict, poll_minutes: int = None) -> Dict:
+    """Polling keyword arguments for N8NManager.create_or_update_workflow"""
+    return {
+        "poll_minutes": poll_minutes or row.get("poll_interval_minutes") or 1,
+        "quiet_hours": quiet_hours_of(row),
+        "timezone": row.get("timezone") if quiet_hours_of(row) else None,
+    }
+
+
+def choose_tier(current: int, rate: float, tiers=None, thresholds=None, hysteresis: float = None) -> int:
+    """Poll interval tier for a mail rate (per hour), with hysteresis against slowing down"""
+    tiers = tiers or config.POLL_TIERS
+    thresholds = thresholds or config.POLL_TIER_THRESHOLDS
+    hysteresis = config.POLL_HYSTERESIS if hysteresis is None else hysteresis
+
+    def tier_index(factor):
+        for i, threshold in enumerate(thresholds):
+            if rate >= threshold * factor:
+                return i
+        return len(tiers) - 1
+
+    current_index = tiers.index(current) if current in tiers else 0
+    faster, slower = tier_index(1.0), tier_index(hysteresis)
+    if faster < current_index:
+        return tiers[faster]
+    if slower > current_index:
+        return tiers[slower]
+    return tiers[current_index]
+
+
+def active_minutes(start: datetime, end: datetime, quiet_hours: Optional[tuple], timezone: str = None) -> int:
+    """Minutes between two UTC times that fall outside the quiet hours"""
+    total = int((end - start).total_seconds() // 60)
+    if not quiet_hours:
+        return total
+    try:
+        zone = ZoneInfo(timezone or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        zone = ZoneInfo("UTC")
+    quiet_start, quiet_end = quiet_hours
+    count = 0
+    for minute in range(total):
+        hour = (start + timedelta(minutes=minute)).replace(tzinfo=ZoneInfo("UTC")).astimezone(zone).hour
+        quiet = quiet_start <= hour < quiet_end if quiet_start < quiet_end else hour >= quiet_start or hour < quiet_end
+        count += not quiet
+    return count
+
+
+def estimate_rate(hits: int, poll_minutes: int, minutes: int) -> Optional[float]:
+    """Mails per hour implied by the share of polls that found mail.
+
+    Counting executions undercounts busy mailboxes, since one poll picks up
+    every mail since the last one. Treating arrivals as Poisson, a poll
+    finds mail with probability 1 - exp(-rate * interval), which is
+    inverted here.
+    """
+    polls = minutes / poll_minutes
+    if polls < 1:
+        return None
+    hit_ratio = min(hits / polls, 0.95)
+    return -math.log(1 - hit_ratio) / poll_minutes * 60
+
+
+class PollScheduler:
+    def __init__(self, db: UserDB, n8n: N8NManager, dry_run: bool = False):
+        self.db = db
+        self.n8n = n8n
+        self.dry_run = dry_run
+
+    def list_execution_starts(self, since: datetime) -> Dict[str, List[datetime]]:
+        """Start times (UTC) of successful executions after since, per n8n workflow id"""
+        starts = {}
+        for execution in self.n8n.iter_executions(status="success"):
+            started_at = datetime.fromisoformat(execution["startedAt"].replace("Z", "+00:00")).replace(tzinfo=None)
+            if started_at < since:
+                break
+            starts.setdefault(str(execution["workflowId"]), []).append(started_at)
+        return starts
+
+    def reschedule(self, tenant: Dict, starts: Dict[str, List[datetime]], since: datetime, now: datetime) -> bool:
+        """Update one tenant's rate estimate and tier; returns True if the workflow was rewritten"""
+        poll_minutes = tenant["poll_interval_minutes"]
+        if tenant["rate_updated_at"] is None:
+            # First sighting: start the measurement clock
+            if not self.dry_run:
+                self.db.update_workflow_poll_schedule(tenant["workflow_id"], poll_minutes, None, now)
+            return False
+
+        # Measure from the previous pass, when the current tier was last confirmed
+        window_start = max(since, tenant["rate_updated_at"])
+        hits = sum(1 for started_at in starts.get(tenant["n8n_workflow_id"], []) if started_at >= window_start)
+        minutes = active_minutes(window_start, now, quiet_hours_of(tenant), tenant["timezone"])
+        sample = estimate_rate(hits, poll_minutes, minutes)
+        if sample is None:
+            return False
+
+        previous = tenant["message_rate"]
+        alpha = config.POLL_RATE_SMOOTHING
+        rate = sample if previous is None else alpha * sample + (1 - alpha) * previous
+        tier = choose_tier(poll_minutes, rate)
+        if self.dry_run:
+            if tier != poll_minutes:
+                print(f"🔎 {tenant['gmail_email']}: {rate:.2f} mails/h, {poll_minutes} -> {tier} min")
+            return tier != poll_minutes
+
+        if tier != poll_minutes:
+            workflow = self.n8n.create_or_update_workflow(
+                tenant["gmail_email"], tenant["n8n_gmail_credential"], tenant["n8n_workflow_id"],
+                **schedule_for(tenant, tier)
+            )
+            if workflow["id"] != tenant["n8n_workflow_id"]:
+                self.db.update_workflow_n8n_id(tenant["workflow_id"], workflow["id"])
+            print(f"✅ {tenant['gmail_email']}: {rate:.2f} mails/h, polling every {tier} min")
+        self.db.update_workflow_poll_schedule(tenant["workflow_id"], tier, rate, now)
+        return tier != poll_minutes
+
+    def run_once(self) -> Dict:
+        """Re-estimate every polling tenant and rewrite workflows whose tier changed"""
+        if config.INGESTION_MODE == "push" or config.WORKFLOW_MODE == "shared":
+            return {"checked": 0, "changed": 0, "failed": 0}
+
+        now = datetime.utcnow()
+        since = now - timedelta(minutes=config.POLL_RATE_WINDOW_MINUTES)
+        starts = self.list_execution_starts(since)
+        checked, changed, failed, after_id = 0, 0, 0, 0
+        while True:
+            tenants = self.db.get_provisioned_tenants(after_id)
+            if not tenants:
+                break
+            for tenant in tenants:
+                if tenant["shard_id"] is not None or not tenant["n8n_workflow_id"]:
+                    continue
+                checked += 1
+                try:
+                    changed += self.reschedule(tenant, starts, since, now)
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ Rescheduling {tenant['gmail_email']} failed: {str(e)}")
+            after_id = tenants[-1]["workflow_id"]
+        return {"checked": checked, "changed": changed, "failed": failed}
+
+    def run_forever(self, interval: float = None) -> None:
+        interval = config.POLL_SCHEDULER_INTERVAL if interval is None else interval
+        while True:
+            started = time.monotonic()
+            try:
+                report = self.run_once()
+                print(f"🔄 Poll schedule: {report['checked']} checked, {report['changed']} changed, {report['failed']} failed")
+            except Exception as e:
+                print(f"❌ Poll scheduler error: {str(e)}")
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Adapt each tenant's Gmail poll interval to its mail rate")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--interval", type=float, help="Seconds between passes")
+    parser.add_argument("--dry-run", action="store_true", help="Report tier changes without applying them")
+    args = parser.parse_args(argv)
+
+    db = UserDB()
+    n8n = N8NManager()
+    scheduler = PollScheduler(db, n8n, dry_run=args.dry_run)
+    try:
+        if not args.once:
+            scheduler.run_forever(args.interval)
+        report = scheduler.run_once()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        n8n.close()
+        db.close()
+    print(f"✅ {report['checked']} tenants checked, {report['changed']} changed, {report['failed']} failed")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Background provisioning of n8n credentials and workflows.
+
+The OAuth callback only stores the Gmail credential, a ``pending`` workflow
+row and a ``provisioning_jobs`` row. Workers claim jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED``, create the n8n credential and
+workflow, activate it and mark the workflow ``active``; failed attempts are
+retried with exponential backoff before the workflow is marked ``failed``.
+A workflow has at most one open job: enqueueing it again reuses that job.
+With ``WORKFLOW_MODE=shared`` the tenant joins its shard workflow instead
+(see ``shard_pool.py``); with ``INGESTION_MODE=push`` the Gmail watch is
+registered once the webhook workflow is active (see ``gmail_push.py``).
+
+Workers run inside the web process (``PROVISIONING_WORKERS``) or standalone:
+    python provisioning.py --workers 4
+"""
+import argparse
+import threading
+import time
+
+import config
+from database import UserDB
+from gmail_push import GmailPushService
+from n8n_manager import N8NManager
+from oauth_handler import GoogleOAuth
+from poll_scheduler import schedule_for
+from shard_pool import ShardedWorkflowPool
+from token_refresh import epoch_ms
+
+
+class ProvisioningWorkerPool:
+    def __init__(self, db: UserDB, n8n: N8NManager, workers: int = None, poll_interval: float = None,
+                 push: GmailPushService = None):
+        self.db = db
+        self.n8n = n8n
+        self.workers = config.PROVISIONING_WORKERS if workers is None else workers
+        self.poll_interval = config.PROVISIONING_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.shards = ShardedWorkflowPool(db, n8n)
+        self.push = push or GmailPushService(db, n8n, GoogleOAuth())
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def start(self) -> None:
+        """Start the worker threads"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"provisioning-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        """Ask workers to exit after their current job and wait for them"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self) -> None:
+        """Signal that a job was just queued, skipping the poll delay"""
+        self._wakeup.set()
+
+    def enqueue(self, user_id: int, gmail_credential_id: int, workflow_id: int) -> int:
+        """Queue provisioning for a workflow row and wake a worker"""
+        job_id = self.db.enqueue_provisioning_job(
+            user_id, gmail_credential_id, workflow_id, max_attempts=config.PROVISIONING_MAX_ATTEMPTS
+        )
+        self.wake()
+        return job_id
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                worked = self.run_once()
+            except Exception as e:
+                print(f"❌ Provisioning worker error: {str(e)}")
+                worked = False
+            if not worked:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self) -> bool:
+        """Claim and process one job. Returns False if the queue was empty"""
+        job = self.db.claim_provisioning_job(config.PROVISIONING_LEASE_SECONDS)
+        if not job:
+            self._fail_abandoned()
+            return False
+
+        try:
+            self.provision(job)
+        except Exception as e:
+            delay = config.PROVISIONING_RETRY_BACKOFF * (2 ** (job["attempts"] - 1))
+            status = self.db.fail_provisioning_job(job["id"], str(e), delay)
+            if status == "failed":
+                self.db.update_workflow_status(job["workflow_id"], "failed")
+                print(f"❌ Provisioning job {job['id']} failed permanently: {str(e)}")
+            elif status == "queued":
+                print(f"⚠️ Provisioning job {job['id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {str(e)}")
+            return True
+
+        if self.db.complete_provisioning_job(job["id"]) == "queued":
+            print(f"🔁 Provisioning job {job['id']} changed while running, queued again")
+        return True
+
+    def _fail_abandoned(self) -> None:
+        """Fail jobs whose worker died during their last attempt instead of reclaiming them forever"""
+        for job in self.db.fail_abandoned_provisioning_jobs(config.PROVISIONING_LEASE_SECONDS):
+            self.db.update_workflow_status(job["workflow_id"], "failed")
+            print(f"❌ Provisioning job {job['id']} failed permanently: worker lost its lease on the last attempt")
+
+    def provision(self, job: dict) -> None:
+        """Create the n8n credential and workflow for one job; safe to re-run"""
+        credential = self.db.get_credential_by_id(job["gmail_credential_id"])
+        workflow_row = self.db.get_workflow_by_id(job["workflow_id"])
+        if not credential or not workflow_row:
+            print(f"⚠️ Provisioning job {job['id']}: credential or workflow was deleted, skipping")
+            return
+
+        email = credential["gmail_email"]
+        n8n_credential_id = credential["n8n_gmail_credential"]
+        if not n8n_credential_id:
+            print(f"🔄 Creating n8n credential for {email}...")
+            expires_at = credential["token_expires_at"]
+            n8n_credential = self.n8n.create_credential(
+                email, credential["access_token"], credential["refresh_token"],
+                epoch_ms(expires_at) if expires_at else None,
+            )
+            if "id" not in n8n_credential:
+                raise Exception(f"n8n credential creation failed: {n8n_credential}")
+            n8n_credential_id = n8n_credential["id"]
+            self.db.update_credential_n8n_id(credential["id"], n8n_credential_id)
+            print(f"✅ Created n8n credential: {n8n_credential_id}")
+
+        # Push mode needs a webhook per tenant, so shards only apply to polling
+        if config.WORKFLOW_MODE == "shared" and config.INGESTION_MODE != "push":
+            shard = self.shards.add_member(workflow_row["id"], email)
+            if not shard["active"]:
+                raise Exception(f"Shard {shard['shard_id']} was saved but could not be activated")
+            print(f"✅ Added {email} to shard {shard['shard_id']}")
+            return
+
+        print(f"🔄 Creating n8n workflow for {email}...")
+        user = self.db.get_user_by_id(job["user_id"]) or {}
+        workflow = self.n8n.create_or_update_workflow(
+            email, n8n_credential_id, workflow_row["n8n_workflow_id"], **schedule_for({**user, **workflow_row})
+        )
+        if workflow["id"] != workflow_row["n8n_workflow_id"]:
+            self.db.update_workflow_n8n_id(workflow_row["id"], workflow["id"])
+        if not workflow.get("active"):
+            raise Exception(f"Workflow {workflow['id']} was saved but could not be activated")
+        if config.INGESTION_MODE == "push":
+            credential["n8n_gmail_credential"] = n8n_credential_id
+            self.push.start_watch(credential)
+
+        self.db.update_workflow_status(workflow_row["id"], "active")
+        print(f"✅ Provisioned n8n workflow {workflow['id']} for {email}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run provisioning workers")
+    parser.add_argument("--workers", type=int, default=max(1, config.PROVISIONING_WORKERS))
+    args = parser.parse_args(argv)
+
+    pool = ProvisioningWorkerPool(UserDB(), N8NManager(), workers=args.workers)
+    pool.start()
+    print(f"🚀 Started {args.workers} provisioning workers")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
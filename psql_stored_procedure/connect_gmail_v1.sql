@@ -0,0 +1,98 @@
+-- Gmail (re)connection for any number of tenants, one array element each:
+-- upsert the credential with fresh tokens (forgetting its n8n credential),
+-- reuse the user's newest workflow if it already uses that credential or
+-- create one, mark it pending and queue its provisioning job (or reuse the
+-- workflow's open job, see migrations/0011). Mailboxes
+-- owned by another user are left untouched and return no row. All CTEs run
+-- in the same snapshot, so the workflow CTEs rely only on what the upsert
+-- RETURNs. plpgsql caches the plan per session.
+CREATE OR REPLACE FUNCTION public.connect_gmail_v1(
+    p_user_ids int[],
+    p_emails text[],
+    p_access_tokens text[],
+    p_refresh_tokens text[],
+    p_token_expires_at timestamp[],
+    p_token_refresh_after timestamp[],
+    p_max_attempts int
+)
+RETURNS TABLE (
+    user_id int,
+    gmail_email text,
+    credential_id int,
+    workflow_id int,
+    n8n_workflow_id text,
+    job_id bigint
+)
+LANGUAGE plpgsql
+VOLATILE
+SECURITY INVOKER
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH v AS (
+        SELECT *
+        FROM unnest(p_user_ids, p_emails, p_access_tokens, p_refresh_tokens,
+                    p_token_expires_at, p_token_refresh_after)
+            AS v (user_id, gmail_email, access_token, refresh_token, token_expires_at, token_refresh_after)
+    ),
+    credential AS (
+        INSERT INTO public.gmail_credentials AS gc (user_id, gmail_email, access_token, refresh_token,
+                                                    token_expires_at, token_refresh_after)
+        SELECT v.user_id, v.gmail_email, v.access_token, v.refresh_token, v.token_expires_at, v.token_refresh_after
+        FROM v
+        ON CONFLICT (gmail_email) DO UPDATE SET
+            access_token = EXCLUDED.access_token,
+            refresh_token = EXCLUDED.refresh_token,
+            token_expires_at = EXCLUDED.token_expires_at,
+            token_refresh_after = EXCLUDED.token_refresh_after,
+            n8n_gmail_credential = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE gc.user_id = EXCLUDED.user_id
+        RETURNING gc.id, gc.user_id, gc.gmail_email
+    ),
+    current_workflow AS (
+        SELECT DISTINCT ON (w.user_id) w.id, w.gmail_credential_id
+        FROM public.workflows w
+        WHERE w.user_id IN (SELECT v.user_id FROM v) AND w.status = 'active'
+        ORDER BY w.user_id, w.updated_at DESC
+    ),
+    reused AS (
+        UPDATE public.workflows w
+        SET workflow_status = 'pending', updated_at = CURRENT_TIMESTAMP
+        FROM current_workflow cw
+        JOIN credential c ON c.id = cw.gmail_credential_id
+        WHERE w.id = cw.id
+        RETURNING w.id, w.gmail_credential_id, w.n8n_workflow_id
+    ),
+    created AS (
+        INSERT INTO public.workflows AS w (user_id, gmail_credential_id, workflow_status)
+        SELECT c.user_id, c.id, 'pending'
+        FROM credential c
+        WHERE NOT EXISTS (SELECT 1 FROM reused r WHERE r.gmail_credential_id = c.id)
+        RETURNING w.id, w.gmail_credential_id, w.n8n_workflow_id
+    ),
+    workflow AS (
+        SELECT * FROM reused
+        UNION ALL
+        SELECT * FROM created
+    ),
+    job AS (
+        INSERT INTO public.provisioning_jobs AS j (user_id, gmail_credential_id, workflow_id, max_attempts)
+        SELECT c.user_id, c.id, w.id, p_max_attempts
+        FROM credential c
+        JOIN workflow w ON w.gmail_credential_id = c.id
+        ON CONFLICT (workflow_id) WHERE status IN ('queued', 'running') DO UPDATE SET
+            rerun = j.rerun OR j.status = 'running',
+            attempts = CASE WHEN j.status = 'queued' THEN 0 ELSE j.attempts END,
+            run_after = LEAST(j.run_after, EXCLUDED.run_after),
+            max_attempts = EXCLUDED.max_attempts,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING j.id, j.workflow_id
+    )
+    SELECT c.user_id, c.gmail_email, c.id, w.id, w.n8n_workflow_id, j.id
+    FROM credential c
+    JOIN workflow w ON w.gmail_credential_id = c.id
+    JOIN job j ON j.workflow_id = w.id;
+END;
+$$;
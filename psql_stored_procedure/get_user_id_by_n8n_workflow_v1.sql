@@ -0,0 +1,17 @@
+-- Owner of an active workflow, for ownership checks. plpgsql caches the
+-- plan of its query per session.
+CREATE OR REPLACE FUNCTION public.get_user_id_by_n8n_workflow_v1(p_n8n_workflow_id text)
+RETURNS BIGINT
+LANGUAGE plpgsql
+STABLE
+SECURITY INVOKER
+AS $$
+DECLARE
+    result_id BIGINT;
+BEGIN
+    SELECT user_id INTO result_id
+    FROM public.workflows
+    WHERE n8n_workflow_id = p_n8n_workflow_id AND status = 'active';
+    RETURN result_id;
+END;
+$$;
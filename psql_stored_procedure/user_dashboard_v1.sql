@@ -0,0 +1,34 @@
+-- User, newest active credential and newest active workflow (with its
+-- mailbox) as whole rows, so new table columns need no new version.
+-- SQL-language, STABLE and not STRICT, so the planner inlines it into the
+-- caller's prepared statement.
+CREATE OR REPLACE FUNCTION public.user_dashboard_v1(p_user_id int)
+RETURNS TABLE (
+    account_row public.user_accounts,
+    credential_row public.gmail_credentials,
+    workflow_row public.workflows,
+    workflow_gmail_email text
+)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+    SELECT ua, lc.c, lw.w, lw.gmail_email
+    FROM public.user_accounts ua
+    LEFT JOIN LATERAL (
+        SELECT c
+        FROM public.gmail_credentials c
+        WHERE c.user_id = ua.id AND c.status = 'active'
+        ORDER BY c.updated_at DESC
+        LIMIT 1
+    ) lc ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT w, wc.gmail_email
+        FROM public.workflows w
+        JOIN public.gmail_credentials wc ON w.gmail_credential_id = wc.id
+        WHERE w.user_id = ua.id AND w.status = 'active'
+        ORDER BY w.updated_at DESC
+        LIMIT 1
+    ) lw ON TRUE
+    WHERE ua.id = p_user_id
+$$;
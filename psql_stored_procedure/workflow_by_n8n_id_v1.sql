@@ -0,0 +1,14 @@
+-- Active workflow by n8n workflow ID with its mailbox and owner's username.
+-- Inlined into the caller's prepared statement like user_dashboard_v1.
+CREATE OR REPLACE FUNCTION public.workflow_by_n8n_id_v1(p_n8n_workflow_id text)
+RETURNS TABLE (workflow_row public.workflows, gmail_email text, username text)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+    SELECT w, c.gmail_email, ua.username
+    FROM public.workflows w
+    JOIN public.gmail_credentials c ON w.gmail_credential_id = c.id
+    JOIN public.user_accounts ua ON w.user_id = ua.id
+    WHERE w.n8n_workflow_id = p_n8n_workflow_id AND w.status = 'active'
+$$;
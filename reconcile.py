@@ -0,0 +1,310 @@
+"""Reconcile the database with n8n.
+
+The two drift apart when a step between them fails or is done by hand: a
+callback that dies after creating an n8n credential, a workflow deleted in
+the n8n UI, an activation that did not stick. The reconciler snapshots our
+tables, then lists every n8n workflow and credential, indexes both sides by
+id and diffs them:
+
+- n8n workflows and Gmail credentials named like ours that no row
+  references are orphans and are deleted
+- active rows whose n8n workflow is inactive are reactivated, or marked
+  ``failed`` when that does not work
+- active rows whose n8n workflow or credential is gone are queued for
+  provisioning again
+- shards whose workflow is gone or inactive are rebuilt
+- failed rows whose n8n workflow is running are marked active again
+
+n8n objects younger than ``RECONCILE_GRACE_SECONDS`` are left alone, as
+provisioning may not have recorded them yet. Repairs run in batches of
+``RECONCILE_BATCH_SIZE`` with ``RECONCILE_CONCURRENCY`` parallel n8n calls.
+
+    python reconcile.py                      # loop every RECONCILE_INTERVAL seconds
+    python reconcile.py --once --dry-run     # report drift without repairing it
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List
+
+import config
+from database import UserDB
+from n8n_manager import N8NManager
+from shard_pool import ShardedWorkflowPool
+
+RECONCILE_LOCK_NAMESPACE = 724_181_013
+
+WORKFLOW_NAME_PREFIX = "gmail_telegram_"
+CREDENTIAL_NAME_PREFIX = "Gmail - "
+CREDENTIAL_TYPE = "gmailOAuth2"
+
+DRIFT_KINDS = (
+    "orphan_workflows", "orphan_credentials", "lost_credentials",
+    "reprovision", "reactivate", "mark_active", "rebuild_shards",
+)
+
+
+def created_at(item: Dict) -> datetime:
+    """Creation time (naive UTC) of an n8n object; the epoch if n8n did not report it"""
+    value = item.get("createdAt")
+    if not value:
+        return datetime(1970, 1, 1)
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def compute_drift(rows: Iterable[Dict], shards: List[Dict], n8n_workflows: List[Dict],
+                  n8n_credentials: List[Dict], cutoff: datetime, push_mode: bool = False) -> Dict[str, List]:
+    """Diff a database snapshot against the n8n listings and return the repairs to make.
+
+    ``rows`` are credentials joined with their workflows, as yielded by
+    ``UserDB.iter_reconcile_rows``. Both sides are indexed by id, so the diff
+    is linear in the number of rows and n8n objects. Only n8n objects created
+    before ``cutoff`` can be orphans.
+    """
+    workflows_by_id = {str(workflow["id"]): workflow for workflow in n8n_workflows}
+    credential_ids = {str(credential["id"]) for credential in n8n_credentials}
+    referenced_workflows = {shard["n8n_workflow_id"] for shard in shards if shard["n8n_workflow_id"]}
+    referenced_credentials = set()
+    drift = {kind: [] for kind in DRIFT_KINDS}
+    lost_credentials = {}
+    shards_to_rebuild = set()
+
+    for row in rows:
+        credential_id = row["n8n_gmail_credential"]
+        if credential_id:
+            referenced_credentials.add(credential_id)
+            if credential_id not in credential_ids:
+                lost_credentials[row["credential_id"]] = row
+        if row["n8n_workflow_id"]:
+            referenced_workflows.add(row["n8n_workflow_id"])
+
+        # Pending rows have a provisioning job in flight
+        if row["workflow_id"] is None or row["row_status"] != "active" or row["workflow_status"] == "pending":
+            continue
+        credential_ok = bool(credential_id) and credential_id in credential_ids
+
+        if row["shard_id"] is not None:
+            if row["workflow_status"] == "active" and not credential_ok:
+                drift["reprovision"].append(row)
+            elif row["workflow_status"] == "inactive" and credential_ok:
+                shards_to_rebuild.add(row["shard_id"])
+            continue
+
+        workflow = workflows_by_id.get(row["n8n_workflow_id"]) if row["n8n_workflow_id"] else None
+        if row["workflow_status"] == "active":
+            if workflow is None or not credential_ok:
+                drift["reprovision"].append(row)
+            elif not workflow.get("active"):
+                drift["reactivate"].append(row)
+        elif workflow is not None and workflow.get("active") and credential_ok and not push_mode:
+            # Push workflows also need a Gmail watch, which only provisioning starts
+            drift["mark_active"].append(row)
+
+    for shard in shards:
+        workflow = workflows_by_id.get(shard["n8n_workflow_id"]) if shard["n8n_workflow_id"] else None
+        if shard["member_count"] and (workflow is None or not workflow.get("active")):
+            shards_to_rebuild.add(shard["shard_id"])
+    drift["rebuild_shards"] = sorted(shards_to_rebuild)
+    drift["lost_credentials"] = list(lost_credentials.values())
+
+    for workflow in n8n_workflows:
+        if (workflow.get("name", "").startswith(WORKFLOW_NAME_PREFIX)
+                and str(workflow["id"]) not in referenced_workflows and created_at(workflow) < cutoff):
+            drift["orphan_workflows"].append(workflow)
+    for credential in n8n_credentials:
+        if (credential.get("type") == CREDENTIAL_TYPE and credential.get("name", "").startswith(CREDENTIAL_NAME_PREFIX)
+                and str(credential["id"]) not in referenced_credentials and created_at(credential) < cutoff):
+            drift["orphan_credentials"].append(credential)
+    return drift
+
+
+class Reconciler:
+    def __init__(self, db: UserDB, n8n: N8NManager, shards: ShardedWorkflowPool = None, dry_run: bool = False,
+                 batch_size: int = None, concurrency: int = None, max_deletes: int = None):
+        self.db = db
+        self.n8n = n8n
+        self.shards = shards or ShardedWorkflowPool(db, n8n)
+        self.dry_run = dry_run
+        self.batch_size = batch_size or config.RECONCILE_BATCH_SIZE
+        self.concurrency = concurrency or config.RECONCILE_CONCURRENCY
+        self.max_deletes = config.RECONCILE_MAX_DELETES if max_deletes is None else max_deletes
+
+    def _run_batches(self, items: List, call: Callable, description: str) -> List[bool]:
+        """Apply call to items batch by batch with bounded concurrency; True where it succeeded"""
+        def attempt(item):
+            try:
+                return bool(call(item))
+            except Exception as e:
+                print(f"❌ {description} failed for {item}: {str(e)}")
+                return False
+
+        outcomes = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for start in range(0, len(items), self.batch_size):
+                outcomes += executor.map(attempt, items[start:start + self.batch_size])
+        return outcomes
+
+    def _requeue(self, row: Dict) -> bool:
+        """Queue provisioning for a row unless it changed since the snapshot"""
+        current = self.db.get_workflow_by_id(row["workflow_id"])
+        if (not current or current["workflow_status"] == "pending"
+                or current["n8n_workflow_id"] != row["n8n_workflow_id"]):
+            return True
+        self.db.update_workflow_status(row["workflow_id"], "pending")
+        self.db.enqueue_provisioning_job(
+            row["user_id"], row["credential_id"], row["workflow_id"], max_attempts=config.PROVISIONING_MAX_ATTEMPTS
+        )
+        return True
+
+    def _rebuild_shard(self, shard_id: int) -> bool:
+        result = self.shards.rebuild_shard(shard_id)
+        return result["active"] or result["members"] == 0
+
+    def repair(self, drift: Dict[str, List]) -> Dict[str, int]:
+        """Apply the repairs in drift; returns the number that succeeded per kind, plus failures"""
+        repaired = {kind: 0 for kind in DRIFT_KINDS}
+        repaired["failed"] = 0
+
+        def count(kind, outcomes):
+            repaired[kind] += sum(outcomes)
+            repaired["failed"] += len(outcomes) - sum(outcomes)
+
+        orphans = len(drift["orphan_workflows"]) + len(drift["orphan_credentials"])
+        if orphans > self.max_deletes:
+            # More likely a wrong N8N_URL or a partial listing than real drift
+            print(f"⚠️ {orphans} orphans exceed RECONCILE_MAX_DELETES={self.max_deletes}, not deleting any")
+        else:
+            # Workflows first: n8n refuses to delete credentials still in use
+            count("orphan_workflows", self._run_batches(
+                [w["id"] for w in drift["orphan_workflows"]], self.n8n.delete_workflow, "Deleting workflow"))
+            count("orphan_credentials", self._run_batches(
+                [c["id"] for c in drift["orphan_credentials"]], self.n8n.delete_credential, "Deleting credential"))
+
+        lost = [row["credential_id"] for row in drift["lost_credentials"]]
+        for start in range(0, len(lost), self.batch_size):
+            self.db.clear_n8n_credential_ids(lost[start:start + self.batch_size])
+        repaired["lost_credentials"] = len(lost)
+
+        count("reprovision", self._run_batches(drift["reprovision"], self._requeue, "Queueing provisioning"))
+
+        outcomes = self._run_batches(
+            [row["n8n_workflow_id"] for row in drift["reactivate"]], self.n8n.activate_workflow, "Activating workflow"
+        )
+        count("reactivate", outcomes)
+        failed = [row["workflow_id"] for row, ok in zip(drift["reactivate"], outcomes) if not ok]
+        self.db.set_workflows_status(failed, "failed")
+
+        mark_active = [row["workflow_id"] for row in drift["mark_active"]]
+        for start in range(0, len(mark_active), self.batch_size):
+            self.db.set_workflows_status(mark_active[start:start + self.batch_size], "active")
+        repaired["mark_active"] = len(mark_active)
+
+        count("rebuild_shards", self._run_batches(drift["rebuild_shards"], self._rebuild_shard, "Rebuilding shard"))
+        return repaired
+
+    @staticmethod
+    def print_drift(drift: Dict[str, List]) -> None:
+        for workflow in drift["orphan_workflows"]:
+            print(f"🔎 Orphan n8n workflow {workflow['id']} ({workflow.get('name')})")
+        for credential in drift["orphan_credentials"]:
+            print(f"🔎 Orphan n8n credential {credential['id']} ({credential.get('name')})")
+        for row in drift["lost_credentials"]:
+            print(f"🔎 {row['gmail_email']}: n8n credential {row['n8n_gmail_credential']} is gone")
+        for row in drift["reprovision"]:
+            print(f"🔎 {row['gmail_email']}: needs provisioning again")
+        for row in drift["reactivate"]:
+            print(f"🔎 {row['gmail_email']}: n8n workflow {row['n8n_workflow_id']} is inactive")
+        for row in drift["mark_active"]:
+            print(f"🔎 {row['gmail_email']}: marked {row['workflow_status']} but its workflow is running")
+        for shard_id in drift["rebuild_shards"]:
+            print(f"🔎 Shard {shard_id} needs a rebuild")
+
+    def run_once(self) -> Dict:
+        """Snapshot both sides, diff them and repair (or report) the drift, timing each phase"""
+        timings = {}
+        with self.db.advisory_lock(RECONCILE_LOCK_NAMESPACE, 0):
+            started = time.perf_counter()
+            snapshot_at = datetime.utcnow()
+            rows = list(self.db.iter_reconcile_rows(config.STREAM_BATCH_SIZE))
+            shards = self.db.get_shards()
+            timings["load_db"] = time.perf_counter() - started
+
+            # Listed after the database, so anything n8n gained in between is
+            # newer than the cutoff and cannot be mistaken for an orphan
+            started = time.perf_counter()
+            n8n_workflows = list(self.n8n.iter_workflows())
+            n8n_credentials = list(self.n8n.iter_credentials())
+            timings["list_n8n"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            cutoff = snapshot_at - timedelta(seconds=config.RECONCILE_GRACE_SECONDS)
+            drift = compute_drift(
+                rows, shards, n8n_workflows, n8n_credentials, cutoff, push_mode=config.INGESTION_MODE == "push"
+            )
+            timings["diff"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if self.dry_run:
+                self.print_drift(drift)
+                repaired = None
+            else:
+                repaired = self.repair(drift)
+            timings["repair"] = time.perf_counter() - started
+
+        return {
+            "rows": len(rows),
+            "n8n_workflows": len(n8n_workflows),
+            "n8n_credentials": len(n8n_credentials),
+            "drift": {kind: len(items) for kind, items in drift.items()},
+            "repaired": repaired,
+            "timings": timings,
+        }
+
+    @staticmethod
+    def print_report(report: Dict) -> None:
+        drift = ", ".join(f"{kind} {count}" for kind, count in report["drift"].items() if count) or "none"
+        print(f"🔄 Reconciled {report['rows']} rows against {report['n8n_workflows']} n8n workflows "
+              f"and {report['n8n_credentials']} credentials; drift: {drift}")
+        if report["repaired"] is not None:
+            print("✅ Repaired: " + ", ".join(f"{kind} {count}" for kind, count in report["repaired"].items()))
+        print("⏱️ " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in report["timings"].items()))
+
+    def run_forever(self, interval: float = None) -> None:
+        interval = config.RECONCILE_INTERVAL if interval is None else interval
+        while True:
+            started = time.monotonic()
+            try:
+                self.print_report(self.run_once())
+            except Exception as e:
+                print(f"❌ Reconciliation error: {str(e)}")
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Find and repair drift between the database and n8n")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--interval", type=float, help="Seconds between passes")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without repairing it")
+    parser.add_argument("--max-deletes", type=int, help="Refuse to delete more orphans than this in one pass")
+    args = parser.parse_args(argv)
+
+    db = UserDB()
+    n8n = N8NManager(pool_size=config.RECONCILE_CONCURRENCY)
+    reconciler = Reconciler(db, n8n, dry_run=args.dry_run, max_deletes=args.max_deletes)
+    try:
+        if not args.once:
+            reconciler.run_forever(args.interval)
+        report = reconciler.run_once()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        n8n.close()
+        db.close()
+    reconciler.print_report(report)
+    return 1 if report["repaired"] and report["repaired"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
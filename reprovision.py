@@ -0,0 +1,199 @@
+"""Push the current workflow template to every provisioned tenant.
+
+Usage:
+    python reprovision.py --concurrency 16 --rate 20
+    python reprovision.py --checkpoint reprovision.json   # resume an interrupted run
+    python reprovision.py --dry-run
+
+Tenants are read from the workflows table in id order, one batch at a time.
+Each batch is pushed with bounded concurrency under a global request rate
+limit, and the checkpoint file is rewritten after every finished batch so
+an interrupted run resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import config
+from database import UserDB
+from n8n_manager import N8NManager
+from poll_scheduler import schedule_for
+from shard_pool import ShardedWorkflowPool
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` acquisitions per second with bursts of ``burst``"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_checkpoint(path: str) -> Dict:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"last_workflow_id": 0, "succeeded": 0, "failed": 0, "failures": []}
+
+
+def save_checkpoint(path: str, checkpoint: Dict) -> None:
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class Reprovisioner:
+    def __init__(self, db: UserDB, n8n: N8NManager, concurrency: int = 8, rate: float = 10.0,
+                 batch_size: int = 200, dry_run: bool = False):
+        self.db = db
+        self.n8n = n8n
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.limiter = RateLimiter(rate, burst=concurrency)
+
+    def push_tenant(self, tenant: Dict) -> None:
+        """Rewrite one tenant's workflow from the current template"""
+        if self.dry_run:
+            return
+        # One token per n8n call: the upsert and the activation
+        self.limiter.acquire()
+        self.limiter.acquire()
+        workflow = self.n8n.create_or_update_workflow(
+            tenant["gmail_email"], tenant["n8n_gmail_credential"], tenant["n8n_workflow_id"], **schedule_for(tenant)
+        )
+        if workflow["id"] != tenant["n8n_workflow_id"]:
+            self.db.update_workflow_n8n_id(tenant["workflow_id"], workflow["id"])
+        # Left marked active, so the reconciler reactivates it
+        if not workflow.get("active"):
+            raise Exception(f"Workflow {workflow['id']} was saved but could not be activated")
+        self.db.update_workflow_status(tenant["workflow_id"], "active")
+
+    def _push_safely(self, tenant: Dict):
+        try:
+            self.push_tenant(tenant)
+            return None
+        except Exception as e:
+            return {"workflow_id": tenant["workflow_id"], "email": tenant["gmail_email"], "error": str(e)}
+
+    def run(self, checkpoint: Dict, checkpoint_path: str = None, limit: int = None) -> Dict:
+        """Process all tenants after the checkpoint and return a summary report"""
+        started = time.monotonic()
+        processed = 0
+        finished = False
+        if not self.dry_run:
+            self.n8n.sync_workflow_index()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while limit is None or processed < limit:
+                batch_limit = self.batch_size if limit is None else min(self.batch_size, limit - processed)
+                batch = self.db.get_provisioned_tenants(checkpoint["last_workflow_id"], batch_limit)
+                if not batch:
+                    finished = True
+                    break
+
+                for failure in executor.map(self._push_safely, batch):
+                    if failure:
+                        checkpoint["failed"] += 1
+                        checkpoint["failures"].append(failure)
+                        print(f"❌ {failure['email']}: {failure['error']}")
+                    else:
+                        checkpoint["succeeded"] += 1
+
+                processed += len(batch)
+                checkpoint["last_workflow_id"] = batch[-1]["workflow_id"]
+                save_checkpoint(checkpoint_path, checkpoint)
+
+                elapsed = time.monotonic() - started
+                print(f"🔄 {processed} tenants pushed this run ({processed / elapsed:.1f}/s), last workflow id {checkpoint['last_workflow_id']}")
+
+        # A completed run must not make the next template rollout a no-op
+        if finished and checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - started
+        return {
+            "processed": processed,
+            "succeeded": checkpoint["succeeded"],
+            "failed": checkpoint["failed"],
+            "elapsed_seconds": round(elapsed, 2),
+            "throughput_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+            "last_workflow_id": checkpoint["last_workflow_id"],
+            "completed": finished,
+            "failures": checkpoint["failures"],
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Push the current workflow template to all tenants")
+    parser.add_argument("--concurrency", type=int, default=8, help="Tenants pushed in parallel")
+    parser.add_argument("--rate", type=float, default=10.0, help="Max n8n API requests per second (0 = unlimited)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Tenants read from the database per batch")
+    parser.add_argument("--checkpoint", default="reprovision_checkpoint.json", help="Checkpoint file for resuming")
+    parser.add_argument("--reset", action="store_true", help="Ignore an existing checkpoint and start over")
+    parser.add_argument("--limit", type=int, help="Stop after this many tenants")
+    parser.add_argument("--report", help="Write the summary report as JSON to this file")
+    parser.add_argument("--dry-run", action="store_true", help="Walk the tenants without calling n8n")
+    args = parser.parse_args(argv)
+
+    checkpoint = load_checkpoint(None if args.reset else args.checkpoint)
+    if checkpoint["last_workflow_id"]:
+        print(f"↩️ Resuming after workflow id {checkpoint['last_workflow_id']}")
+
+    db = UserDB()
+    n8n = N8NManager(pool_size=args.concurrency)
+    if config.WORKFLOW_MODE == "shared" and config.INGESTION_MODE != "push":
+        # Tenants have no workflow of their own; the template lives in the shards
+        try:
+            results = ShardedWorkflowPool(db, n8n).rebuild_all(args.concurrency)
+        finally:
+            n8n.close()
+            db.close()
+        failed = [r for r in results if "error" in r]
+        print(f"✅ Rebuilt {len(results) - len(failed)} shards, {len(failed)} failed")
+        return 1 if failed else 0
+
+    try:
+        reprovisioner = Reprovisioner(db, n8n, args.concurrency, args.rate, args.batch_size, args.dry_run)
+        report = reprovisioner.run(checkpoint, None if args.dry_run else args.checkpoint, args.limit)
+    finally:
+        n8n.close()
+        db.close()
+
+    print(
+        f"✅ Done: {report['processed']} tenants in {report['elapsed_seconds']}s "
+        f"({report['throughput_per_second']}/s), {report['succeeded']} succeeded, {report['failed']} failed"
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""Server-side Flask sessions stored in Postgres.
+
+The cookie holds only a random token. The session row, keyed by the
+token's SHA-256, holds the session data and its owner's user id, so an
+admin can count sessions and revoke all of a user's sessions at once.
+Reads go through the lookup cache when every process shares it, so a
+request usually costs no query; otherwise each read is a primary-key lookup
+so a revocation is seen by every worker at once.
+Expiry slides: it is pushed out at most once per
+``SESSION_REFRESH_INTERVAL`` instead of on every request. Expired rows are
+ignored when read and swept lazily in batches by whichever request first
+passes ``SESSION_SWEEP_INTERVAL``.
+
+The session id is rotated whenever the signed-in user changes, so a token
+issued before login is never valid after it.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import config
+from database import UserDB
+
+
+def session_id_for(token: str) -> str:
+    """Database key of a session cookie token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, token: str = None, record: dict = None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.token = token
+        self.record = record
+        self.new = token is None
+        self.modified = False
+
+    @property
+    def session_id(self):
+        return session_id_for(self.token) if self.token else None
+
+
+class PostgresSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, db: UserDB):
+        self.db = db
+        self.lifetime = timedelta(seconds=config.SESSION_LIFETIME)
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    def open_session(self, app, request) -> ServerSession:
+        token = request.cookies.get(self.get_cookie_name(app))
+        if not token:
+            return ServerSession()
+        record = self.db.get_session(session_id_for(token))
+        if not record or record["expires_at"] <= datetime.utcnow():
+            return ServerSession()
+        return ServerSession(self.serializer.loads(record["data"]), token=token, record=record)
+
+    def _sweep(self) -> None:
+        """Delete a batch of expired sessions if the sweep interval has passed"""
+        now = time.monotonic()
+        with self._sweep_lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + config.SESSION_SWEEP_INTERVAL
+        try:
+            swept = self.db.delete_expired_sessions(datetime.utcnow(), config.SESSION_SWEEP_BATCH)
+            if swept:
+                print(f"🧹 Swept {swept} expired sessions")
+        except Exception as e:
+            print(f"⚠️ Session sweep failed: {str(e)}")
+
+    def save_session(self, app, session: ServerSession, response) -> None:
+        self._sweep()
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.token:
+                self.db.delete_sessions(session.session_id)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = datetime.utcnow()
+        user_id = session.get("user_id")
+        record = session.record
+        if record and record["user_id"] != user_id:
+            # Signed-in user changed: never reuse the old token
+            self.db.delete_sessions(session.session_id)
+            session.token, record = None, None
+
+        if session.token is None:
+            session.token = secrets.token_urlsafe(32)
+        elif not session.modified and now - record["refreshed_at"] < timedelta(seconds=config.SESSION_REFRESH_INTERVAL):
+            return
+
+        expires_at = now + self.lifetime
+        self.db.save_session(session.session_id, user_id, self.serializer.dumps(dict(session)), now, expires_at)
+        response.set_cookie(
+            name,
+            session.token,
+            expires=expires_at,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+class AsyncSessionStore:
+    """The same sessions for the async routes in asgi.py.
+
+    Reads and writes the rows and cookies of ``PostgresSessionInterface``,
+    with the same rotation and refresh rules, so a user moves freely
+    between sync and async routes. Expired rows are swept by the sync
+    interface only.
+    """
+
+    def __init__(self, db, flask_app):
+        self.db = db
+        self.app = flask_app
+        self.interface = flask_app.session_interface
+        self.lifetime = timedelta(seconds=config.SESSION_LIFETIME)
+
+    @property
+    def cookie_name(self) -> str:
+        return self.interface.get_cookie_name(self.app)
+
+    async def open(self, cookies) -> ServerSession:
+        token = cookies.get(self.cookie_name)
+        if not token:
+            return ServerSession()
+        record = await self.db.get_session(session_id_for(token))
+        if not record or record["expires_at"] <= datetime.utcnow():
+            return ServerSession()
+        return ServerSession(self.interface.serializer.loads(record["data"]), token=token, record=record)
+
+    async def save(self, session: ServerSession, response) -> None:
+        """Persist the session and set or clear its cookie on a Starlette response"""
+        domain = self.interface.get_cookie_domain(self.app)
+        path = self.interface.get_cookie_path(self.app)
+
+        if not session:
+            if session.token:
+                await self.db.delete_sessions(session.session_id)
+                response.delete_cookie(self.cookie_name, domain=domain, path=path)
+            return
+
+        now = datetime.utcnow()
+        user_id = session.get("user_id")
+        record = session.record
+        if record and record["user_id"] != user_id:
+            await self.db.delete_sessions(session.session_id)
+            session.token, record = None, None
+
+        if session.token is None:
+            session.token = secrets.token_urlsafe(32)
+        elif not session.modified and now - record["refreshed_at"] < timedelta(seconds=config.SESSION_REFRESH_INTERVAL):
+            return
+
+        expires_at = now + self.lifetime
+        await self.db.save_session(
+            session.session_id, user_id, self.interface.serializer.dumps(dict(session)), now, expires_at
+        )
+        samesite = self.interface.get_cookie_samesite(self.app)
+        response.set_cookie(
+            self.cookie_name,
+            session.token,
+            expires=expires_at.replace(tzinfo=timezone.utc),
+            httponly=self.interface.get_cookie_httponly(self.app),
+            domain=domain,
+            path=path,
+            secure=self.interface.get_cookie_secure(self.app),
+            samesite=samesite.lower() if samesite else None,
+        )
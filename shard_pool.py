@@ -0,0 +1,145 @@
+"""Shared pool mode: tenants sharded into a fixed number of n8n workflows.
+
+With ``WORKFLOW_MODE=shared`` each tenant is assigned to one of
+``WORKFLOW_SHARDS`` shards by a stable hash of its Gmail address. Every shard
+is a single n8n workflow whose schedule trigger polls all member mailboxes,
+so n8n runs ``WORKFLOW_SHARDS`` pollers instead of one per tenant. Shard
+membership lives in ``workflows.shard_id``; the shard's n8n workflow id in
+``workflow_shards``. A shard workflow is rebuilt from the database whenever
+its membership changes.
+
+Usage:
+    python shard_pool.py rebuild             # rebuild every shard workflow
+    python shard_pool.py migrate             # move per-tenant workflows into shards
+"""
+import argparse
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import config
+from database import UserDB
+from n8n_manager import N8NManager
+
+
+
+class ShardedWorkflowPool:
+    def __init__(self, db: UserDB, n8n: N8NManager, shard_count: int = None):
+        self.db = db
+        self.n8n = n8n
+        self.shard_count = shard_count or config.WORKFLOW_SHARDS
+
+    def shard_for(self, email: str) -> int:
+        """Stable shard assignment for a Gmail address"""
+        return zlib.crc32(email.lower().encode()) % self.shard_count
+
+    def add_member(self, workflow_id: int, email: str) -> Dict:
+        """Assign a tenant's workflow row to its shard and rebuild that shard"""
+        shard_id = self.shard_for(email)
+        self.db.set_workflow_shard(workflow_id, shard_id)
+        return self.rebuild_shard(shard_id)
+
+    def rebuild_shard(self, shard_id: int) -> Dict:
+        """Push the shard workflow for the current membership and sync member statuses.
+
+        Serialised per shard with a lease so two concurrent rebuilds cannot
+        overwrite each other with stale membership. A rebuild waiting for the
+        lease, or holding it across the n8n calls, keeps no connection.
+        """
+        with self.db.lease(f"shard:{shard_id}", config.SHARD_LEASE_SECONDS):
+            members = self.db.get_shard_members(shard_id)
+            shard = self.db.get_shard(shard_id)
+            n8n_workflow_id = shard["n8n_workflow_id"] if shard else None
+
+            if not members:
+                if n8n_workflow_id:
+                    self.n8n.delete_workflow(n8n_workflow_id)
+                    print(f"✅ Deleted empty shard workflow {n8n_workflow_id}")
+                self.db.save_shard(shard_id, None, 0)
+                return {"shard_id": shard_id, "members": 0, "active": False}
+
+            workflow_data = self.n8n.build_shard_workflow_data(shard_id, members)
+            workflow = self.n8n.upsert_workflow(workflow_data, n8n_workflow_id)
+            self.db.save_shard(shard_id, workflow["id"], len(members))
+            active = bool(workflow.get("active"))
+            self.db.set_shard_members_status(shard_id, "active" if active else "inactive")
+            print(f"✅ Rebuilt shard {shard_id} ({len(members)} tenants) as workflow {workflow['id']}")
+            return {"shard_id": shard_id, "members": len(members), "active": active, "n8n_workflow_id": workflow["id"]}
+
+    def rebuild_all(self, concurrency: int = 4) -> List[Dict]:
+        """Rebuild every shard workflow, e.g. after a template change"""
+        def rebuild(shard_id):
+            try:
+                return self.rebuild_shard(shard_id)
+            except Exception as e:
+                print(f"❌ Shard {shard_id} rebuild failed: {str(e)}")
+                return {"shard_id": shard_id, "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(rebuild, range(self.shard_count)))
+
+    def migrate_per_tenant_workflows(self, batch_size: int = 500, concurrency: int = 4) -> Dict:
+        """Assign existing per-tenant workflows to shards and delete their n8n workflows.
+
+        A tenant's old workflow is only deleted once its shard rebuilt and is
+        active; the rest keep polling on their own and are retried by running
+        the migration again.
+        """
+        migrated, after_id, old_workflows = 0, 0, []
+        while True:
+            tenants = self.db.get_provisioned_tenants(after_id, batch_size)
+            if not tenants:
+                break
+            for tenant in tenants:
+                shard_id = self.shard_for(tenant["gmail_email"])
+                self.db.set_workflow_shard(tenant["workflow_id"], shard_id)
+                if tenant["n8n_workflow_id"]:
+                    old_workflows.append((shard_id, tenant["workflow_id"], tenant["n8n_workflow_id"]))
+                migrated += 1
+            after_id = tenants[-1]["workflow_id"]
+
+        # Shards first so no tenant is left without a poller
+        results = self.rebuild_all(concurrency)
+        healthy = {r["shard_id"] for r in results if r.get("active")}
+        kept = 0
+        for shard_id, workflow_id, n8n_workflow_id in old_workflows:
+            if shard_id not in healthy:
+                kept += 1
+                continue
+            self.n8n.delete_workflow(n8n_workflow_id)
+            self.db.update_workflow_n8n_id(workflow_id, None)
+        failed_shards = sorted({shard_id for shard_id, _, _ in old_workflows} - healthy)
+        return {"migrated": migrated, "kept": kept, "failed_shards": failed_shards}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage shared-pool shard workflows")
+    parser.add_argument("command", choices=["rebuild", "migrate"])
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    db = UserDB()
+    n8n = N8NManager(pool_size=args.concurrency)
+    pool = ShardedWorkflowPool(db, n8n)
+    try:
+        if args.command == "migrate":
+            result = pool.migrate_per_tenant_workflows(concurrency=args.concurrency)
+            print(f"✅ Moved {result['migrated'] - result['kept']} tenants into {pool.shard_count} shards")
+            if result["failed_shards"]:
+                print(f"⚠️ Kept the per-tenant workflows of {result['kept']} tenants: shards "
+                      f"{', '.join(map(str, result['failed_shards']))} failed or are inactive. Fix them and run migrate again")
+                return 1
+            return 0
+
+        results = pool.rebuild_all(args.concurrency)
+        failed = [r for r in results if "error" in r]
+        print(f"✅ Rebuilt {len(results) - len(failed)} shards, {len(failed)} failed")
+        return 1 if failed else 0
+    finally:
+        n8n.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Incremental sync of n8n workflow state into the workflows table.
+
+The dashboard reads ``workflows`` only, so the state n8n actually holds
+(activated or not, last edited, still present) is copied in the background.
+Each pass lists every n8n workflow in bulk and reduces each to a
+fingerprint of its active flag, ``updatedAt`` and ``versionId``. It then
+walks our workflows in id order and writes only the rows whose fingerprint
+changed, one batched ``UPDATE ... FROM (VALUES ...)`` per page. A quiet pass
+costs one n8n listing and a few index scans, and writes nothing.
+
+Shard members take the state of their shard's workflow. Workflows missing
+from n8n are stored as inactive with the ``missing`` fingerprint;
+``workflow_status`` keeps the state provisioning intended, so the
+reconciler can still tell what to repair. A pass holds a lease row (see
+``UserDB.lease``), so only one process syncs at a time and the others
+skip, and no database connection stays checked out across the pass.
+
+The syncer runs inside the web process (``STATUS_SYNC_INTERVAL``) or
+standalone:
+    python status_sync.py
+    python status_sync.py --once
+"""
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+import config
+from database import UserDB
+from n8n_manager import N8NManager
+
+STATUS_SYNC_LEASE = "status_sync"
+MISSING_FINGERPRINT = "missing"
+
+
+def fingerprint(workflow: Optional[Dict]) -> str:
+    """Short hash of the n8n fields the dashboard cares about"""
+    if workflow is None:
+        return MISSING_FINGERPRINT
+    raw = f"{bool(workflow.get('active'))}|{workflow.get('updatedAt')}|{workflow.get('versionId')}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def updated_at(workflow: Optional[Dict]) -> Optional[datetime]:
+    """n8n updatedAt as naive UTC"""
+    if not workflow or not workflow.get("updatedAt"):
+        return None
+    return datetime.fromisoformat(workflow["updatedAt"].replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class WorkflowStatusSync:
+    def __init__(self, db: UserDB, n8n: N8NManager, interval: float = None, batch_size: int = None):
+        self.db = db
+        self.n8n = n8n
+        self.interval = config.STATUS_SYNC_INTERVAL if interval is None else interval
+        self.batch_size = batch_size or config.STATUS_SYNC_BATCH_SIZE
+        self.leader = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, leader: Callable[[], bool] = None) -> None:
+        """Start the sync thread; with ``leader``, passes only run while it returns True"""
+        self.leader = leader
+        self._thread = threading.Thread(target=self._run, name="status-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Ask the sync thread to exit after its current pass and wait for it"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self.leader and not self.leader():
+                self._stop.wait(self.interval)
+                continue
+            try:
+                report = self.run_once()
+                if report["changed"]:
+                    print(f"🔄 Workflow status sync: {report['changed']} of {report['checked']} changed")
+            except Exception as e:
+                print(f"❌ Workflow status sync error: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def run_once(self) -> Dict:
+        """Fetch n8n workflow states in bulk and store the ones that changed"""
+        # Another process is already syncing
+        with self.db.lease(STATUS_SYNC_LEASE, config.STATUS_SYNC_LEASE_SECONDS, wait=False) as lease:
+            if not lease:
+                return {"n8n_workflows": 0, "checked": 0, "changed": 0, "skipped": True}
+            return self._sync(lease)
+
+    def _keep_lease(self, lease: str) -> None:
+        if not self.db.extend_lease(STATUS_SYNC_LEASE, lease, config.STATUS_SYNC_LEASE_SECONDS):
+            raise RuntimeError("Status sync lease expired and was taken over")
+
+    def _sync(self, lease: str) -> Dict:
+        started = time.perf_counter()
+        # Raises if n8n cannot be listed, so an outage never reads as "all missing"
+        states = {str(workflow["id"]): workflow for workflow in self.n8n.iter_workflows()}
+        listed = time.perf_counter() - started
+        self._keep_lease(lease)
+
+        checked, changed, after_id = 0, 0, 0
+        while True:
+            rows = self.db.get_workflow_sync_states(after_id, self.batch_size)
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                workflow = states.get(row["n8n_workflow_id"])
+                current = fingerprint(workflow)
+                if current != row["n8n_fingerprint"]:
+                    updates.append((row["id"], bool(workflow and workflow.get("active")), updated_at(workflow), current))
+            self._keep_lease(lease)
+            changed += self.db.update_workflow_sync_states(updates)
+            checked += len(rows)
+            after_id = rows[-1]["id"]
+
+        return {
+            "n8n_workflows": len(states),
+            "checked": checked,
+            "changed": changed,
+            "list_seconds": listed,
+            "total_seconds": time.perf_counter() - started,
+            "skipped": False,
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Copy n8n workflow state into the database")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--interval", type=float, default=config.STATUS_SYNC_INTERVAL or 60)
+    args = parser.parse_args(argv)
+
+    db = UserDB()
+    n8n = N8NManager()
+    sync = WorkflowStatusSync(db, n8n, args.interval)
+    try:
+        if args.once:
+            report = sync.run_once()
+            if report["skipped"]:
+                print("⏭️ Another process is syncing workflow status")
+                return 0
+            print(f"✅ {report['checked']} workflows checked against {report['n8n_workflows']} in n8n, "
+                  f"{report['changed']} changed in {report['total_seconds']:.2f}s")
+            return 0
+        sync.start()
+        print(f"🚀 Workflow status sync running every {args.interval:.0f}s")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sync.stop()
+        return 0
+    finally:
+        n8n.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
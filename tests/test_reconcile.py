@@ -0,0 +1,103 @@
+"""Table-driven tests for reconcile.compute_drift, the only code that deletes n8n objects."""
+from datetime import datetime
+
+import pytest
+
+from reconcile import DRIFT_KINDS, compute_drift
+
+CUTOFF = datetime(2024, 6, 1, 12, 0)
+OLD = "2024-06-01T11:00:00.000Z"
+NEW = "2024-06-01T12:30:00.000Z"
+
+
+def row(workflow_id=10, credential_id=1, n8n_workflow_id="w1", n8n_gmail_credential="c1",
+        workflow_status="active", row_status="active", shard_id=None):
+    return {
+        "credential_id": credential_id, "user_id": credential_id, "gmail_email": f"user{credential_id}@example.com",
+        "n8n_gmail_credential": n8n_gmail_credential, "workflow_id": workflow_id,
+        "n8n_workflow_id": n8n_workflow_id, "workflow_status": workflow_status, "shard_id": shard_id,
+        "row_status": row_status,
+    }
+
+
+def workflow(id="w1", active=True, created=OLD, name=None):
+    return {"id": id, "name": name or f"gmail_telegram_{id}", "active": active, "createdAt": created}
+
+
+def credential(id="c1", created=OLD, name="Gmail - user@example.com", type="gmailOAuth2"):
+    return {"id": id, "name": name, "type": type, "createdAt": created}
+
+
+def shard(shard_id=0, n8n_workflow_id="s0", member_count=1):
+    return {"shard_id": shard_id, "n8n_workflow_id": n8n_workflow_id, "member_count": member_count}
+
+
+CASES = [
+    # name, rows, shards, n8n workflows, n8n credentials, push_mode, expected drift (ids)
+    ("in sync", [row()], [], [workflow()], [credential()], False, {}),
+    ("orphan workflow before cutoff", [row()], [], [workflow(), workflow("w9")], [credential()], False,
+     {"orphan_workflows": ["w9"]}),
+    ("orphan workflow inside grace period", [row()], [], [workflow(), workflow("w9", created=NEW)], [credential()],
+     False, {}),
+    ("orphan workflow with no createdAt", [row()], [], [workflow(), workflow("w9", created=None)], [credential()],
+     False, {"orphan_workflows": ["w9"]}),
+    ("foreign workflow name is never an orphan", [row()], [], [workflow(), workflow("w9", name="Invoices")],
+     [credential()], False, {}),
+    ("orphan credential before cutoff", [row()], [], [workflow()], [credential(), credential("c9")], False,
+     {"orphan_credentials": ["c9"]}),
+    ("orphan credential inside grace period", [row()], [], [workflow()], [credential(), credential("c9", created=NEW)],
+     False, {}),
+    ("foreign credential type or name is never an orphan", [row()], [], [workflow()],
+     [credential(), credential("c8", type="slackApi"), credential("c9", name="Team Gmail")], False, {}),
+    ("credential of a pending row is not an orphan",
+     [row(n8n_workflow_id=None, workflow_status="pending", n8n_gmail_credential="c9")], [], [], [credential("c9")],
+     False, {}),
+    ("workflow referenced by a shard is not an orphan", [], [shard(n8n_workflow_id="w9", member_count=0)],
+     [workflow("w9")], [], False, {}),
+    ("lost credential on an active row", [row(n8n_gmail_credential="c9")], [], [workflow()], [], False,
+     {"lost_credentials": [1], "reprovision": [10]}),
+    ("live credential, workflow gone", [row()], [], [], [credential()], False, {"reprovision": [10]}),
+    ("live credential, workflow inactive", [row()], [], [workflow(active=False)], [credential()], False,
+     {"reactivate": [10]}),
+    ("pending rows are skipped", [row(workflow_status="pending")], [], [], [credential()], False, {}),
+    ("deleted rows are skipped", [row(row_status="deleted")], [], [], [credential()], False, {}),
+    ("failed row with running workflow is marked active", [row(workflow_status="failed")], [], [workflow()],
+     [credential()], False, {"mark_active": [10]}),
+    ("failed row is left alone in push mode", [row(workflow_status="failed")], [], [workflow()], [credential()], True,
+     {}),
+    ("failed row with lost credential is not marked active", [row(workflow_status="failed", n8n_gmail_credential="c9")],
+     [], [workflow()], [], False, {"lost_credentials": [1]}),
+    ("shard member with lost credential", [row(shard_id=0, n8n_workflow_id=None, n8n_gmail_credential="c9")],
+     [shard()], [workflow("s0")], [], False, {"lost_credentials": [1], "reprovision": [10]}),
+    ("inactive shard member with live credential rebuilds its shard",
+     [row(shard_id=3, n8n_workflow_id=None, workflow_status="inactive")], [shard(3, "s3")], [workflow("s3")],
+     [credential()], False, {"rebuild_shards": [3]}),
+    ("shard workflow gone", [row(shard_id=0, n8n_workflow_id=None)], [shard()], [], [credential()], False,
+     {"rebuild_shards": [0]}),
+    ("shard workflow inactive", [row(shard_id=0, n8n_workflow_id=None)], [shard()], [workflow("s0", active=False)],
+     [credential()], False, {"rebuild_shards": [0]}),
+    ("empty shard is not rebuilt", [], [shard(member_count=0)], [], [], False, {}),
+]
+
+
+def ids(kind, items):
+    if kind == "rebuild_shards":
+        return items
+    if kind == "lost_credentials":
+        return [item["credential_id"] for item in items]
+    if kind in ("orphan_workflows", "orphan_credentials"):
+        return [item["id"] for item in items]
+    return [item["workflow_id"] for item in items]
+
+
+@pytest.mark.parametrize(
+    "rows, shards, workflows, credentials, push_mode, expected",
+    [case[1:] for case in CASES],
+    ids=[case[0] for case in CASES],
+)
+def test_compute_drift(rows, shards, workflows, credentials, push_mode, expected):
+    drift = compute_drift(rows, shards, workflows, credentials, CUTOFF, push_mode=push_mode)
+    assert set(drift) == set(DRIFT_KINDS)
+    assert {kind: ids(kind, drift[kind]) for kind in DRIFT_KINDS} == {
+        kind: expected.get(kind, []) for kind in DRIFT_KINDS
+    }
@@ -0,0 +1,161 @@
+"""Proactive Google access token refresh.
+
+Access tokens live for an hour. Every credential stores its real expiry and
+a ``token_refresh_after`` time ``TOKEN_REFRESH_LEAD`` seconds before it,
+pulled earlier by a random share of ``TOKEN_REFRESH_JITTER`` so refreshes
+spread out instead of piling up. The scheduler claims due credentials in
+batches, refreshes them with bounded concurrency and pushes the new token
+data to the tenant's n8n credential, so n8n never has to refresh on a poll.
+
+The scheduler runs inside the web process (``TOKEN_REFRESH_INTERVAL``) or
+standalone:
+    python token_refresh.py
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Tuple
+
+import config
+from database import UserDB
+from n8n_manager import N8NManager
+from oauth_handler import GoogleOAuth, TokenRevoked
+
+FAILED_REFRESH_RETRY = 60
+
+
+def token_schedule(expires_in: float, now: datetime = None) -> Tuple[datetime, datetime]:
+    """(expires_at, refresh_after) in UTC for a token valid for expires_in seconds"""
+    now = now or datetime.utcnow()
+    expires_at = now + timedelta(seconds=expires_in)
+    lead = config.TOKEN_REFRESH_LEAD + random.uniform(0, config.TOKEN_REFRESH_JITTER)
+    # Short-lived tokens: still refresh in the second half of their life
+    refresh_after = max(expires_at - timedelta(seconds=lead), now + timedelta(seconds=expires_in / 2))
+    return expires_at, refresh_after
+
+
+def epoch_ms(moment: datetime) -> int:
+    """Epoch milliseconds of a naive UTC datetime, as n8n's expiry_date expects"""
+    return int((moment - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def refresh_credential_tokens(db: UserDB, oauth: GoogleOAuth, credential: Dict) -> Dict:
+    """Refresh one credential's access token and persist it; updates credential in place"""
+    tokens = oauth.refresh_access_token(credential["refresh_token"])
+    expires_at, refresh_after = token_schedule(tokens.get("expires_in", 3600))
+    db.update_credential_tokens(
+        credential["id"], tokens["access_token"], expires_at, refresh_after, tokens.get("refresh_token")
+    )
+    credential.update(
+        access_token=tokens["access_token"],
+        refresh_token=tokens.get("refresh_token") or credential["refresh_token"],
+        token_expires_at=expires_at,
+        token_refresh_after=refresh_after,
+    )
+    return credential
+
+
+class TokenRefreshScheduler:
+    def __init__(self, db: UserDB, n8n: N8NManager, oauth: GoogleOAuth, concurrency: int = None, interval: float = None):
+        self.db = db
+        self.n8n = n8n
+        self.oauth = oauth
+        self.concurrency = concurrency or config.TOKEN_REFRESH_CONCURRENCY
+        self.interval = config.TOKEN_REFRESH_INTERVAL if interval is None else interval
+        self.leader = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, leader: Callable[[], bool] = None) -> None:
+        """Start the scheduler thread; with ``leader``, passes only run while it returns True"""
+        self.leader = leader
+        self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Ask the scheduler to exit after its current batch and wait for it"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self.leader and not self.leader():
+                self._stop.wait(self.interval)
+                continue
+            try:
+                report = self.run_once()
+                busy = report["claimed"] == config.TOKEN_REFRESH_BATCH_SIZE
+            except Exception as e:
+                print(f"❌ Token refresh error: {str(e)}")
+                busy = False
+            if not busy:
+                self._stop.wait(self.interval)
+
+    def refresh(self, credential: Dict) -> str:
+        """Refresh one claimed credential and push it to n8n; returns the outcome"""
+        try:
+            refresh_credential_tokens(self.db, self.oauth, credential)
+        except TokenRevoked:
+            # Only the user can fix this by reconnecting Gmail
+            self.db.reschedule_token_refresh(credential["id"], None)
+            print(f"❌ Refresh token for {credential['gmail_email']} was revoked")
+            return "revoked"
+        except Exception as e:
+            self.db.reschedule_token_refresh(credential["id"], datetime.utcnow() + timedelta(seconds=FAILED_REFRESH_RETRY))
+            print(f"⚠️ Token refresh for {credential['gmail_email']} failed: {str(e)}")
+            return "failed"
+
+        if credential["n8n_gmail_credential"]:
+            pushed = self.n8n.update_credential_tokens(
+                credential["n8n_gmail_credential"],
+                credential["gmail_email"],
+                credential["access_token"],
+                credential["refresh_token"],
+                epoch_ms(credential["token_expires_at"]),
+            )
+            if not pushed:
+                print(f"⚠️ Could not update n8n credential {credential['n8n_gmail_credential']}")
+        return "refreshed"
+
+    def run_once(self) -> Dict:
+        """Claim one batch of due credentials and refresh them"""
+        now = datetime.utcnow()
+        batch = self.db.claim_token_refreshes(
+            now, now + timedelta(seconds=config.TOKEN_REFRESH_LEASE), config.TOKEN_REFRESH_BATCH_SIZE
+        )
+        report = {"claimed": len(batch), "refreshed": 0, "failed": 0, "revoked": 0}
+        if not batch:
+            return report
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for outcome in executor.map(self.refresh, batch):
+                report[outcome] += 1
+        print(f"🔄 Refreshed {report['refreshed']} tokens, {report['failed']} failed, {report['revoked']} revoked")
+        return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Refresh Google access tokens ahead of expiry")
+    parser.add_argument("--concurrency", type=int, default=config.TOKEN_REFRESH_CONCURRENCY)
+    parser.add_argument("--interval", type=float, default=config.TOKEN_REFRESH_INTERVAL or 60)
+    args = parser.parse_args(argv)
+
+    scheduler = TokenRefreshScheduler(
+        UserDB(), N8NManager(pool_size=args.concurrency), GoogleOAuth(), args.concurrency, args.interval
+    )
+    scheduler.start()
+    print(f"🚀 Token refresh scheduler running every {args.interval:.0f}s")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())